@@ -0,0 +1,50 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, get_datetime, now, now_datetime
+
+
+class AmazonCatalogItem(Document):
+	pass
+
+
+def get_cached_catalog_item(asin: str, marketplace_id: str, expiry_days: int) -> dict | None:
+	"""Get catalog payload of an ASIN stored locally, None if it's missing or older than expiry_days."""
+	cached = frappe.db.get_value(
+		"Amazon Catalog Item",
+		{"asin": asin, "marketplace_id": marketplace_id},
+		["payload", "fetched_on"],
+		as_dict=True,
+	)
+
+	if not cached or not cached.payload:
+		return
+
+	if get_datetime(cached.fetched_on) < add_days(now_datetime(), -expiry_days):
+		return
+
+	return json.loads(cached.payload)
+
+
+def cache_catalog_item(asin: str, marketplace_id: str, payload: dict) -> None:
+	"""Store catalog payload of an ASIN, replacing the older copy if any."""
+	name = frappe.db.get_value("Amazon Catalog Item", {"asin": asin, "marketplace_id": marketplace_id})
+
+	if name:
+		frappe.db.set_value(
+			"Amazon Catalog Item", name, {"payload": json.dumps(payload), "fetched_on": now()}
+		)
+	else:
+		frappe.get_doc(
+			{
+				"doctype": "Amazon Catalog Item",
+				"asin": asin,
+				"marketplace_id": marketplace_id,
+				"payload": json.dumps(payload),
+				"fetched_on": now(),
+			}
+		).insert(ignore_permissions=True)
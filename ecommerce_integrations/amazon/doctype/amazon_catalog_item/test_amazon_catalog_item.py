@@ -0,0 +1,38 @@
+# Copyright (c) 2026, Frappe and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+from frappe.utils import add_days, now_datetime
+
+from ecommerce_integrations.amazon.doctype.amazon_catalog_item.amazon_catalog_item import (
+	cache_catalog_item,
+	get_cached_catalog_item,
+)
+
+
+class TestAmazonCatalogItem(unittest.TestCase):
+	def tearDown(self):
+		frappe.db.delete("Amazon Catalog Item", {"asin": "_TEST_ASIN"})
+
+	def test_cache_catalog_item(self):
+		self.assertIsNone(get_cached_catalog_item("_TEST_ASIN", "ATVPDKIKX0DER", expiry_days=30))
+
+		payload = {"AttributeSets": [{"Brand": "_Test Brand"}]}
+		cache_catalog_item("_TEST_ASIN", "ATVPDKIKX0DER", payload)
+		cache_catalog_item("_TEST_ASIN", "ATVPDKIKX0DER", payload)  # updating should not fail
+
+		self.assertEqual(get_cached_catalog_item("_TEST_ASIN", "ATVPDKIKX0DER", expiry_days=30), payload)
+		self.assertIsNone(get_cached_catalog_item("_TEST_ASIN", "A1F83G8C2ARO7P", expiry_days=30))
+
+	def test_expired_catalog_item(self):
+		cache_catalog_item("_TEST_ASIN", "ATVPDKIKX0DER", {"AttributeSets": []})
+		frappe.db.set_value(
+			"Amazon Catalog Item",
+			{"asin": "_TEST_ASIN"},
+			"fetched_on",
+			add_days(now_datetime(), -31),
+		)
+
+		self.assertIsNone(get_cached_catalog_item("_TEST_ASIN", "ATVPDKIKX0DER", expiry_days=30))
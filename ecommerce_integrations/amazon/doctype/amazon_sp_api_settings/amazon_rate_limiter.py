@@ -0,0 +1,84 @@
+# Copyright (c) 2022, Frappe and contributors
+# For license information, please see license.txt
+
+
+import random
+import time
+
+import frappe
+from frappe.utils import flt
+
+# https://developer-docs.amazon.com/sp-api/docs/usage-plans-and-rate-limits-in-the-sp-api
+# SPAPI method name: (requests per second, burst)
+DEFAULT_RATE_LIMITS = {
+	"get_orders": (0.0167, 20),
+	"get_order_items": (0.5, 30),
+	"list_financial_events_by_order_id": (0.5, 30),
+	"get_catalog_item": (2, 20),
+}
+FALLBACK_RATE_LIMIT = (0.5, 10)
+
+# Backoff between retries of a failed call, in seconds.
+BACKOFF_BASE = 1
+BACKOFF_CAP = 30
+
+# Takes one token from the bucket, refilling it for the time elapsed since the last call.
+# The token count may go negative, which reserves a slot for the caller: the returned value
+# is the number of seconds it has to wait before sending the request.
+TAKE_TOKEN_SCRIPT = """
+local data = redis.call("HMGET", KEYS[1], "tokens", "ts", "rate")
+local burst = tonumber(ARGV[2])
+local rate = tonumber(data[3]) or tonumber(ARGV[1])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local tokens = tonumber(data[1]) or burst
+local last = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate) - 1
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 60)
+
+if tokens >= 0 then
+	return "0"
+end
+return tostring(-tokens / rate)
+"""
+
+
+class SPAPIRateLimiter:
+	"""Token bucket per seller and SP-API operation, shared by all workers through Redis.
+
+	Calls are paced before they are sent so that hourly syncs stay within the documented
+	rate and burst limits instead of relying on throttling errors.
+	"""
+
+	def __init__(self, seller: str) -> None:
+		self.seller = seller
+
+	def acquire(self, operation: str) -> float:
+		"""Wait until a request for `operation` is allowed, returns the seconds waited."""
+		rate, burst = DEFAULT_RATE_LIMITS.get(operation, FALLBACK_RATE_LIMIT)
+
+		cache = frappe.cache()
+		take_token = cache.register_script(TAKE_TOKEN_SCRIPT)
+		wait = flt(take_token(keys=[self.get_key(operation)], args=[rate, burst]))
+
+		if wait > 0:
+			time.sleep(wait)
+		return wait
+
+	def update_rate(self, operation: str, rate_limit: str | float | None) -> None:
+		"""Use the rate reported by Amazon in `x-amzn-RateLimit-Limit` for further calls."""
+		rate = flt(rate_limit)
+		if rate > 0:
+			# raw command, frappe's hset pickles values which the token script can't read
+			frappe.cache().execute_command("HSET", self.get_key(operation), "rate", str(rate))
+
+	def get_key(self, operation: str) -> str:
+		return frappe.cache().make_key(f"amazon_sp_api_rate_limit|{self.seller}|{operation}")
+
+
+def get_backoff_delay(attempt: int) -> float:
+	"""Exponential backoff with full jitter for the given (zero based) retry attempt."""
+	return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
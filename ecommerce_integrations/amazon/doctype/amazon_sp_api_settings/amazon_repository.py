@@ -4,11 +4,21 @@
 
 import time
 import urllib
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import dateutil
 import frappe
 from frappe import _
+from frappe.utils import cint
 
+from ecommerce_integrations.amazon.doctype.amazon_catalog_item.amazon_catalog_item import (
+	cache_catalog_item,
+	get_cached_catalog_item,
+)
+from ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_rate_limiter import (
+	SPAPIRateLimiter,
+	get_backoff_delay,
+)
 from ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_sp_api import (
 	SPAPI,
 	CatalogItems,
@@ -20,6 +30,11 @@ from ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_sp_api_
 	AmazonSPAPISettings,
 )
 
+# Error code returned by SP-API when a request is throttled.
+THROTTLED_ERROR = "QuotaExceeded"
+
+DEFAULT_CATALOG_CACHE_EXPIRY_DAYS = 30
+
 
 class AmazonRepository:
 	def __init__(self, amz_setting: str | AmazonSPAPISettings) -> None:
@@ -35,7 +50,12 @@ class AmazonRepository:
 			aws_access_key=self.amz_setting.aws_access_key,
 			aws_secret_key=self.amz_setting.get_password("aws_secret_key"),
 			country_code=self.amz_setting.country,
+			credentials_cache_key=self.amz_setting.name,
 		)
+		self.rate_limiter = SPAPIRateLimiter(self.amz_setting.name)
+
+		# lookups memoised for the lifetime of this repository, i.e. one sync run
+		self.lookup_cache = {}
 
 	def return_as_list(self, input) -> list:
 		if isinstance(input, list):
@@ -44,27 +64,24 @@ class AmazonRepository:
 			return [input]
 
 	def call_sp_api_method(self, sp_api_method, **kwargs) -> dict:
-		errors = {}
-		max_retries = self.amz_setting.max_retry_limit
-
-		for x in range(max_retries):
-			try:
-				result = sp_api_method(**kwargs)
-				return result.get("payload")
-			except SPAPIError as e:
-				if e.error not in errors:
-					errors[e.error] = e.error_description
+		operation = sp_api_method.__name__
 
-				time.sleep(1)
-				continue
+		try:
+			return self.fetch_sp_api_payload(sp_api_method, **kwargs)
+		except SPAPIMaxRetriesExceeded as e:
+			errors = e.errors
 
 		for error in errors:
 			msg = f"<b>Error:</b> {error}<br/><b>Error Description:</b> {errors.get(error)}"
 			frappe.msgprint(msg, alert=True, indicator="red")
 			frappe.log_error(
-				message=f"{error}: {errors.get(error)}", title=f'Method "{sp_api_method.__name__}" failed',
+				message=f"{error}: {errors.get(error)}", title=f'Method "{operation}" failed',
 			)
 
+		# Throttling resolves itself, only disable the sync for other errors.
+		if set(errors) == {THROTTLED_ERROR}:
+			frappe.throw(_("Amazon is throttling requests, the sync will be retried in the next run."))
+
 		self.amz_setting.enable_sync = 0
 		self.amz_setting.save()
 
@@ -72,6 +89,35 @@ class AmazonRepository:
 			_("Scheduled sync has been temporarily disabled because maximum retries have been exceeded!")
 		)
 
+	def fetch_sp_api_payload(self, sp_api_method, **kwargs) -> dict:
+		"""Call SP-API method with rate limiting and retries, returns the payload.
+
+		Does not touch the database so it can also be used from worker threads.
+		Raises `SPAPIMaxRetriesExceeded` when all retries fail.
+		"""
+		errors = {}
+		max_retries = self.amz_setting.max_retry_limit
+		operation = sp_api_method.__name__
+
+		for attempt in range(max_retries):
+			self.rate_limiter.acquire(operation)
+
+			try:
+				result = sp_api_method(**kwargs)
+				return result.get("payload")
+			except SPAPIError as e:
+				if e.error not in errors:
+					errors[e.error] = e.error_description
+
+				if attempt < max_retries - 1:
+					time.sleep(get_backoff_delay(attempt))
+				continue
+			finally:
+				api = getattr(sp_api_method, "__self__", None)
+				self.rate_limiter.update_rate(operation, getattr(api, "last_rate_limit", None))
+
+		raise SPAPIMaxRetriesExceeded(errors)
+
 	def get_finances_instance(self) -> Finances:
 		return Finances(**self.instance_params)
 
@@ -88,83 +134,122 @@ class AmazonRepository:
 
 		return account_name
 
-	def get_charges_and_fees(self, order_id) -> dict:
+	def get_shipment_events(self, order_id, call_sp_api_method=None) -> list:
+		call_sp_api_method = call_sp_api_method or self.call_sp_api_method
 		finances = self.get_finances_instance()
-		financial_events_payload = self.call_sp_api_method(
+		financial_events_payload = call_sp_api_method(
 			sp_api_method=finances.list_financial_events_by_order_id, order_id=order_id
 		)
 
-		charges_and_fees = {"charges": [], "fees": []}
+		shipment_events = []
 
 		while True:
-			shipment_event_list = financial_events_payload.get("FinancialEvents", {}).get(
-				"ShipmentEventList", []
+			shipment_events.extend(
+				financial_events_payload.get("FinancialEvents", {}).get("ShipmentEventList", [])
 			)
 			next_token = financial_events_payload.get("NextToken")
 
-			for shipment_event in shipment_event_list:
-				if shipment_event:
-					for shipment_item in shipment_event.get("ShipmentItemList", []):
-						charges = shipment_item.get("ItemChargeList", [])
-						fees = shipment_item.get("ItemFeeList", [])
-						seller_sku = shipment_item.get("SellerSKU")
-
-						for charge in charges:
-							charge_type = charge.get("ChargeType")
-							amount = charge.get("ChargeAmount", {}).get("CurrencyAmount", 0)
-
-							if charge_type != "Principal" and float(amount) != 0:
-								charge_account = self.get_account(charge_type)
-								charges_and_fees.get("charges").append(
-									{
-										"charge_type": "Actual",
-										"account_head": charge_account,
-										"tax_amount": amount,
-										"description": charge_type + " for " + seller_sku,
-									}
-								)
-
-						for fee in fees:
-							fee_type = fee.get("FeeType")
-							amount = fee.get("FeeAmount", {}).get("CurrencyAmount", 0)
-
-							if float(amount) != 0:
-								fee_account = self.get_account(fee_type)
-								charges_and_fees.get("fees").append(
-									{
-										"charge_type": "Actual",
-										"account_head": fee_account,
-										"tax_amount": amount,
-										"description": fee_type + " for " + seller_sku,
-									}
-								)
-
 			if not next_token:
 				break
 
-			financial_events_payload = self.call_sp_api_method(
+			financial_events_payload = call_sp_api_method(
 				sp_api_method=finances.list_financial_events_by_order_id,
 				order_id=order_id,
 				next_token=next_token,
 			)
 
+		return shipment_events
+
+	def get_charges_and_fees(self, order_id, shipment_events=None) -> dict:
+		if shipment_events is None:
+			shipment_events = self.get_shipment_events(order_id)
+
+		charges_and_fees = {"charges": [], "fees": []}
+
+		for shipment_event in shipment_events:
+			if shipment_event:
+				for shipment_item in shipment_event.get("ShipmentItemList", []):
+					charges = shipment_item.get("ItemChargeList", [])
+					fees = shipment_item.get("ItemFeeList", [])
+					seller_sku = shipment_item.get("SellerSKU")
+
+					for charge in charges:
+						charge_type = charge.get("ChargeType")
+						amount = charge.get("ChargeAmount", {}).get("CurrencyAmount", 0)
+
+						if charge_type != "Principal" and float(amount) != 0:
+							charge_account = self.get_account(charge_type)
+							charges_and_fees.get("charges").append(
+								{
+									"charge_type": "Actual",
+									"account_head": charge_account,
+									"tax_amount": amount,
+									"description": charge_type + " for " + seller_sku,
+								}
+							)
+
+					for fee in fees:
+						fee_type = fee.get("FeeType")
+						amount = fee.get("FeeAmount", {}).get("CurrencyAmount", 0)
+
+						if float(amount) != 0:
+							fee_account = self.get_account(fee_type)
+							charges_and_fees.get("fees").append(
+								{
+									"charge_type": "Actual",
+									"account_head": fee_account,
+									"tax_amount": amount,
+									"description": fee_type + " for " + seller_sku,
+								}
+							)
+
 		return charges_and_fees
 
 	def get_orders_instance(self) -> Orders:
 		return Orders(**self.instance_params)
 
+	def get_memoised(self, key: tuple, compute):
+		"""Get value of key from lookup cache of this sync run, computing it only on first use."""
+		if key not in self.lookup_cache:
+			self.lookup_cache[key] = compute()
+		return self.lookup_cache[key]
+
+	def get_catalog_item(self, asin: str) -> dict:
+		"""Get catalog data of an ASIN, calling catalog API at most once per ASIN and marketplace."""
+		catalog_items = self.get_catalog_items_instance()
+		marketplace_id = catalog_items.marketplace_id
+		expiry_days = (
+			cint(getattr(self.amz_setting, "catalog_cache_expiry_days", 0))
+			or DEFAULT_CATALOG_CACHE_EXPIRY_DAYS
+		)
+
+		def fetch_catalog_item():
+			amazon_item = get_cached_catalog_item(asin, marketplace_id, expiry_days)
+			if amazon_item is None:
+				amazon_item = self.call_sp_api_method(
+					sp_api_method=catalog_items.get_catalog_item, asin=asin, marketplace_id=marketplace_id
+				)
+				cache_catalog_item(asin, marketplace_id, amazon_item)
+			return amazon_item
+
+		return self.get_memoised(("Amazon Catalog Item", asin, marketplace_id), fetch_catalog_item)
+
 	def create_item(self, order_item) -> str:
 		def create_item_group(amazon_item) -> str:
 			item_group_name = amazon_item.get("AttributeSets")[0].get("ProductGroup")
 
 			if item_group_name:
-				item_group = frappe.db.get_value("Item Group", filters={"item_group_name": item_group_name})
+				item_group = self.get_memoised(
+					("Item Group", item_group_name),
+					lambda: frappe.db.get_value("Item Group", filters={"item_group_name": item_group_name}),
+				)
 
 				if not item_group:
 					new_item_group = frappe.new_doc("Item Group")
 					new_item_group.item_group_name = item_group_name
 					new_item_group.parent_item_group = self.amz_setting.parent_item_group
 					new_item_group.insert()
+					self.lookup_cache[("Item Group", item_group_name)] = new_item_group.name
 					return new_item_group.item_group_name
 				return item_group
 
@@ -176,12 +261,15 @@ class AmazonRepository:
 			if not brand_name:
 				return
 
-			existing_brand = frappe.db.get_value("Brand", filters={"brand": brand_name})
+			existing_brand = self.get_memoised(
+				("Brand", brand_name), lambda: frappe.db.get_value("Brand", filters={"brand": brand_name})
+			)
 
 			if not existing_brand:
 				brand = frappe.new_doc("Brand")
 				brand.brand = brand_name
 				brand.insert()
+				self.lookup_cache[("Brand", brand_name)] = brand.name
 				return brand.brand
 			return existing_brand
 
@@ -191,14 +279,16 @@ class AmazonRepository:
 			if not manufacturer_name:
 				return
 
-			existing_manufacturer = frappe.db.get_value(
-				"Manufacturer", filters={"short_name": manufacturer_name}
+			existing_manufacturer = self.get_memoised(
+				("Manufacturer", manufacturer_name),
+				lambda: frappe.db.get_value("Manufacturer", filters={"short_name": manufacturer_name}),
 			)
 
 			if not existing_manufacturer:
 				manufacturer = frappe.new_doc("Manufacturer")
 				manufacturer.short_name = manufacturer_name
 				manufacturer.insert()
+				self.lookup_cache[("Manufacturer", manufacturer_name)] = manufacturer.name
 				return manufacturer.short_name
 			return existing_manufacturer
 
@@ -219,8 +309,7 @@ class AmazonRepository:
 			ecommerce_item.sku = order_item["SellerSKU"]
 			ecommerce_item.insert(ignore_permissions=True)
 
-		catalog_items = self.get_catalog_items_instance()
-		amazon_item = catalog_items.get_catalog_item(order_item["ASIN"])["payload"]
+		amazon_item = self.get_catalog_item(order_item["ASIN"])
 
 		item = frappe.new_doc("Item")
 
@@ -269,44 +358,84 @@ class AmazonRepository:
 		item_code = self.create_item(order_item)
 		return item_code
 
-	def get_order_items(self, order_id) -> list:
+	def get_amazon_order_items(self, order_id, call_sp_api_method=None) -> list:
+		call_sp_api_method = call_sp_api_method or self.call_sp_api_method
 		orders = self.get_orders_instance()
-		order_items_payload = self.call_sp_api_method(
-			sp_api_method=orders.get_order_items, order_id=order_id
-		)
+		order_items_payload = call_sp_api_method(sp_api_method=orders.get_order_items, order_id=order_id)
 
-		final_order_items = []
-		warehouse = self.amz_setting.warehouse
+		amazon_order_items = []
 
 		while True:
-			order_items_list = order_items_payload.get("OrderItems")
+			amazon_order_items.extend(order_items_payload.get("OrderItems"))
 			next_token = order_items_payload.get("NextToken")
 
-			for order_item in order_items_list:
-				if order_item.get("QuantityOrdered") > 0:
-					final_order_items.append(
-						{
-							"item_code": self.get_item_code(order_item),
-							"item_name": order_item.get("SellerSKU"),
-							"description": order_item.get("Title"),
-							"rate": order_item.get("ItemPrice", {}).get("Amount", 0),
-							"qty": order_item.get("QuantityOrdered"),
-							"stock_uom": "Nos",
-							"warehouse": warehouse,
-							"conversion_factor": 1.0,
-						}
-					)
-
 			if not next_token:
 				break
 
-			order_items_payload = self.call_sp_api_method(
+			order_items_payload = call_sp_api_method(
 				sp_api_method=orders.get_order_items, order_id=order_id, next_token=next_token,
 			)
 
+		return amazon_order_items
+
+	def get_order_items(self, order_id, amazon_order_items=None) -> list:
+		if amazon_order_items is None:
+			amazon_order_items = self.get_amazon_order_items(order_id)
+
+		final_order_items = []
+		warehouse = self.amz_setting.warehouse
+
+		for order_item in amazon_order_items:
+			if order_item.get("QuantityOrdered") > 0:
+				final_order_items.append(
+					{
+						"item_code": self.get_item_code(order_item),
+						"item_name": order_item.get("SellerSKU"),
+						"description": order_item.get("Title"),
+						"rate": order_item.get("ItemPrice", {}).get("Amount", 0),
+						"qty": order_item.get("QuantityOrdered"),
+						"stock_uom": "Nos",
+						"warehouse": warehouse,
+						"conversion_factor": 1.0,
+					}
+				)
+
 		return final_order_items
 
-	def create_sales_order(self, order) -> str | None:
+	def fetch_order_details(self, order_id) -> dict:
+		"""Fetch order items and financial events of an order from SP-API, without any database access."""
+		details = {
+			"order_items": self.get_amazon_order_items(order_id, self.fetch_sp_api_payload),
+			"shipment_events": None,
+		}
+
+		if self.amz_setting.taxes_charges:
+			details["shipment_events"] = self.get_shipment_events(order_id, self.fetch_sp_api_payload)
+
+		return details
+
+	def prefetch_order_details(self, executor, orders_list) -> dict[str, Future]:
+		"""Start fetching details of orders that are not synced yet on the executor."""
+		if not executor:
+			return {}
+
+		order_ids = [order.get("AmazonOrderId") for order in orders_list]
+		synced_order_ids = set(
+			frappe.get_all(
+				"Sales Order", filters={"amazon_order_id": ["in", order_ids]}, pluck="amazon_order_id"
+			)
+		)
+
+		site, sites_path = frappe.local.site, frappe.local.sites_path
+		return {
+			order_id: executor.submit(
+				_run_in_prefetch_thread, site, sites_path, self.fetch_order_details, order_id
+			)
+			for order_id in order_ids
+			if order_id not in synced_order_ids
+		}
+
+	def create_sales_order(self, order, order_details: Future | None = None) -> str | None:
 		def create_customer(order) -> str:
 			order_customer_name = ""
 			buyer_info = order.get("BuyerInfo")
@@ -391,7 +520,8 @@ class AmazonRepository:
 		if so:
 			return so
 		else:
-			items = self.get_order_items(order_id)
+			prefetched = get_prefetched_order_details(order_details)
+			items = self.get_order_items(order_id, prefetched.get("order_items"))
 
 			if not items:
 				return
@@ -416,7 +546,7 @@ class AmazonRepository:
 			taxes_and_charges = self.amz_setting.taxes_charges
 
 			if taxes_and_charges:
-				charges_and_fees = self.get_charges_and_fees(order_id)
+				charges_and_fees = self.get_charges_and_fees(order_id, prefetched.get("shipment_events"))
 
 				for charge in charges_and_fees.get("charges"):
 					so.append("taxes", charge)
@@ -453,24 +583,37 @@ class AmazonRepository:
 
 		sales_orders = []
 
-		while True:
-			orders_list = orders_payload.get("Orders")
-			next_token = orders_payload.get("NextToken")
+		# Order items and financial events are fetched on worker threads while the
+		# main thread creates sales orders, database writes stay on the main thread.
+		executor = None
+		prefetch_workers = cint(getattr(self.amz_setting, "order_prefetch_workers", 0))
+		if prefetch_workers > 0:
+			executor = ThreadPoolExecutor(max_workers=prefetch_workers)
 
-			if not orders_list or len(orders_list) == 0:
-				break
+		try:
+			while True:
+				orders_list = orders_payload.get("Orders")
+				next_token = orders_payload.get("NextToken")
 
-			for order in orders_list:
-				sales_order = self.create_sales_order(order)
-				if sales_order:
-					sales_orders.append(sales_order)
+				if not orders_list or len(orders_list) == 0:
+					break
 
-			if not next_token:
-				break
+				order_details = self.prefetch_order_details(executor, orders_list)
 
-			orders_payload = self.call_sp_api_method(
-				sp_api_method=orders.get_orders, created_after=created_after, next_token=next_token,
-			)
+				for order in orders_list:
+					sales_order = self.create_sales_order(order, order_details.get(order.get("AmazonOrderId")))
+					if sales_order:
+						sales_orders.append(sales_order)
+
+				if not next_token:
+					break
+
+				orders_payload = self.call_sp_api_method(
+					sp_api_method=orders.get_orders, created_after=created_after, next_token=next_token,
+				)
+		finally:
+			if executor:
+				executor.shutdown(wait=True, cancel_futures=True)
 
 		return sales_orders
 
@@ -478,6 +621,37 @@ class AmazonRepository:
 		return CatalogItems(**self.instance_params)
 
 
+class SPAPIMaxRetriesExceeded(Exception):
+	def __init__(self, errors: dict) -> None:
+		self.errors = errors
+		super().__init__(", ".join(f"{error}: {description}" for error, description in errors.items()))
+
+
+def _run_in_prefetch_thread(site: str, sites_path: str, fn, *args):
+	"""Run `fn` on a worker thread with the site initialised for the duration of the call.
+
+	Site is needed for redis access (rate limits and credentials). It is destroyed once
+	done, so that connections opened on the thread aren't left open after the sync."""
+	frappe.init(site=site, sites_path=sites_path)
+	try:
+		return fn(*args)
+	finally:
+		frappe.destroy()
+
+
+def get_prefetched_order_details(order_details: Future | None) -> dict:
+	"""Result of a prefetch, empty if there was none or it failed.
+
+	A failed prefetch is fetched again on the main thread so that errors are handled as usual."""
+	if not order_details:
+		return {}
+
+	try:
+		return order_details.result()
+	except Exception:
+		return {}
+
+
 def validate_amazon_sp_api_credentials(**args) -> None:
 	api = SPAPI(
 		iam_arn=args.get("iam_arn"),
@@ -5,8 +5,10 @@
 import datetime
 import hashlib
 import hmac
+import time
 
 import boto3
+import frappe
 from requests import request
 from requests.auth import AuthBase
 from requests.compat import urlparse
@@ -55,6 +57,9 @@ MARKETPLACES = {
 	},
 }
 
+# Cached LWA tokens and STS credentials are refreshed this many seconds before they expire.
+CREDENTIALS_EXPIRY_MARGIN = 300
+
 # Following code is adapted from https://github.com/andrewjroth/requests-auth-aws-sigv4 under the Apache License 2.0 with minor changes.
 
 # Copyright 2020 Andrew J Roth <andrew@andrewjroth.com>
@@ -224,6 +229,7 @@ class SPAPI(object):
 		aws_access_key: str,
 		aws_secret_key: str,
 		country_code: str = "US",
+		credentials_cache_key: str = None,
 	) -> None:
 		self.iam_arn = iam_arn
 		self.client_id = client_id
@@ -234,7 +240,19 @@ class SPAPI(object):
 		self.country_code = country_code
 		self.region, self.endpoint, self.marketplace_id = Util.get_marketplace_data(country_code)
 
+		# LWA tokens and STS credentials are only cached when a key (usually the name of
+		# Amazon SP API Settings) is provided, so credential validation always hits Amazon.
+		self.credentials_cache_key = credentials_cache_key
+		self._credentials = {}
+
+		# value of `x-amzn-RateLimit-Limit` header of the last response
+		self.last_rate_limit = None
+
 	def get_access_token(self) -> str:
+		return self.get_cached_credentials("access_token", self.fetch_access_token)
+
+	def fetch_access_token(self) -> tuple[str, int]:
+		""" Exchanges the refresh token for a new LWA access token, returns token and its lifetime in seconds. """
 		data = {
 			"grant_type": "refresh_token",
 			"client_id": self.client_id,
@@ -245,13 +263,25 @@ class SPAPI(object):
 		response = request(method="POST", url=self.AUTH_URL, data=data)
 		result = response.json()
 		if response.status_code == 200:
-			return result.get("access_token")
+			return result.get("access_token"), int(result.get("expires_in") or 3600)
 		exception = SPAPIError(
 			error=result.get("error"), error_description=result.get("error_description")
 		)
 		raise exception
 
 	def get_auth(self) -> AWSSigV4:
+		credentials = self.get_cached_credentials("sts_credentials", self.fetch_sts_credentials)
+
+		return AWSSigV4(
+			service="execute-api",
+			aws_access_key_id=credentials["AccessKeyId"],
+			aws_secret_access_key=credentials["SecretAccessKey"],
+			aws_session_token=credentials["SessionToken"],
+			region=self.region,
+		)
+
+	def fetch_sts_credentials(self) -> tuple[dict, int]:
+		""" Assumes the IAM role, returns temporary credentials and their lifetime in seconds. """
 		try:
 			client = boto3.client(
 				"sts",
@@ -263,20 +293,67 @@ class SPAPI(object):
 			response = client.assume_role(RoleArn=self.iam_arn, RoleSessionName="SellingPartnerAPI")
 
 			credentials = response["Credentials"]
-			access_key_id = credentials["AccessKeyId"]
-			secret_access_key = credentials["SecretAccessKey"]
-			session_token = credentials["SessionToken"]
-
-			return AWSSigV4(
-				service="execute-api",
-				aws_access_key_id=access_key_id,
-				aws_secret_access_key=secret_access_key,
-				aws_session_token=session_token,
-				region=self.region,
+			expires_in = 3600
+			if isinstance(credentials.get("Expiration"), datetime.datetime):
+				expires_in = (
+					credentials["Expiration"] - datetime.datetime.now(datetime.timezone.utc)
+				).total_seconds()
+
+			return (
+				{
+					"AccessKeyId": credentials["AccessKeyId"],
+					"SecretAccessKey": credentials["SecretAccessKey"],
+					"SessionToken": credentials["SessionToken"],
+				},
+				int(expires_in),
 			)
 		except Exception as e:
 			raise SPAPIError(error="invalid_aws_credentials", error_description=e)
 
+	def get_cached_credentials(self, credential_type: str, fetch):
+		"""
+		Returns a credential from the instance or Redis cache, calling `fetch` only when it is
+		missing or about to expire. `fetch` must return the credential and its lifetime in seconds.
+		"""
+		now = time.time()
+
+		value, expires_at = self._credentials.get(credential_type, (None, 0))
+		if value and expires_at - CREDENTIALS_EXPIRY_MARGIN > now:
+			return value
+
+		cache_key = self.get_credentials_cache_key(credential_type)
+		if cache_key:
+			cached = frappe.cache().get_value(cache_key)
+			if cached and cached.get("expires_at", 0) - CREDENTIALS_EXPIRY_MARGIN > now:
+				self._credentials[credential_type] = (cached["value"], cached["expires_at"])
+				return cached["value"]
+
+		value, expires_in = fetch()
+		expires_at = now + expires_in
+		self._credentials[credential_type] = (value, expires_at)
+
+		if cache_key and expires_in > CREDENTIALS_EXPIRY_MARGIN:
+			frappe.cache().set_value(
+				cache_key,
+				{"value": value, "expires_at": expires_at},
+				expires_in_sec=int(expires_in - CREDENTIALS_EXPIRY_MARGIN),
+			)
+
+		return value
+
+	def get_credentials_cache_key(self, credential_type: str) -> str | None:
+		if not self.credentials_cache_key:
+			return
+
+		# Changing any credential in the settings should never serve stale tokens.
+		fingerprint = hashlib.sha256(
+			"|".join(
+				(self.client_id or "", self.refresh_token or "", self.iam_arn or "", self.aws_access_key or "")
+			).encode("utf-8")
+		).hexdigest()[:16]
+
+		return f"amazon_sp_api|{self.credentials_cache_key}|{fingerprint}|{credential_type}"
+
 	def get_headers(self) -> dict:
 		return {"x-amz-access-token": self.get_access_token()}
 
@@ -298,6 +375,15 @@ class SPAPI(object):
 			headers=self.get_headers(),
 			auth=self.get_auth(),
 		)
+		self.last_rate_limit = response.headers.get("x-amzn-RateLimit-Limit")
+
+		if response.status_code == 429:
+			errors = response.json().get("errors") or [{}]
+			raise SPAPIError(
+				error=errors[0].get("code") or "QuotaExceeded",
+				error_description=errors[0].get("message") or "Request throttled by Amazon.",
+			)
+
 		return response.json()
 
 	def list_to_dict(self, key: str, values: list, data: dict) -> None:
@@ -6,6 +6,8 @@ import json
 import os
 import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 import frappe
 import responses
@@ -13,8 +15,13 @@ from frappe.exceptions import ValidationError
 from requests import request
 from requests.exceptions import HTTPError
 
+from ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_rate_limiter import (
+	SPAPIRateLimiter,
+	get_backoff_delay,
+)
 from ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_repository import (
 	AmazonRepository,
+	_run_in_prefetch_thread,
 	validate_amazon_sp_api_credentials,
 )
 from ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_sp_api import (
@@ -231,6 +238,7 @@ class TestAmazonRepository(AmazonRepository):
 			aws_secret_key=self.amz_setting.aws_secret_key,
 			country_code=self.amz_setting.country,
 		)
+		self.lookup_cache = {}
 
 	def call_sp_api_method(self, sp_api_method, **kwargs):
 		max_retries = self.amz_setting.max_retry_limit
@@ -275,3 +283,78 @@ class TestAmazon(unittest.TestCase):
 		)
 
 		self.assertRaises(ValidationError, validate_amazon_sp_api_credentials, **credentials)
+
+	def test_credentials_cache(self):
+		credentials = dict(
+			iam_arn="********************",
+			client_id="********************",
+			client_secret="********************",
+			refresh_token="********************",
+			aws_access_key="********************",
+			aws_secret_key="********************",
+			country_code="US",
+			credentials_cache_key="_Test Amazon SP API Settings",
+		)
+		fetched = []
+
+		def fetch():
+			fetched.append(1)
+			return "access-token", 3600
+
+		api = SPAPI(**credentials)
+		frappe.cache().delete_value(api.get_credentials_cache_key("access_token"))
+
+		self.assertEqual(api.get_cached_credentials("access_token", fetch), "access-token")
+		self.assertEqual(api.get_cached_credentials("access_token", fetch), "access-token")
+
+		# another worker should reuse the token from redis
+		another_api = SPAPI(**credentials)
+		self.assertEqual(another_api.get_cached_credentials("access_token", fetch), "access-token")
+		self.assertEqual(len(fetched), 1)
+
+		frappe.cache().delete_value(api.get_credentials_cache_key("access_token"))
+
+	@patch("ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_rate_limiter.time.sleep")
+	@patch.dict(
+		"ecommerce_integrations.amazon.doctype.amazon_sp_api_settings.amazon_rate_limiter.DEFAULT_RATE_LIMITS",
+		{"_test_operation": (1, 2)},
+	)
+	def test_rate_limiter(self, sleep):
+		limiter = SPAPIRateLimiter("_Test Amazon SP API Settings")
+		key = limiter.get_key("_test_operation")
+		frappe.cache().execute_command("DEL", key)
+
+		# burst is allowed without waiting
+		self.assertEqual(limiter.acquire("_test_operation"), 0)
+		self.assertEqual(limiter.acquire("_test_operation"), 0)
+		sleep.assert_not_called()
+
+		# bucket is empty, next call has to wait for a token
+		self.assertGreater(limiter.acquire("_test_operation"), 0.5)
+		sleep.assert_called_once()
+
+		frappe.cache().execute_command("DEL", key)
+
+	def test_prefetch_thread_is_torn_down(self):
+		site, sites_path = frappe.local.site, frappe.local.sites_path
+
+		def fail():
+			raise Exception("failed")
+
+		with patch("frappe.destroy", wraps=frappe.destroy) as destroy, ThreadPoolExecutor(
+			max_workers=1
+		) as executor:
+			fetched = executor.submit(_run_in_prefetch_thread, site, sites_path, lambda: frappe.local.site)
+			self.assertEqual(fetched.result(), site)
+
+			failed = executor.submit(_run_in_prefetch_thread, site, sites_path, fail)
+			self.assertRaises(Exception, failed.result)
+
+		# site of worker thread is destroyed after each call, even if it fails
+		self.assertEqual(destroy.call_count, 2)
+
+	def test_backoff_delay(self):
+		for attempt in range(10):
+			delay = get_backoff_delay(attempt)
+			self.assertGreaterEqual(delay, 0)
+			self.assertLessEqual(delay, min(30, 2 ** attempt))
@@ -1,27 +1,39 @@
-from typing import Dict
+from typing import Dict, List, Optional
 
 import frappe
 from frappe import _
 from frappe.utils.nestedset import get_root_of
 
+# external customer id -> Customer name is shared between workers for a short time,
+# a stale name (e.g. renamed customer) is detected while loading the document.
+CUSTOMER_CACHE_EXPIRY = 10 * 60
+
 
 class EcommerceCustomer:
 	def __init__(self, customer_id: str, customer_id_field: str, integration: str):
 		self.customer_id = customer_id
 		self.customer_id_field = customer_id_field
 		self.integration = integration
+		self._customer_name = None
+		self._customer_doc = None
 
 	def is_synced(self) -> bool:
 		"""Check if customer on Ecommerce site is synced with ERPNext"""
 
-		return bool(frappe.db.exists("Customer", {self.customer_id_field: self.customer_id}))
+		return bool(self.get_customer_name())
+
+	def get_customer_name(self) -> Optional[str]:
+		"""Get name of ERPNext customer, memoised for the lifetime of this object."""
+		if not self._customer_name:
+			self._customer_name = get_customer_name(self.customer_id_field, self.customer_id)
+		return self._customer_name
 
 	def get_customer_doc(self):
 		"""Get ERPNext customer document."""
-		if self.is_synced():
-			return frappe.get_last_doc("Customer", {self.customer_id_field: self.customer_id})
-		else:
-			raise frappe.DoesNotExistError()
+		if self._customer_doc is None:
+			self._customer_doc = get_customer_doc(self.customer_id_field, self.customer_id)
+			self._customer_name = self._customer_doc.name
+		return self._customer_doc
 
 	def sync_customer(self, customer_name: str, customer_group: str) -> None:
 		"""Create customer in ERPNext if one does not exist already."""
@@ -40,6 +52,9 @@ class EcommerceCustomer:
 		customer.flags.ignore_mandatory = True
 		customer.insert(ignore_permissions=True)
 
+		self._customer_doc = customer
+		self._customer_name = customer.name
+
 	def get_customer_address_doc(self, address_type: str):
 		try:
 			customer = self.get_customer_doc().name
@@ -50,6 +65,28 @@ class EcommerceCustomer:
 		except frappe.DoesNotExistError:
 			return None
 
+	def get_customer_addresses(
+		self, address_types: List[str], fields: Optional[List[str]] = None
+	) -> Dict[str, frappe._dict]:
+		"""Get latest address of each address type linked to the customer, using a single query.
+
+		Returns dict of address type and address with `name` and requested fields."""
+		customer = self.get_customer_name()
+		if not customer:
+			return {}
+
+		addresses = frappe.get_all(
+			"Address",
+			filters={"link_name": customer, "address_type": ("in", address_types)},
+			fields=["name", "address_type", *(fields or [])],
+			order_by="modified desc",
+		)
+
+		address_map = {}
+		for address in addresses:
+			address_map.setdefault(address.address_type, address)
+		return address_map
+
 	def create_customer_address(self, address: Dict[str, str]) -> None:
 		"""Create address from dictionary containing fields used in Address doctype of ERPNext."""
 
@@ -75,3 +112,48 @@ class EcommerceCustomer:
 				"links": [{"link_doctype": "Customer", "link_name": customer_doc.name}],
 			}
 		).insert(ignore_mandatory=True)
+
+
+def get_customer_name(customer_id_field: str, customer_id: str) -> Optional[str]:
+	"""Get name of latest Customer linked to an external customer id.
+
+	Only customers that exist are cached, so a new customer is found as soon as it's created."""
+	if not customer_id:
+		return None
+
+	key = _get_customer_cache_key(customer_id_field, customer_id)
+	customer = frappe.cache().get_value(key)
+	if customer:
+		return customer
+
+	customer = frappe.db.get_value(
+		"Customer", {customer_id_field: customer_id}, "name", order_by="creation desc"
+	)
+	if customer:
+		frappe.cache().set_value(key, customer, expires_in_sec=CUSTOMER_CACHE_EXPIRY)
+	return customer
+
+
+def get_customer_doc(customer_id_field: str, customer_id: str):
+	"""Get latest Customer linked to an external customer id, raises if there's none."""
+	customer = get_customer_name(customer_id_field, customer_id)
+	if not customer:
+		raise frappe.DoesNotExistError()
+
+	try:
+		return frappe.get_doc("Customer", customer)
+	except frappe.DoesNotExistError:
+		# cached customer was renamed or deleted
+		clear_customer_cache(customer_id_field, customer_id)
+		customer = get_customer_name(customer_id_field, customer_id)
+		if not customer:
+			raise
+		return frappe.get_doc("Customer", customer)
+
+
+def clear_customer_cache(customer_id_field: str, customer_id: str) -> None:
+	frappe.cache().delete_value(_get_customer_cache_key(customer_id_field, customer_id))
+
+
+def _get_customer_cache_key(customer_id_field: str, customer_id: str) -> str:
+	return f"ecommerce_customer|{customer_id_field}|{customer_id}"
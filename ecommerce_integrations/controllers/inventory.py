@@ -1,8 +1,9 @@
+import json
 from typing import List, Tuple
 
 import frappe
 from frappe import _dict
-from frappe.utils import now
+from frappe.utils import flt, now
 from frappe.utils.nestedset import get_descendants_of
 
 
@@ -14,11 +15,11 @@ def get_inventory_levels(warehouses: Tuple[str], integration: str) -> List[_dict
 	so ensure that if you sync the inventory with integration, you have also
 	updated `inventory_synced_on` field in related Ecommerce Item.
 
-	returns: list of _dict containing ecom_item, item_code, integration_item_code, variant_id, actual_qty, warehouse, reserved_qty
+	returns: list of _dict containing ecom_item, item_code, integration_item_code, variant_id, inventory_item_id, actual_qty, warehouse, reserved_qty, inventory_synced_qty
 	"""
 	data = frappe.db.sql(
 		f"""
-			SELECT ei.name as ecom_item, bin.item_code as item_code, integration_item_code, variant_id, actual_qty, warehouse, reserved_qty
+			SELECT ei.name as ecom_item, bin.item_code as item_code, integration_item_code, variant_id, inventory_item_id, actual_qty, warehouse, reserved_qty, inventory_synced_qty
 			FROM `tabEcommerce Item` ei
 				JOIN tabBin bin
 				ON ei.erpnext_item_code = bin.item_code
@@ -47,6 +48,8 @@ def get_inventory_levels_of_group_warehouse(warehouse: str, integration: str):
 			SELECT ei.name as ecom_item, bin.item_code as item_code,
 				integration_item_code,
 				variant_id,
+				inventory_item_id,
+				inventory_synced_qty,
 				sum(actual_qty) as actual_qty,
 				sum(reserved_qty) as reserved_qty,
 				max(bin.modified) as last_updated,
@@ -76,8 +79,64 @@ def update_inventory_sync_status(ecommerce_item, time=None):
 	"""Update `inventory_synced_on` timestamp to specified time or current time (if not specified).
 
 	After updating inventory levels to any integration, the Ecommerce Item should know about when it was last updated.
+
+	ecommerce_item can be a single name or list of names to update in one query.
 	"""
 	if time is None:
 		time = now()
 
+	if isinstance(ecommerce_item, (list, tuple, set)):
+		if not ecommerce_item:
+			return
+		ecommerce_item = {"name": ("in", list(ecommerce_item))}
+
 	frappe.db.set_value("Ecommerce Item", ecommerce_item, "inventory_synced_on", time)
+
+
+def filter_changed_inventory_levels(inventory_levels: List[_dict]) -> Tuple[List[_dict], List[str]]:
+	"""Remove inventory levels whose `qty` is same as the qty last synced for the warehouse.
+
+	Bins are modified by many transactions which don't change the quantity sent to
+	integration, `qty` should be set on each level by integration before calling this.
+
+	returns: changed inventory levels and ecommerce items which don't have any changed level.
+	"""
+	changed = []
+	unchanged_items = set()
+
+	for d in inventory_levels:
+		last_synced_qty = json.loads(d.inventory_synced_qty or "{}").get(d.warehouse)
+		if last_synced_qty is not None and flt(last_synced_qty) == flt(d.qty):
+			unchanged_items.add(d.ecom_item)
+		else:
+			changed.append(d)
+
+	unchanged_items -= {d.ecom_item for d in changed}
+	return changed, list(unchanged_items)
+
+
+def update_inventory_synced_qty(inventory_levels: List[_dict], time=None) -> None:
+	"""Store `qty` of inventory levels as the qty last synced for their warehouse.
+
+	If time is specified `inventory_synced_on` is updated as well.
+	"""
+	if not inventory_levels:
+		return
+
+	ecom_items = list({d.ecom_item for d in inventory_levels})
+	# read current values, levels of the same item might have been synced separately
+	synced_qty = {
+		d.name: json.loads(d.inventory_synced_qty or "{}")
+		for d in frappe.get_all(
+			"Ecommerce Item", filters={"name": ("in", ecom_items)}, fields=["name", "inventory_synced_qty"]
+		)
+	}
+
+	for d in inventory_levels:
+		synced_qty.setdefault(d.ecom_item, {})[d.warehouse] = flt(d.qty)
+
+	for ecom_item, qty_map in synced_qty.items():
+		values = {"inventory_synced_qty": json.dumps(qty_map)}
+		if time:
+			values["inventory_synced_on"] = time
+		frappe.db.set_value("Ecommerce Item", ecom_item, values)
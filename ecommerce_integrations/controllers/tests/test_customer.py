@@ -0,0 +1,41 @@
+# Copyright (c) 2021, Frappe and Contributors
+# See LICENSE
+
+import unittest
+from unittest.mock import patch
+
+from ecommerce_integrations.controllers.customer import (
+	EcommerceCustomer,
+	clear_customer_cache,
+	get_customer_name,
+)
+
+CUSTOMER_ID_FIELD = "_test_customer_id"
+
+
+class TestEcommerceCustomer(unittest.TestCase):
+	def setUp(self):
+		clear_customer_cache(CUSTOMER_ID_FIELD, "1")
+
+	def tearDown(self):
+		clear_customer_cache(CUSTOMER_ID_FIELD, "1")
+
+	@patch("ecommerce_integrations.controllers.customer.frappe.db.get_value")
+	def test_customer_name_is_cached(self, get_value):
+		get_value.return_value = None
+		self.assertIsNone(get_customer_name(CUSTOMER_ID_FIELD, "1"))
+
+		# missing customers aren't cached
+		get_value.return_value = "_Test Customer"
+		self.assertEqual(get_customer_name(CUSTOMER_ID_FIELD, "1"), "_Test Customer")
+		self.assertEqual(get_customer_name(CUSTOMER_ID_FIELD, "1"), "_Test Customer")
+		self.assertEqual(get_value.call_count, 2)
+
+	@patch("ecommerce_integrations.controllers.customer.get_customer_name")
+	def test_customer_name_is_memoised(self, get_customer_name):
+		get_customer_name.return_value = "_Test Customer"
+		customer = EcommerceCustomer("1", CUSTOMER_ID_FIELD, "test")
+
+		self.assertTrue(customer.is_synced())
+		self.assertEqual(customer.get_customer_name(), "_Test Customer")
+		get_customer_name.assert_called_once()
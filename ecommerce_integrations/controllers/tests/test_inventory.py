@@ -0,0 +1,26 @@
+# Copyright (c) 2021, Frappe and Contributors
+# See LICENSE
+
+import json
+import unittest
+
+from frappe import _dict
+
+from ecommerce_integrations.controllers.inventory import filter_changed_inventory_levels
+
+
+class TestInventory(unittest.TestCase):
+	def test_filter_changed_inventory_levels(self):
+		synced_qty = json.dumps({"Stores - WP": 10, "Finished Goods - WP": 5})
+		levels = [
+			_dict(ecom_item="A", warehouse="Stores - WP", qty=10, inventory_synced_qty=synced_qty),
+			_dict(ecom_item="B", warehouse="Stores - WP", qty=10, inventory_synced_qty=synced_qty),
+			_dict(ecom_item="B", warehouse="Finished Goods - WP", qty=4, inventory_synced_qty=synced_qty),
+			_dict(ecom_item="C", warehouse="Stores - WP", qty=0, inventory_synced_qty=None),
+		]
+
+		changed, unchanged_items = filter_changed_inventory_levels(levels)
+
+		self.assertEqual(changed, levels[2:])
+		# B has a changed level, so it's not considered unchanged
+		self.assertEqual(unchanged_items, ["A"])
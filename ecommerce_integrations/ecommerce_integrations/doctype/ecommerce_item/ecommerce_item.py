@@ -1,7 +1,7 @@
 # Copyright (c) 2021, Frappe and contributors
 # For license information, please see LICENSE
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import frappe
 from erpnext import get_default_company
@@ -9,15 +9,26 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import cstr, get_datetime, now
 
+# (integration_item_code, variant_id, sku) of an item on integration
+IntegrationItemKey = Tuple[str, str, str]
+
+# Lookups of ERPNext item code are cached in redis, misses are cached for a short time
+# as the item is usually synced soon after (e.g. while processing the same order).
+LOOKUP_CACHE_EXPIRY = 60 * 60
+LOOKUP_CACHE_MISS_EXPIRY = 60
+_NOT_SYNCED = ""
+
 
 class EcommerceItem(Document):
 	erpnext_item_code: str  # item_code in ERPNext
 	integration: str  # name of integration
 	integration_item_code: str  # unique id of product on integration
 	variant_id: str  # unique id of product variant on integration
+	inventory_item_id: str  # id used by integration for stock levels of variant
 	has_variants: int  # is the product a template, i.e. does it have varients
 	variant_of: str  # template id of ERPNext item
 	sku: str  # SKU
+	inventory_synced_qty: str  # JSON of warehouse -> qty last synced to integration
 
 	def validate(self):
 		self.set_defaults()
@@ -47,6 +58,26 @@ class EcommerceItem(Document):
 			if frappe.db.exists("Ecommerce Item", filter):
 				frappe.throw(_("Ecommerce Item already exists"), exc=frappe.DuplicateEntryError)
 
+	def on_update(self):
+		self.clear_lookup_cache()
+
+	def on_trash(self):
+		self.clear_lookup_cache()
+
+	def clear_lookup_cache(self):
+		items = [self]
+		if previous := self.get_doc_before_save():
+			items.append(previous)
+
+		keys = []
+		for item in items:
+			keys.extend(_get_lookup_cache_keys_for_item(item))
+
+		clear_lookup_cache(keys)
+		# other workers might cache old values till this transaction is committed or rolled back
+		frappe.db.after_commit.add(lambda: clear_lookup_cache(keys))
+		frappe.db.after_rollback.add(lambda: clear_lookup_cache(keys))
+
 	def set_defaults(self):
 		if not self.inventory_synced_on:
 			# set to start of epoch time i.e. not synced
@@ -66,12 +97,8 @@ def is_synced(
 	        integration: shopify,
 	        integration_item_code: TSHIRT
 	"""
-	filter = {"integration": integration, "integration_item_code": integration_item_code}
-
-	if variant_id:
-		filter.update({"variant_id": variant_id})
-
-	item_exists = bool(frappe.db.exists("Ecommerce Item", filter))
+	item_code = get_erpnext_item_code(integration, integration_item_code, variant_id=variant_id)
+	item_exists = bool(item_code)
 
 	if not item_exists and sku:
 		return _is_sku_synced(integration, sku)
@@ -79,8 +106,7 @@ def is_synced(
 
 
 def _is_sku_synced(integration: str, sku: str) -> bool:
-	filter = {"integration": integration, "sku": sku}
-	return bool(frappe.db.exists("Ecommerce Item", filter))
+	return bool(_get_erpnext_item_code_by_sku(integration, sku))
 
 
 def get_erpnext_item_code(
@@ -95,7 +121,28 @@ def get_erpnext_item_code(
 	elif has_variants:
 		filters.update({"has_variants": 1})
 
-	return frappe.db.get_value("Ecommerce Item", filters, fieldname="erpnext_item_code")
+	key = _get_lookup_cache_key(
+		integration,
+		integration_item_code,
+		variant_id=variant_id,
+		has_variants=not variant_id and has_variants,
+	)
+	return _get_cached_item_code(
+		integration,
+		key,
+		lambda: frappe.db.get_value("Ecommerce Item", filters, fieldname="erpnext_item_code"),
+	)
+
+
+def _get_erpnext_item_code_by_sku(integration: str, sku: str) -> Optional[str]:
+	key = _get_lookup_cache_key(integration, sku=sku)
+	return _get_cached_item_code(
+		integration,
+		key,
+		lambda: frappe.db.get_value(
+			"Ecommerce Item", {"sku": sku, "integration": integration}, fieldname="erpnext_item_code"
+		),
+	)
 
 
 def get_erpnext_item(
@@ -112,9 +159,7 @@ def get_erpnext_item(
 
 	item_code = None
 	if sku:
-		item_code = frappe.db.get_value(
-			"Ecommerce Item", {"sku": sku, "integration": integration}, fieldname="erpnext_item_code"
-		)
+		item_code = _get_erpnext_item_code_by_sku(integration, sku)
 	if not item_code:
 		item_code = get_erpnext_item_code(
 			integration, integration_item_code, variant_id=variant_id, has_variants=has_variants
@@ -124,6 +169,152 @@ def get_erpnext_item(
 		return frappe.get_doc("Item", item_code)
 
 
+def get_erpnext_item_codes(
+	integration: str, items: List[IntegrationItemKey]
+) -> Dict[IntegrationItemKey, str]:
+	"""Get ERPNext item codes for many integration items using a single query.
+
+	Each item is a tuple of (integration_item_code, variant_id, sku), empty values
+	are allowed. Lookup follows the same rules as `get_erpnext_item`, i.e. SKU
+	match is preferred over integration_item_code + variant_id.
+
+	returns: dict of item tuple -> item_code, items that are not synced or whose ERPNext
+	item doesn't exist anymore are omitted.
+	"""
+	items = [tuple(cstr(value) for value in item) for item in items]
+
+	product_ids = list({item[0] for item in items if item[0]})
+	skus = list({item[2] for item in items if item[2]})
+
+	or_filters = {}
+	if product_ids:
+		or_filters["integration_item_code"] = ["in", product_ids]
+	if skus:
+		or_filters["sku"] = ["in", skus]
+
+	if not or_filters:
+		return {}
+
+	ecommerce_items = frappe.get_all(
+		"Ecommerce Item",
+		filters={"integration": integration},
+		or_filters=or_filters,
+		fields=["erpnext_item_code", "integration_item_code", "variant_id", "sku"],
+		order_by="modified desc",
+	)
+
+	sku_map = {}
+	variant_map = {}
+	product_map = {}
+	# reversed so that most recently modified match wins, like `get_value`
+	for d in reversed(ecommerce_items):
+		if d.sku:
+			sku_map[d.sku] = d.erpnext_item_code
+		variant_map[(d.integration_item_code, cstr(d.variant_id))] = d.erpnext_item_code
+		product_map[d.integration_item_code] = d.erpnext_item_code
+
+	if not ecommerce_items:
+		return {}
+
+	# mapping can outlive the item, same as `get_erpnext_item` which loads the item
+	existing_item_codes = set(
+		frappe.get_all(
+			"Item",
+			filters={"name": ("in", list({d.erpnext_item_code for d in ecommerce_items}))},
+			pluck="name",
+		)
+	)
+
+	item_codes = {}
+	for item in items:
+		product_id, variant_id, sku = item
+
+		item_code = sku_map.get(sku) if sku else None
+		if not item_code:
+			if variant_id:
+				item_code = variant_map.get((product_id, variant_id))
+			else:
+				item_code = product_map.get(product_id)
+
+		if item_code in existing_item_codes:
+			item_codes[item] = item_code
+
+	return item_codes
+
+
+def _get_lookup_cache_key(
+	integration: str,
+	integration_item_code: Optional[str] = None,
+	variant_id: Optional[str] = None,
+	sku: Optional[str] = None,
+	has_variants: Optional[int] = 0,
+) -> str:
+	if sku:
+		return f"ecommerce_item_lookup|{integration}|sku|{sku}"
+	return (
+		f"ecommerce_item_lookup|{integration}|item|{integration_item_code}|{cstr(variant_id)}|"
+		f"{1 if has_variants else 0}"
+	)
+
+
+def _get_lookup_cache_keys_for_item(item) -> List[str]:
+	"""All lookup keys that can resolve to the given ecommerce item."""
+	keys = [
+		_get_lookup_cache_key(item.integration, item.integration_item_code),
+		_get_lookup_cache_key(item.integration, item.integration_item_code, has_variants=1),
+	]
+	if item.variant_id:
+		keys.append(_get_lookup_cache_key(item.integration, item.integration_item_code, item.variant_id))
+	if item.sku:
+		keys.append(_get_lookup_cache_key(item.integration, sku=item.sku))
+	return keys
+
+
+def _get_cached_item_code(integration: str, key: str, get_item_code) -> Optional[str]:
+	item_code = frappe.cache().get_value(key)
+
+	if item_code is not None:
+		_increment_lookup_stats(integration, "hits")
+		return item_code or None
+
+	_increment_lookup_stats(integration, "misses")
+	item_code = get_item_code()
+	frappe.cache().set_value(
+		key,
+		item_code or _NOT_SYNCED,
+		expires_in_sec=LOOKUP_CACHE_EXPIRY if item_code else LOOKUP_CACHE_MISS_EXPIRY,
+	)
+	return item_code
+
+
+def clear_lookup_cache(keys: List[str]) -> None:
+	for key in keys:
+		frappe.cache().delete_value(key)
+
+
+def clear_lookup_cache_for_items(items) -> None:
+	"""Clear cached lookups of ecommerce items inserted without using the document, e.g. bulk insert."""
+	keys = []
+	for item in items:
+		keys.extend(_get_lookup_cache_keys_for_item(item))
+
+	clear_lookup_cache(keys)
+	frappe.db.after_commit.add(lambda: clear_lookup_cache(keys))
+
+
+def _increment_lookup_stats(integration: str, counter: str) -> None:
+	key = frappe.cache().make_key(f"ecommerce_item_lookup_stats|{integration}")
+	frappe.cache().execute_command("HINCRBY", key, counter, 1)
+
+
+def get_lookup_cache_stats(integration: str) -> Dict[str, int]:
+	"""Hits and misses of ecommerce item lookup cache for an integration."""
+	key = frappe.cache().make_key(f"ecommerce_item_lookup_stats|{integration}")
+	stats = frappe.cache().execute_command("HGETALL", key) or {}
+	stats = {frappe.safe_decode(k): int(v) for k, v in stats.items()}
+	return {"hits": stats.get("hits", 0), "misses": stats.get("misses", 0)}
+
+
 def create_ecommerce_item(
 	integration: str,
 	integration_item_code: str,
@@ -132,6 +323,7 @@ def create_ecommerce_item(
 	sku: Optional[str] = None,
 	variant_of: Optional[str] = None,
 	has_variants=0,
+	inventory_item_id: Optional[str] = None,
 ) -> None:
 	"""Create Item in erpnext and link it with Ecommerce item doctype.
 
@@ -168,6 +360,7 @@ def create_ecommerce_item(
 			"variant_id": cstr(variant_id),
 			"variant_of": cstr(variant_of),
 			"sku": sku,
+			"inventory_item_id": cstr(inventory_item_id),
 			"item_synced_on": now(),
 		}
 	)
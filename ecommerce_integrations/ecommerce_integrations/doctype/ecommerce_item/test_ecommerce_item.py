@@ -64,6 +64,45 @@ class TestEcommerceItem(unittest.TestCase):
 		self.assertEqual(a.name, b.name)
 		self.assertEqual(a.item_code, b.item_code)
 
+	def test_get_erpnext_item_codes(self):
+		self._create_doc_with_sku()
+		self._create_variant_doc()
+
+		items = [
+			("T-SHIRT", "", "TEST_ITEM_1"),
+			("T-SHIRTX", "", "TEST_ITEM_1"),
+			("T-SHIRT", "T-SHIRT-RED", ""),
+			("T-SHIRT", "Unknown variant", ""),
+			("Unknown item", "", "UNKNOWNSKU"),
+		]
+		item_codes = ecommerce_item.get_erpnext_item_codes("shopify", items)
+
+		self.assertEqual(item_codes[items[0]], "_Test Item")
+		self.assertEqual(item_codes[items[1]], "_Test Item")
+		self.assertEqual(item_codes[items[2]], "_Test Item 2")
+		self.assertNotIn(items[3], item_codes)
+		self.assertNotIn(items[4], item_codes)
+		self.assertEqual(ecommerce_item.get_erpnext_item_codes("shopify", []), {})
+
+		# mapping of an item that doesn't exist anymore
+		frappe.db.set_value("Ecommerce Item", {"sku": "TEST_ITEM_1"}, "erpnext_item_code", "_Deleted Item")
+		self.assertNotIn(items[0], ecommerce_item.get_erpnext_item_codes("shopify", items))
+
+	def test_lookup_cache(self):
+		# miss is cached and cleared when item gets synced
+		self.assertFalse(ecommerce_item.is_synced("shopify", "T-SHIRT", sku="TEST_ITEM_1"))
+		self._create_doc_with_sku()
+		self.assertTrue(ecommerce_item.is_synced("shopify", "T-SHIRT", sku="TEST_ITEM_1"))
+
+		before = ecommerce_item.get_lookup_cache_stats("shopify")
+		self.assertEqual(ecommerce_item.get_erpnext_item_code("shopify", "T-SHIRT"), "_Test Item")
+		after = ecommerce_item.get_lookup_cache_stats("shopify")
+		self.assertEqual(after["hits"], before["hits"] + 1)
+		self.assertEqual(after["misses"], before["misses"])
+
+		frappe.get_doc("Ecommerce Item", {"sku": "TEST_ITEM_1"}).delete()
+		self.assertFalse(ecommerce_item.is_synced("shopify", "T-SHIRT", sku="TEST_ITEM_1"))
+
 	def _create_doc(self):
 		"""basic test for creation of ecommerce item"""
 		frappe.get_doc(
@@ -124,6 +124,14 @@ doc_events = {
 		"on_cancel": "ecommerce_integrations.unicommerce.grn.prevent_grn_cancel",
 	},
 	"Item Price": {"on_change": "ecommerce_integrations.utils.price_list.discard_item_prices"},
+	"Item Attribute": {
+		"on_update": "ecommerce_integrations.shopify.product.clear_item_attribute_index",
+		"on_trash": "ecommerce_integrations.shopify.product.clear_item_attribute_index",
+	},
+	"Shipping Rule": {
+		"on_update": "ecommerce_integrations.shopify.order.clear_shipping_rule_index",
+		"on_trash": "ecommerce_integrations.shopify.order.clear_shipping_rule_index",
+	},
 	"Pick List": {"validate": "ecommerce_integrations.unicommerce.pick_list.validate"},
 	"Sales Invoice": {
 		"on_submit": "ecommerce_integrations.unicommerce.invoice.on_submit",
@@ -135,7 +143,10 @@ doc_events = {
 # ---------------
 
 scheduler_events = {
-	"all": ["ecommerce_integrations.shopify.inventory.update_inventory_on_shopify"],
+	"all": [
+		"ecommerce_integrations.shopify.inventory.update_inventory_on_shopify",
+		"ecommerce_integrations.shopify.product.process_item_upload_queue",
+	],
 	"daily": [],
 	"daily_long": [
 		"ecommerce_integrations.zenoti.doctype.zenoti_settings.zenoti_settings.sync_stocks"
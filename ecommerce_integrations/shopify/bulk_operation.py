@@ -0,0 +1,219 @@
+import json
+import tempfile
+import time
+from typing import Dict, Iterator, List
+
+import frappe
+import requests
+from frappe import _
+from shopify import GraphQL
+
+# https://shopify.dev/docs/api/usage/bulk-operations/queries
+RUN_QUERY_MUTATION = """
+mutation bulkOperationRunQuery($query: String!) {
+	bulkOperationRunQuery(query: $query) {
+		bulkOperation {
+			id
+			status
+		}
+		userErrors {
+			field
+			message
+		}
+	}
+}
+"""
+
+GET_OPERATION_QUERY = """
+query bulkOperation($id: ID!) {
+	node(id: $id) {
+		... on BulkOperation {
+			id
+			status
+			errorCode
+			objectCount
+			url
+		}
+	}
+}
+"""
+
+# https://shopify.dev/docs/api/usage/bulk-operations/imports
+STAGED_UPLOADS_CREATE_MUTATION = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+	stagedUploadsCreate(input: $input) {
+		stagedTargets {
+			url
+			parameters {
+				name
+				value
+			}
+		}
+		userErrors {
+			field
+			message
+		}
+	}
+}
+"""
+
+RUN_MUTATION_MUTATION = """
+mutation bulkOperationRunMutation($mutation: String!, $stagedUploadPath: String!) {
+	bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {
+		bulkOperation {
+			id
+			status
+		}
+		userErrors {
+			field
+			message
+		}
+	}
+}
+"""
+
+FINISHED_STATUSES = ("COMPLETED", "FAILED", "CANCELED", "EXPIRED")
+
+POLL_INTERVAL = 10  # seconds
+POLL_TIMEOUT = 4 * 60 * 60
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def execute_graphql(query: str, variables: Dict) -> Dict:
+	"""Execute GraphQL query using current shopify session and return `data` of response."""
+	response = json.loads(GraphQL().execute(query, variables=variables))
+	if response.get("errors"):
+		frappe.throw(
+			_("Shopify GraphQL error: {0}").format(
+				", ".join(str(e.get("message")) for e in response["errors"])
+			)
+		)
+	return response["data"]
+
+
+def run_bulk_query(query: str) -> str:
+	"""Submit a bulk query and return id of the bulk operation.
+
+	Shopify allows only one bulk query operation at a time for a shop."""
+	data = execute_graphql(RUN_QUERY_MUTATION, {"query": query})["bulkOperationRunQuery"]
+
+	if data["userErrors"]:
+		frappe.throw(
+			_("Could not start Shopify bulk operation: {0}").format(
+				", ".join(e["message"] for e in data["userErrors"])
+			)
+		)
+
+	return data["bulkOperation"]["id"]
+
+
+def run_bulk_mutation(mutation: str, variables: List[Dict]) -> str:
+	"""Upload variables of each mutation call as JSONL and submit a bulk mutation.
+
+	Returns id of the bulk operation. Result of each call contains `__lineNumber` of
+	its variables (0 based)."""
+	staged_upload_path = _stage_bulk_mutation_variables(variables)
+
+	data = execute_graphql(
+		RUN_MUTATION_MUTATION, {"mutation": mutation, "stagedUploadPath": staged_upload_path}
+	)["bulkOperationRunMutation"]
+
+	if data["userErrors"]:
+		frappe.throw(
+			_("Could not start Shopify bulk operation: {0}").format(
+				", ".join(e["message"] for e in data["userErrors"])
+			)
+		)
+
+	return data["bulkOperation"]["id"]
+
+
+def _stage_bulk_mutation_variables(variables: List[Dict]) -> str:
+	"""Upload JSONL file of variables to Shopify's staged upload target and return its path."""
+	data = execute_graphql(
+		STAGED_UPLOADS_CREATE_MUTATION,
+		{
+			"input": [
+				{
+					"resource": "BULK_MUTATION_VARIABLES",
+					"filename": "bulk_op_vars.jsonl",
+					"mimeType": "text/jsonl",
+					"httpMethod": "POST",
+				}
+			]
+		},
+	)["stagedUploadsCreate"]
+
+	if data["userErrors"]:
+		frappe.throw(
+			_("Could not upload data to Shopify: {0}").format(
+				", ".join(e["message"] for e in data["userErrors"])
+			)
+		)
+
+	target = data["stagedTargets"][0]
+	parameters = {p["name"]: p["value"] for p in target["parameters"]}
+
+	with tempfile.TemporaryFile(mode="w+b") as variables_file:
+		for line in variables:
+			variables_file.write(json.dumps(line).encode() + b"\n")
+		variables_file.seek(0)
+
+		response = requests.post(
+			target["url"],
+			data=parameters,
+			files={"file": ("bulk_op_vars.jsonl", variables_file, "text/jsonl")},
+			timeout=300,
+		)
+		response.raise_for_status()
+
+	return parameters["key"]
+
+
+def wait_for_bulk_operation(operation_id: str) -> Dict:
+	"""Poll bulk operation till it's finished and return the operation.
+
+	Raises if the operation didn't complete successfully."""
+	started = time.monotonic()
+
+	while True:
+		operation = execute_graphql(GET_OPERATION_QUERY, {"id": operation_id})["node"]
+
+		if operation["status"] in FINISHED_STATUSES:
+			break
+
+		if time.monotonic() - started > POLL_TIMEOUT:
+			frappe.throw(_("Timed out while waiting for Shopify bulk operation {0}").format(operation_id))
+
+		time.sleep(POLL_INTERVAL)
+
+	if operation["status"] != "COMPLETED":
+		frappe.throw(
+			_("Shopify bulk operation {0} ended with status {1}: {2}").format(
+				operation_id, operation["status"], operation.get("errorCode")
+			)
+		)
+
+	return operation
+
+
+def iter_bulk_operation_results(operation: Dict) -> Iterator[Dict]:
+	"""Iterate over result of a completed bulk operation, one object per line.
+
+	The JSONL file is downloaded to a temporary file in chunks and read line by line,
+	so memory usage doesn't depend on size of the result and slow consumers don't keep
+	the download open."""
+	if not operation.get("url"):
+		# no objects matched the query
+		return
+
+	with tempfile.TemporaryFile(mode="w+b") as result_file:
+		with requests.get(operation["url"], stream=True, timeout=60) as response:
+			response.raise_for_status()
+			for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+				result_file.write(chunk)
+
+		result_file.seek(0)
+		for line in result_file:
+			if line.strip():
+				yield json.loads(line)
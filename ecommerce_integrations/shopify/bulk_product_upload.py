@@ -0,0 +1,360 @@
+"""Push many ERPNext items to Shopify at once using a bulk mutation.
+
+Only new items without variants are pushed, products of existing items are
+updated when the item is saved (see `product.upload_erpnext_item`)."""
+
+from typing import Dict, List, Optional
+
+import frappe
+from frappe import _
+from frappe.query_builder.functions import IfNull
+from frappe.utils import cstr, get_datetime, now
+from frappe.utils.nestedset import get_descendants_of
+from pypika.terms import ExistsCriterion
+
+from ecommerce_integrations.ecommerce_integrations.doctype.ecommerce_item.ecommerce_item import (
+	clear_lookup_cache_for_items,
+)
+from ecommerce_integrations.shopify.bulk_operation import (
+	execute_graphql,
+	iter_bulk_operation_results,
+	run_bulk_mutation,
+	wait_for_bulk_operation,
+)
+from ecommerce_integrations.shopify.connection import temp_shopify_session
+from ecommerce_integrations.shopify.constants import (
+	ITEM_SELLING_RATE_FIELD,
+	MODULE_NAME,
+	SETTING_DOCTYPE,
+)
+from ecommerce_integrations.shopify.utils import create_shopify_log
+
+# variables of a bulk mutation can be 20MB at most, items are pushed in chunks
+BULK_UPLOAD_CHUNK_SIZE = 5000
+BULK_UPLOAD_JOB_TIMEOUT = 6 * 60 * 60
+
+# WEIGHT_TO_ERPNEXT_UOM_MAP with GraphQL's WeightUnit instead of REST units
+WEIGHT_UNIT_MAP = {"Kg": "KILOGRAMS", "Gram": "GRAMS", "Ounce": "OUNCES", "Pound": "POUNDS"}
+
+PRODUCT_CREATE_MUTATION = """
+mutation call($input: ProductInput!) {
+	productCreate(input: $input) {
+		product {
+			id
+			legacyResourceId
+			variants(first: 1) {
+				edges {
+					node {
+						legacyResourceId
+						sku
+						inventoryItem {
+							legacyResourceId
+						}
+					}
+				}
+			}
+		}
+		userErrors {
+			field
+			message
+		}
+	}
+}
+"""
+
+PRODUCT_DELETE_MUTATION = """
+mutation productDelete($input: ProductDeleteInput!) {
+	productDelete(input: $input) {
+		deletedProductId
+		userErrors {
+			field
+			message
+		}
+	}
+}
+"""
+
+
+@frappe.whitelist()
+def push_items_to_shopify(item_group: Optional[str] = None, modified_since: Optional[str] = None):
+	"""Enqueue bulk upload of ERPNext items that aren't on Shopify yet."""
+	frappe.only_for("System Manager")
+
+	setting = frappe.get_doc(SETTING_DOCTYPE)
+	if not setting.is_enabled():
+		frappe.throw(_("Shopify integration is not enabled."))
+
+	frappe.enqueue(
+		upload_items_in_bulk,
+		queue="long",
+		timeout=BULK_UPLOAD_JOB_TIMEOUT,
+		item_group=item_group,
+		modified_since=modified_since,
+	)
+	frappe.msgprint(_("Items will be pushed to Shopify in background. Check logs for progress."))
+
+
+@temp_shopify_session
+def upload_items_in_bulk(item_group: Optional[str] = None, modified_since: Optional[str] = None):
+	items = get_items_to_upload(item_group, modified_since)
+	if not items:
+		return
+
+	log = create_shopify_log(
+		status="Queued",
+		method="ecommerce_integrations.shopify.bulk_product_upload.upload_items_in_bulk",
+		message=f"Pushing {len(items)} items to Shopify",
+		make_new=True,
+	)
+
+	setting = frappe.get_doc(SETTING_DOCTYPE)
+	uploaded = []
+	skipped = 0
+	errors = []
+
+	for start in range(0, len(items), BULK_UPLOAD_CHUNK_SIZE):
+		chunk = items[start : start + BULK_UPLOAD_CHUNK_SIZE]
+		chunk_uploaded, chunk_errors = _upload_items(chunk, setting)
+
+		# products are already created on Shopify, links are saved even if next chunk fails
+		chunk_linked = _create_ecommerce_items(chunk_uploaded)
+		frappe.db.commit()
+
+		uploaded.extend(chunk_linked)
+		errors.extend(chunk_errors)
+
+		# items linked meanwhile would be duplicated on Shopify by their new products
+		linked_items = {item.name for item in chunk_linked}
+		orphaned = [item for item in chunk_uploaded if item.name not in linked_items]
+		skipped += len(orphaned)
+		errors.extend(_delete_orphaned_products(orphaned))
+
+	log.message = (
+		"Items pushed to Shopify\n"
+		f"Uploaded items: {len(uploaded)}\n"
+		f"Skipped items (linked meanwhile): {skipped}\n"
+		f"Failed items: {len(errors)}\n" + "\n".join(errors)
+	)
+	log.status = "Error" if errors else "Success"
+	log.save(ignore_permissions=True)
+
+
+def get_items_to_upload(
+	item_group: Optional[str] = None, modified_since: Optional[str] = None
+) -> List[frappe._dict]:
+	"""Enabled items without variants that aren't linked to a Shopify product yet."""
+	item = frappe.qb.DocType("Item")
+	ecommerce_item = frappe.qb.DocType("Ecommerce Item")
+
+	synced_item = (
+		frappe.qb.from_(ecommerce_item)
+		.select(ecommerce_item.name)
+		.where(ecommerce_item.integration == MODULE_NAME)
+		.where(ecommerce_item.erpnext_item_code == item.name)
+	)
+
+	query = (
+		frappe.qb.from_(item)
+		.select(
+			item.name,
+			item.item_name,
+			item.description,
+			item.item_group,
+			item.is_stock_item,
+			item.weight_per_unit,
+			item.weight_uom,
+			item[ITEM_SELLING_RATE_FIELD],
+		)
+		.where(item.has_variants == 0)
+		.where(IfNull(item.variant_of, "") == "")
+		.where(item.disabled == 0)
+		.where(ExistsCriterion(synced_item).negate())
+		.orderby(item.name)
+	)
+	if item_group:
+		query = query.where(
+			item.item_group.isin(get_descendants_of("Item Group", item_group) + [item_group])
+		)
+	if modified_since:
+		query = query.where(item.modified >= get_datetime(modified_since))
+
+	return query.run(as_dict=True)
+
+
+def _upload_items(items: List[frappe._dict], setting):
+	"""Create products using a bulk mutation, returns uploaded items and errors."""
+	variables = [{"input": _get_product_input(item, setting)} for item in items]
+
+	operation_id = run_bulk_mutation(PRODUCT_CREATE_MUTATION, variables)
+	operation = wait_for_bulk_operation(operation_id)
+
+	uploaded = []
+	errors = []
+	for result in iter_bulk_operation_results(operation):
+		item = items[result["__lineNumber"]]
+		data = (result.get("data") or {}).get("productCreate") or {}
+
+		if data.get("product"):
+			item.product = data["product"]
+			uploaded.append(item)
+		else:
+			messages = [e["message"] for e in data.get("userErrors") or result.get("errors") or []]
+			errors.append(f"{item.name}: {', '.join(messages)}")
+
+	return uploaded, errors
+
+
+def _get_product_input(item, setting) -> Dict:
+	"""Product for `productCreate`, equivalent of `product.map_erpnext_item_to_shopify`."""
+	variant = {"sku": item.name}
+
+	if item.get(ITEM_SELLING_RATE_FIELD) is not None:
+		variant["price"] = item.get(ITEM_SELLING_RATE_FIELD)
+	if item.is_stock_item:
+		# inventory is updated by scheduled job
+		variant["inventoryManagement"] = "SHOPIFY"
+	if item.weight_uom in WEIGHT_UNIT_MAP:
+		variant["weight"] = item.weight_per_unit
+		variant["weightUnit"] = WEIGHT_UNIT_MAP[item.weight_uom]
+
+	return {
+		"title": item.item_name,
+		"descriptionHtml": item.description,
+		"productType": item.item_group,
+		"status": "ACTIVE" if setting.sync_new_item_as_active else "DRAFT",
+		"variants": [variant],
+	}
+
+
+def _create_ecommerce_items(items: List[frappe._dict]) -> List[frappe._dict]:
+	"""Link uploaded items with created products using a single insert.
+
+	Bulk insert skips `EcommerceItem.check_unique_constraints`, items linked meanwhile
+	(e.g. by `upload_erpnext_item`) are checked again and skipped.
+
+	returns: items that were linked"""
+	items = _exclude_linked_items(items)
+	if not items:
+		return items
+
+	fields = [
+		"name",
+		"creation",
+		"modified",
+		"owner",
+		"modified_by",
+		"erpnext_item_code",
+		"integration",
+		"integration_item_code",
+		"variant_id",
+		"sku",
+		"inventory_item_id",
+		"has_variants",
+		"inventory_synced_on",
+	]
+
+	timestamp = now()
+	ecommerce_items = []
+	values = []
+	for item in items:
+		variant = item.product["variants"]["edges"][0]["node"]
+		ecommerce_item = frappe._dict(
+			integration=MODULE_NAME,
+			integration_item_code=cstr(item.product["legacyResourceId"]),
+			variant_id=cstr(variant["legacyResourceId"]),
+			sku=cstr(variant["sku"]),
+		)
+		ecommerce_items.append(ecommerce_item)
+
+		values.append(
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				frappe.session.user,
+				frappe.session.user,
+				item.name,
+				MODULE_NAME,
+				ecommerce_item.integration_item_code,
+				ecommerce_item.variant_id,
+				ecommerce_item.sku,
+				cstr((variant.get("inventoryItem") or {}).get("legacyResourceId")),
+				0,
+				# not synced, same as EcommerceItem.set_defaults
+				get_datetime("1970-01-01"),
+			)
+		)
+
+	frappe.db.bulk_insert("Ecommerce Item", fields, values)
+
+	# misses of lookups are cached for a short time
+	clear_lookup_cache_for_items(ecommerce_items)
+	return items
+
+
+def _delete_orphaned_products(items: List[frappe._dict]) -> List[str]:
+	"""Delete products created for items that were linked to another product meanwhile.
+
+	Products that got linked themselves (e.g. by product import) are kept.
+
+	returns: errors"""
+	if not items:
+		return []
+
+	product_ids = [cstr(item.product["legacyResourceId"]) for item in items]
+	linked_product_ids = set(
+		frappe.get_all(
+			"Ecommerce Item",
+			filters={"integration": MODULE_NAME, "integration_item_code": ("in", product_ids)},
+			pluck="integration_item_code",
+		)
+	)
+
+	errors = []
+	for item, product_id in zip(items, product_ids):
+		if product_id in linked_product_ids:
+			continue
+
+		try:
+			data = execute_graphql(PRODUCT_DELETE_MUTATION, {"input": {"id": item.product["id"]}})
+			messages = [e["message"] for e in data["productDelete"]["userErrors"]]
+		except Exception as e:
+			messages = [str(e)]
+
+		if messages:
+			errors.append(
+				f"{item.name}: already linked to a Shopify product, "
+				f"could not delete duplicate product {product_id}: {', '.join(messages)}"
+			)
+
+	return errors
+
+
+def _exclude_linked_items(items: List[frappe._dict]) -> List[frappe._dict]:
+	if not items:
+		return items
+
+	product_ids = [cstr(item.product["legacyResourceId"]) for item in items]
+	skus = [cstr(item.product["variants"]["edges"][0]["node"]["sku"]) for item in items]
+
+	linked = frappe.get_all(
+		"Ecommerce Item",
+		filters={"integration": MODULE_NAME},
+		or_filters={
+			"erpnext_item_code": ("in", [item.name for item in items]),
+			"integration_item_code": ("in", product_ids),
+			"sku": ("in", [sku for sku in skus if sku] or [""]),
+		},
+		fields=["erpnext_item_code", "integration_item_code", "sku"],
+	)
+	linked_item_codes = {d.erpnext_item_code for d in linked}
+	linked_product_ids = {d.integration_item_code for d in linked}
+	linked_skus = {d.sku for d in linked if d.sku}
+
+	return [
+		item
+		for item, product_id, sku in zip(items, product_ids, skus)
+		if item.name not in linked_item_codes
+		and product_id not in linked_product_ids
+		and sku not in linked_skus
+	]
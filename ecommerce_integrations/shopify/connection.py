@@ -3,10 +3,12 @@ import functools
 import hashlib
 import hmac
 import json
-from typing import List
+import time
+from typing import List, Optional
 
 import frappe
 from frappe import _
+from frappe.utils import cint
 from shopify.resources import Webhook
 from shopify.session import Session
 
@@ -18,6 +20,37 @@ from ecommerce_integrations.shopify.constants import (
 )
 from ecommerce_integrations.shopify.utils import create_shopify_log
 
+SHARED_SECRET_CACHE_KEY = "shopify_webhook_shared_secret"
+
+# Shopify retries a webhook for 48 hours if it doesn't get a response in time
+WEBHOOK_DEDUPLICATION_TTL = 48 * 60 * 60
+# topics which can only occur once for an order, even if webhook id is different
+SINGLE_EVENT_TOPICS = ("orders/create", "orders/paid", "orders/fulfilled", "orders/cancelled")
+
+# Events of an order are processed one after another while different orders are
+# processed in parallel. Payload of an event is passed to its job, redis only keeps
+# sequence numbers of the order to decide which job goes next. See `process_request`.
+ORDER_EVENTS_KEY = "shopify_order_events|{}"
+ORDER_EVENTS_TTL = 48 * 60 * 60
+ORDER_EVENT_JOB_TIMEOUT = 300
+# job of an event that isn't next in sequence is enqueued again after this delay
+ORDER_EVENT_RETRY_DELAY = 1
+# an event doesn't wait longer than this for events before it, e.g. if their job was deleted
+ORDER_EVENT_MAX_WAIT = 60 * 60
+# dedup keys are kept for this long while a webhook is being processed, so a webhook
+# whose job was lost can be delivered again.
+WEBHOOK_PROCESSING_TTL = ORDER_EVENT_MAX_WAIT + ORDER_EVENT_JOB_TIMEOUT
+
+# mark an event as done unless a later event is already marked done
+FINISH_ORDER_EVENT_SCRIPT = """
+local done = tonumber(redis.call("HGET", KEYS[1], "done") or "0")
+if tonumber(ARGV[1]) > done then
+	redis.call("HSET", KEYS[1], "done", ARGV[1])
+end
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+return 1
+"""
+
 
 def temp_shopify_session(func):
 	"""Any function that needs to access shopify api needs this decorator. The decorator starts a temp session that's destroyed when function returns."""
@@ -99,33 +132,218 @@ def store_request_data() -> None:
 
 		_validate_request(frappe.request, hmac_header)
 
-		data = json.loads(frappe.request.data)
 		event = frappe.request.headers.get("X-Shopify-Topic")
+		data = frappe.safe_decode(frappe.request.data)
+		order_id = get_order_id(event, json.loads(data))
+
+		dedup_keys = _get_deduplication_keys(
+			frappe.request.headers.get("X-Shopify-Webhook-Id"), event, order_id
+		)
+		if not _mark_webhook_as_received(dedup_keys):
+			# already received, acknowledge without processing again
+			_increment_duplicate_webhook_count()
+			return
+
+		try:
+			# raw body is parsed and logged by background job, keep the web request short.
+			process_request(data, event, order_id=order_id, dedup_keys=dedup_keys)
+		except Exception:
+			# allow Shopify to deliver it again
+			_clear_received_webhook(dedup_keys)
+			raise
+
+
+def process_request(data, event, order_id=None, dedup_keys=None):
+	"""Enqueue webhook data for processing, data can be parsed dict or raw JSON string.
+
+	Each event of an order gets the next sequence number of the order and its job
+	waits till events before it are processed. This keeps events of an order in
+	sequence (e.g. order is created before it's invoiced) while any number of orders
+	can be processed in parallel by the workers. Payload is only stored in the job."""
+	if order_id is None and isinstance(data, dict):
+		order_id = get_order_id(event, data)
+
+	if not order_id:
+		frappe.enqueue(
+			method=process_webhook,
+			queue="short",
+			timeout=ORDER_EVENT_JOB_TIMEOUT,
+			is_async=True,
+			topic=event,
+			data=data,
+			dedup_keys=dedup_keys,
+		)
+		return
+
+	events_key = frappe.cache().make_key(ORDER_EVENTS_KEY.format(order_id))
+	sequence = frappe.cache().execute_command("HINCRBY", events_key, "last", 1)
+	frappe.cache().execute_command("EXPIRE", events_key, ORDER_EVENTS_TTL)
+
+	try:
+		_enqueue_order_event(order_id, sequence, event, data, dedup_keys)
+	except Exception:
+		# don't let next events of the order wait for this one
+		_finish_order_event(events_key, sequence)
+		raise
+
+
+def _enqueue_order_event(order_id, sequence, topic, data, dedup_keys, waiting_since=None):
+	frappe.enqueue(
+		method=process_order_event,
+		queue="short",
+		timeout=ORDER_EVENT_JOB_TIMEOUT,
+		is_async=True,
+		order_id=order_id,
+		sequence=sequence,
+		topic=topic,
+		data=data,
+		dedup_keys=dedup_keys,
+		waiting_since=waiting_since,
+	)
 
-		process_request(data, event)
 
+def get_order_id(topic, payload):
+	"""Shopify order ID of a webhook payload, order edits have it in `order_edit`."""
+	if topic == "orders/edited":
+		return (payload.get("order_edit") or {}).get("order_id")
+	return payload.get("id")
 
-def process_request(data, event):
 
-	# create log
-	log = create_shopify_log(method=EVENT_MAPPER[event], request_data=data)
+def process_order_event(order_id, sequence, topic, data, dedup_keys=None, waiting_since=None):
+	"""Background job that processes an event of an order after events before it.
 
-	# enqueue backround job
-	frappe.enqueue(
-		method=EVENT_MAPPER[event],
-		queue="short",
-		timeout=300,
-		is_async=True,
-		**{"payload": data, "request_id": log.name},
+	If events before it aren't processed yet, the job is enqueued again with the same
+	payload instead of holding a worker."""
+	events_key = frappe.cache().make_key(ORDER_EVENTS_KEY.format(order_id))
+	waiting_since = waiting_since or time.time()
+
+	if not _is_next_order_event(events_key, cint(sequence), waiting_since):
+		time.sleep(ORDER_EVENT_RETRY_DELAY)
+		_enqueue_order_event(order_id, sequence, topic, data, dedup_keys, waiting_since)
+		return
+
+	frappe.cache().execute_command("HSET", events_key, "started", sequence, "started_at", time.time())
+	try:
+		process_webhook(topic, data, dedup_keys=dedup_keys)
+	finally:
+		_finish_order_event(events_key, sequence)
+
+
+def _is_next_order_event(events_key, sequence, waiting_since) -> bool:
+	done, started, started_at = frappe.cache().execute_command(
+		"HMGET", events_key, "done", "started", "started_at"
 	)
+	if cint(done) >= sequence - 1:
+		return True
+
+	if not frappe.cache().execute_command("EXISTS", events_key):
+		# sequence of the order is lost, nothing to wait for
+		return True
+
+	if cint(started) == sequence - 1 and time.time() - float(started_at) > ORDER_EVENT_JOB_TIMEOUT:
+		# previous event's job was killed
+		return True
+
+	if time.time() - waiting_since > ORDER_EVENT_MAX_WAIT:
+		frappe.log_error(title=f"Shopify: events before {sequence} of {events_key} weren't processed")
+		return True
+
+	return False
+
+
+def _finish_order_event(events_key, sequence) -> None:
+	frappe.cache().register_script(FINISH_ORDER_EVENT_SCRIPT)(
+		keys=[events_key], args=[sequence, ORDER_EVENTS_TTL]
+	)
+
+
+def process_webhook(topic, data, dedup_keys=None):
+	"""Background job that creates log of a webhook and processes it.
+
+	If processing fails the webhook is no longer considered received, so Shopify
+	can deliver it again."""
+	payload = json.loads(data) if isinstance(data, str) else data
+	method = EVENT_MAPPER[topic]
+
+	log = create_shopify_log(method=method, request_data=payload, make_new=True)
+
+	try:
+		frappe.get_attr(method)(payload=payload, request_id=log.name)
+	except Exception:
+		_clear_received_webhook(dedup_keys)
+		raise
+
+	# handlers log their own failures instead of raising
+	if frappe.db.get_value("Ecommerce Integration Log", log.name, "status") == "Error":
+		_clear_received_webhook(dedup_keys)
+	else:
+		_mark_webhook_as_processed(dedup_keys)
 
 
 def _validate_request(req, hmac_header):
-	settings = frappe.get_doc(SETTING_DOCTYPE)
-	secret_key = settings.shared_secret
+	secret_key = get_shared_secret()
 
 	sig = base64.b64encode(hmac.new(secret_key.encode("utf8"), req.data, hashlib.sha256).digest())
 
-	if sig != bytes(hmac_header.encode()):
+	if not hmac_header or not hmac.compare_digest(sig, hmac_header.encode()):
 		create_shopify_log(status="Error", request_data=req.data)
 		frappe.throw(_("Unverified Webhook Data"))
+
+
+def _get_deduplication_keys(webhook_id, topic, order_id) -> List[str]:
+	keys = []
+	if webhook_id:
+		keys.append(f"shopify_webhook|{webhook_id}")
+
+	if topic in SINGLE_EVENT_TOPICS and order_id:
+		keys.append(f"shopify_webhook|{topic}|{order_id}")
+
+	return [frappe.cache().make_key(key) for key in keys]
+
+
+def _mark_webhook_as_received(keys: List[str]) -> bool:
+	"""Mark webhook as being processed, returns False if it was received before.
+
+	Keys expire soon unless the webhook is processed successfully, see `process_webhook`."""
+	is_new = True
+	for key in keys:
+		# SET NX, only one of the concurrent deliveries can set the key
+		is_new = bool(frappe.cache().set(key, 1, nx=True, ex=WEBHOOK_PROCESSING_TTL)) and is_new
+	return is_new
+
+
+def _mark_webhook_as_processed(keys: Optional[List[str]]) -> None:
+	for key in keys or []:
+		frappe.cache().expire(key, WEBHOOK_DEDUPLICATION_TTL)
+
+
+def _clear_received_webhook(keys: Optional[List[str]]) -> None:
+	if keys:
+		frappe.cache().delete(*keys)
+
+
+def _increment_duplicate_webhook_count() -> None:
+	frappe.cache().execute_command(
+		"HINCRBY", frappe.cache().make_key("shopify_webhook_stats"), "duplicates", 1
+	)
+
+
+def get_duplicate_webhook_count() -> int:
+	"""Number of duplicate webhook deliveries that were ignored."""
+	count = frappe.cache().execute_command(
+		"HGET", frappe.cache().make_key("shopify_webhook_stats"), "duplicates"
+	)
+	return int(count or 0)
+
+
+def get_shared_secret() -> str:
+	"""Shared secret used to verify webhooks, cached till Shopify Setting is updated."""
+	secret = frappe.cache().get_value(SHARED_SECRET_CACHE_KEY)
+	if secret is None:
+		secret = frappe.db.get_single_value(SETTING_DOCTYPE, "shared_secret") or ""
+		frappe.cache().set_value(SHARED_SECRET_CACHE_KEY, secret)
+	return secret
+
+
+def clear_shared_secret_cache() -> None:
+	frappe.cache().delete_value(SHARED_SECRET_CACHE_KEY)
@@ -37,7 +37,9 @@ ORDER_STATUS_FIELD = "shopify_order_status"
 FULLFILLMENT_ID_FIELD = "shopify_fulfillment_id"
 SUPPLIER_ID_FIELD = "shopify_supplier_id"
 ADDRESS_ID_FIELD = "shopify_address_id"
+ADDRESS_HASH_FIELD = "shopify_address_hash"
 ORDER_ITEM_DISCOUNT_FIELD = "shopify_item_discount"
+ORDER_LINE_ITEM_ID_FIELD = "shopify_line_item_id"
 ITEM_SELLING_RATE_FIELD = "shopify_selling_rate"
 
 # ERPNext already defines the default UOMs from Shopify but names are different
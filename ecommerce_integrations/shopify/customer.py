@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Any, Dict, Optional
 
 import frappe
@@ -6,6 +8,7 @@ from frappe.utils import cstr, validate_phone_number
 
 from ecommerce_integrations.controllers.customer import EcommerceCustomer
 from ecommerce_integrations.shopify.constants import (
+	ADDRESS_HASH_FIELD,
 	ADDRESS_ID_FIELD,
 	CUSTOMER_ID_FIELD,
 	MODULE_NAME,
@@ -13,6 +16,10 @@ from ecommerce_integrations.shopify.constants import (
 )
 
 
+# fields that are set only while creating an address
+ADDRESS_EXCLUDE_IN_UPDATE = ("address_title", "address_type")
+
+
 class ShopifyCustomer(EcommerceCustomer):
 	def __init__(self, customer_id: str):
 		self.setting = frappe.get_doc(SETTING_DOCTYPE)
@@ -51,6 +58,7 @@ class ShopifyCustomer(EcommerceCustomer):
 	) -> None:
 		"""Create customer address(es) using Customer dict provided by shopify."""
 		address_fields = _map_address_fields(shopify_address, customer_name, address_type, email)
+		address_fields[ADDRESS_HASH_FIELD] = _get_address_hash(address_fields)
 		super().create_customer_address(address_fields)
 
 	def update_existing_addresses(self, customer):
@@ -60,10 +68,18 @@ class ShopifyCustomer(EcommerceCustomer):
 		customer_name = cstr(customer.get("first_name")) + " " + cstr(customer.get("last_name"))
 		email = customer.get("email")
 
+		existing_addresses = self.get_customer_addresses(
+			["Billing", "Shipping"], fields=[ADDRESS_HASH_FIELD]
+		)
+
 		if billing_address:
-			self._update_existing_address(customer_name, billing_address, "Billing", email)
+			self._update_existing_address(
+				customer_name, billing_address, "Billing", email, existing_addresses.get("Billing")
+			)
 		if shipping_address:
-			self._update_existing_address(customer_name, shipping_address, "Shipping", email)
+			self._update_existing_address(
+				customer_name, shipping_address, "Shipping", email, existing_addresses.get("Shipping")
+			)
 
 	def _update_existing_address(
 		self,
@@ -71,18 +87,23 @@ class ShopifyCustomer(EcommerceCustomer):
 		shopify_address: Dict[str, Any],
 		address_type: str = "Billing",
 		email: Optional[str] = None,
+		existing_address: Optional[Dict[str, Any]] = None,
 	) -> None:
-		old_address = self.get_customer_address_doc(address_type)
-
-		if not old_address:
+		if not existing_address:
 			self.create_customer_address(customer_name, shopify_address, address_type, email)
-		else:
-			exclude_in_update = ["address_title", "address_type"]
-			new_values = _map_address_fields(shopify_address, customer_name, address_type, email)
+			return
+
+		new_values = _map_address_fields(shopify_address, customer_name, address_type, email)
+		address_hash = _get_address_hash(new_values)
+		if existing_address.get(ADDRESS_HASH_FIELD) == address_hash:
+			# same as last synced address, avoid saving again
+			return
 
-			old_address.update({k: v for k, v in new_values.items() if k not in exclude_in_update})
-			old_address.flags.ignore_mandatory = True
-			old_address.save()
+		old_address = frappe.get_doc("Address", existing_address.name)
+		old_address.update({k: v for k, v in new_values.items() if k not in ADDRESS_EXCLUDE_IN_UPDATE})
+		old_address.set(ADDRESS_HASH_FIELD, address_hash)
+		old_address.flags.ignore_mandatory = True
+		old_address.save()
 
 	def create_customer_contact(self, shopify_customer: Dict[str, Any]) -> None:
 
@@ -129,3 +150,13 @@ def _map_address_fields(shopify_address, customer_name, address_type, email):
 		address_fields["phone"] = phone
 
 	return address_fields
+
+
+def _get_address_hash(address_fields: Dict[str, Any]) -> str:
+	"""Fingerprint of mapped address fields, used for skipping update of unchanged addresses."""
+	values = {
+		k: cstr(v)
+		for k, v in address_fields.items()
+		if k not in ADDRESS_EXCLUDE_IN_UPDATE and k != ADDRESS_HASH_FIELD
+	}
+	return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()
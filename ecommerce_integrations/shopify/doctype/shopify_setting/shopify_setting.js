@@ -29,6 +29,9 @@ frappe.ui.form.on("Shopify Setting", {
 		frm.add_custom_button(__("Import Products"), function () {
 			frappe.set_route("shopify-import-products");
 		});
+		frm.add_custom_button(__("Push Items to Shopify"), () => {
+			frm.trigger("push_items_to_shopify");
+		});
 		frm.add_custom_button(__("View Logs"), () => {
 			frappe.set_route("List", "Ecommerce Integration Log", {
 				integration: "Shopify",
@@ -37,6 +40,40 @@ frappe.ui.form.on("Shopify Setting", {
 		frm.trigger("setup_queries");
 	},
 
+	push_items_to_shopify: function (frm) {
+		const dialog = new frappe.ui.Dialog({
+			title: __("Push Items to Shopify"),
+			fields: [
+				{
+					fieldtype: "HTML",
+					options: __(
+						"New items without variants that aren't on Shopify yet are pushed in bulk."
+					),
+				},
+				{
+					fieldname: "item_group",
+					label: __("Item Group"),
+					fieldtype: "Link",
+					options: "Item Group",
+				},
+				{
+					fieldname: "modified_since",
+					label: __("Modified Since"),
+					fieldtype: "Datetime",
+				},
+			],
+			primary_action_label: __("Push"),
+			primary_action: (values) => {
+				frappe.call({
+					method: "ecommerce_integrations.shopify.bulk_product_upload.push_items_to_shopify",
+					args: values,
+				});
+				dialog.hide();
+			},
+		});
+		dialog.show();
+	},
+
 	setup_queries: function (frm) {
 		const warehouse_query = () => {
 			return {
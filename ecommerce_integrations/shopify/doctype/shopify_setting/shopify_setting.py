@@ -17,16 +17,23 @@ from ecommerce_integrations.controllers.setting import (
 )
 from ecommerce_integrations.shopify import connection
 from ecommerce_integrations.shopify.constants import (
+	ADDRESS_HASH_FIELD,
 	ADDRESS_ID_FIELD,
 	CUSTOMER_ID_FIELD,
 	FULLFILLMENT_ID_FIELD,
 	ITEM_SELLING_RATE_FIELD,
 	ORDER_ID_FIELD,
 	ORDER_ITEM_DISCOUNT_FIELD,
+	ORDER_LINE_ITEM_ID_FIELD,
 	ORDER_NUMBER_FIELD,
 	ORDER_STATUS_FIELD,
 	SUPPLIER_ID_FIELD,
 )
+from ecommerce_integrations.shopify.order import (
+	OLD_ORDERS_CHUNK_DOCTYPE,
+	clear_tax_account_cache,
+	get_old_orders_sync_progress,
+)
 from ecommerce_integrations.shopify.utils import (
 	ensure_old_connector_is_disabled,
 	migrate_from_old_connector,
@@ -37,6 +44,9 @@ class ShopifySetting(SettingController):
 	def is_enabled(self) -> bool:
 		return bool(self.enable_shopify)
 
+	def onload(self):
+		self.update(get_old_orders_sync_progress(self))
+
 	def validate(self):
 		ensure_old_connector_is_disabled()
 
@@ -45,11 +55,16 @@ class ShopifySetting(SettingController):
 		self._handle_webhooks()
 		self._validate_warehouse_links()
 		self._initalize_default_values()
+		self._keep_old_orders_sync_progress()
+		self._reset_old_orders_sync()
 
 		if self.is_enabled():
 			setup_custom_fields()
 
 	def on_update(self):
+		connection.clear_shared_secret_cache()
+		clear_tax_account_cache()
+
 		if self.is_enabled() and not self.is_old_data_migrated:
 			migrate_from_old_connector()
 
@@ -76,6 +91,45 @@ class ShopifySetting(SettingController):
 			if not wh_map.erpnext_warehouse:
 				frappe.throw(_("ERPNext warehouse required in warehouse map table."))
 
+	def _keep_old_orders_sync_progress(self):
+		"""Chunks are updated by sync jobs, don't overwrite them with values loaded in form."""
+		chunks = {
+			chunk.name: chunk
+			for chunk in frappe.get_all(
+				OLD_ORDERS_CHUNK_DOCTYPE,
+				filters={"parent": self.name, "parentfield": "old_orders_sync_chunks"},
+				fields=[
+					"name",
+					"status",
+					"synced_orders",
+					"last_order_id",
+					"last_order_created_at",
+					"next_page_url",
+				],
+			)
+		}
+		for chunk in self.old_orders_sync_chunks:
+			chunk.update(chunks.get(chunk.name) or {})
+		self.update(get_old_orders_sync_progress(self))
+
+	def _reset_old_orders_sync(self):
+		"""Sync old orders from start if it's enabled again or configuration is changed."""
+		sync_fields = (
+			"sync_old_orders",
+			"old_orders_from",
+			"old_orders_to",
+			"use_bulk_operation_for_old_orders",
+			"old_orders_sync_jobs",
+		)
+		if not self.sync_old_orders or not any(self.has_value_changed(f) for f in sync_fields):
+			return
+
+		self.old_orders_sync_chunks = []
+		self.old_orders_estimated_total = 0
+		self.old_orders_synced = 0
+		self.old_orders_sync_rate = 0
+		self.old_orders_sync_started_on = None
+
 	def _initalize_default_values(self):
 		if not self.last_inventory_sync:
 			self.last_inventory_sync = get_datetime("1970-01-01")
@@ -148,7 +202,17 @@ def setup_custom_fields():
 				insert_after="fax",
 				read_only=1,
 				print_hide=1,
-			)
+			),
+			dict(
+				fieldname=ADDRESS_HASH_FIELD,
+				label="Shopify Address Hash",
+				fieldtype="Data",
+				insert_after=ADDRESS_ID_FIELD,
+				read_only=1,
+				hidden=1,
+				no_copy=1,
+				print_hide=1,
+			),
 		],
 		"Sales Order": [
 			dict(
@@ -184,6 +248,15 @@ def setup_custom_fields():
 				insert_after="discount_and_margin",
 				read_only=1,
 			),
+			dict(
+				fieldname=ORDER_LINE_ITEM_ID_FIELD,
+				label="Shopify Line Item Id",
+				fieldtype="Data",
+				insert_after=ORDER_ITEM_DISCOUNT_FIELD,
+				read_only=1,
+				no_copy=1,
+				print_hide=1,
+			),
 		],
 		"Delivery Note": [
 			dict(
@@ -62,9 +62,10 @@ def create_delivery_note(shopify_order, setting, so):
 
 def get_fulfillment_items(dn_items, fulfillment_items, location_id=None):
 	# local import to avoid circular imports
-	from ecommerce_integrations.shopify.product import get_item_code
+	from ecommerce_integrations.shopify.product import get_item_code, get_item_codes
 
 	fulfillment_items = deepcopy(fulfillment_items)
+	item_codes = get_item_codes(fulfillment_items)
 
 	setting = frappe.get_cached_doc(SETTING_DOCTYPE)
 	wh_map = setting.get_integration_to_erpnext_wh_mapping()
@@ -76,7 +77,7 @@ def get_fulfillment_items(dn_items, fulfillment_items, location_id=None):
 		nonlocal fulfillment_items
 
 		for item in fulfillment_items:
-			if get_item_code(item) == dn_item.item_code:
+			if get_item_code(item, item_codes) == dn_item.item_code:
 				fulfillment_items.remove(item)
 				return item
 
@@ -1,19 +1,50 @@
+import json
 from collections import Counter
+from typing import List
 
 import frappe
-from frappe.utils import cint, create_batch, now
+from frappe.utils import cint, create_batch, cstr, now
 from pyactiveresource.connection import ResourceNotFound
-from shopify.resources import InventoryLevel, Variant
+from shopify import GraphQL
+from shopify.resources import InventoryLevel, Product, Variant
 
 from ecommerce_integrations.controllers.inventory import (
+	filter_changed_inventory_levels,
 	get_inventory_levels,
 	update_inventory_sync_status,
+	update_inventory_synced_qty,
 )
 from ecommerce_integrations.controllers.scheduling import need_to_run
 from ecommerce_integrations.shopify.connection import temp_shopify_session
 from ecommerce_integrations.shopify.constants import MODULE_NAME, SETTING_DOCTYPE
+from ecommerce_integrations.shopify.product import get_variant_inventory_item_id
 from ecommerce_integrations.shopify.utils import create_shopify_log
 
+# max quantities accepted by a single inventorySetQuantities mutation
+INVENTORY_BATCH_SIZE = 250
+
+# max products per page of Product.find
+PRODUCT_PAGE_SIZE = 250
+
+# userErrors codes meaning that the variant or location doesn't exist anymore
+NOT_FOUND_ERROR_CODES = (
+	"INVALID_INVENTORY_ITEM",
+	"INVALID_LOCATION",
+	"ITEM_NOT_STOCKED_AT_LOCATION",
+)
+
+SET_QUANTITIES_MUTATION = """
+mutation inventorySetQuantities($input: InventorySetQuantitiesInput!) {
+	inventorySetQuantities(input: $input) {
+		userErrors {
+			code
+			field
+			message
+		}
+	}
+}
+"""
+
 
 def update_inventory_on_shopify() -> None:
 	"""Upload stock levels from ERPNext to Shopify.
@@ -39,21 +70,30 @@ def update_inventory_on_shopify() -> None:
 def upload_inventory_data_to_shopify(inventory_levels, warehous_map) -> None:
 	synced_on = now()
 
+	for d in inventory_levels:
+		# shopify doesn't support fractional quantity
+		d.qty = cint(d.actual_qty) - cint(d.reserved_qty)
+
+	inventory_levels, unchanged_items = filter_changed_inventory_levels(inventory_levels)
+	update_inventory_sync_status(unchanged_items, time=synced_on)
+	frappe.db.commit()
+
+	setting = frappe.get_cached_doc(SETTING_DOCTYPE)
+	if setting.bulk_inventory_sync:
+		_bulk_upload_inventory_data(inventory_levels, warehous_map, synced_on)
+		return
+
 	for inventory_sync_batch in create_batch(inventory_levels, 50):
 		for d in inventory_sync_batch:
 			d.shopify_location_id = warehous_map[d.warehouse]
 
 			try:
-				variant = Variant.find(d.variant_id)
-				inventory_id = variant.inventory_item_id
-
 				InventoryLevel.set(
 					location_id=d.shopify_location_id,
-					inventory_item_id=inventory_id,
-					# shopify doesn't support fractional quantity
-					available=cint(d.actual_qty) - cint(d.reserved_qty),
+					inventory_item_id=_get_inventory_item_id(d),
+					available=d.qty,
 				)
-				update_inventory_sync_status(d.ecom_item, time=synced_on)
+				update_inventory_synced_qty([d], time=synced_on)
 				d.status = "Success"
 			except ResourceNotFound:
 				# Variant or location is deleted, mark as last synced and ignore.
@@ -68,6 +108,179 @@ def upload_inventory_data_to_shopify(inventory_levels, warehous_map) -> None:
 		_log_inventory_update_status(inventory_sync_batch)
 
 
+def _bulk_upload_inventory_data(inventory_levels, warehous_map, synced_on) -> None:
+	"""Set stock levels using GraphQL, INVENTORY_BATCH_SIZE levels per request."""
+
+	for inventory_sync_batch in create_batch(inventory_levels, INVENTORY_BATCH_SIZE):
+		levels_to_set = []
+		for d in inventory_sync_batch:
+			d.shopify_location_id = warehous_map[d.warehouse]
+
+			try:
+				_get_inventory_item_id(d)
+				levels_to_set.append(d)
+			except ResourceNotFound:
+				d.status = "Not Found"
+			except Exception as e:
+				d.status = "Failed"
+				d.failure_reason = str(e)
+
+		_set_inventory_quantities(levels_to_set)
+
+		update_inventory_synced_qty(
+			[d for d in inventory_sync_batch if d.status == "Success"], time=synced_on
+		)
+		update_inventory_sync_status(
+			[d.ecom_item for d in inventory_sync_batch if d.status == "Not Found"], time=synced_on
+		)
+		frappe.db.commit()
+
+		_log_inventory_update_status(inventory_sync_batch)
+
+
+def _set_inventory_quantities(inventory_levels: List) -> None:
+	"""Set available quantity of inventory levels in one mutation and update their status.
+
+	Shopify rejects the whole mutation if any quantity is invalid, so levels with
+	errors are dropped and the rest are sent once again."""
+
+	for _retry in range(2):
+		if not inventory_levels:
+			return
+
+		failed = _execute_set_quantities(inventory_levels)
+		if failed is None:
+			# whole request failed, status is already set on all levels
+			return
+
+		failed = {id(d) for d in failed}
+		for d in inventory_levels:
+			if id(d) not in failed:
+				d.status = "Success"
+
+		if not failed:
+			return
+
+		inventory_levels = [d for d in inventory_levels if id(d) not in failed]
+
+	for d in inventory_levels:
+		d.status = "Failed"
+		d.failure_reason = "Not updated due to errors in other items of the batch"
+
+
+def _execute_set_quantities(inventory_levels: List):
+	"""Run inventorySetQuantities mutation.
+
+	returns: list of levels rejected by Shopify or None if the request failed as a whole."""
+	quantities = [
+		{
+			"inventoryItemId": f"gid://shopify/InventoryItem/{d.inventory_item_id}",
+			"locationId": f"gid://shopify/Location/{d.shopify_location_id}",
+			"quantity": d.qty,
+		}
+		for d in inventory_levels
+	]
+	variables = {
+		"input": {
+			"name": "available",
+			"reason": "correction",
+			"ignoreCompareQuantity": True,
+			"quantities": quantities,
+		}
+	}
+
+	try:
+		response = json.loads(GraphQL().execute(SET_QUANTITIES_MUTATION, variables=variables))
+		if response.get("errors"):
+			raise Exception(", ".join(cstr(e.get("message")) for e in response["errors"]))
+	except Exception as e:
+		for d in inventory_levels:
+			d.status = "Failed"
+			d.failure_reason = str(e)
+		return
+
+	user_errors = response["data"]["inventorySetQuantities"]["userErrors"]
+
+	failed = []
+	for error in user_errors:
+		# e.g. field: ["input", "quantities", "3", "locationId"]
+		field = error.get("field") or []
+		if len(field) < 3 or field[1] != "quantities" or not cstr(field[2]).isdigit():
+			for d in inventory_levels:
+				d.status = "Failed"
+				d.failure_reason = error.get("message")
+			return
+
+		d = inventory_levels[int(field[2])]
+		if error.get("code") in NOT_FOUND_ERROR_CODES:
+			d.status = "Not Found"
+		else:
+			d.status = "Failed"
+			d.failure_reason = error.get("message")
+		failed.append(d)
+
+	return failed
+
+
+def _get_inventory_item_id(inventory_level) -> str:
+	"""Get inventory_item_id of variant, it's fetched and stored on Ecommerce Item if missing."""
+	if not inventory_level.inventory_item_id:
+		variant = Variant.find(inventory_level.variant_id)
+		inventory_level.inventory_item_id = cstr(variant.inventory_item_id)
+		frappe.db.set_value(
+			"Ecommerce Item",
+			inventory_level.ecom_item,
+			"inventory_item_id",
+			inventory_level.inventory_item_id,
+			update_modified=False,
+		)
+
+	return inventory_level.inventory_item_id
+
+
+@temp_shopify_session
+def backfill_inventory_item_ids() -> None:
+	"""Store inventory_item_id on all synced Ecommerce Items that don't have it yet.
+
+	Pages through all products on Shopify, so only one request is required per 250 products."""
+	collection = Product.find(limit=PRODUCT_PAGE_SIZE, fields="id,variants")
+
+	while True:
+		inventory_item_ids = {
+			cstr(variant.id): get_variant_inventory_item_id(variant)
+			for product in collection
+			for variant in product.variants
+		}
+		_update_inventory_item_ids(inventory_item_ids)
+		frappe.db.commit()
+
+		if not collection.has_next_page():
+			break
+		collection = Product.find(from_=collection.next_page_url)
+
+
+def _update_inventory_item_ids(inventory_item_ids) -> None:
+	"""Set inventory_item_id on Ecommerce Items using variant_id -> inventory_item_id map."""
+	if not inventory_item_ids:
+		return
+
+	ecommerce_items = frappe.get_all(
+		"Ecommerce Item",
+		filters={
+			"integration": MODULE_NAME,
+			"variant_id": ("in", list(inventory_item_ids)),
+			"inventory_item_id": ("is", "not set"),
+		},
+		fields=["name", "variant_id"],
+	)
+
+	for item in ecommerce_items:
+		if inventory_item_id := inventory_item_ids.get(item.variant_id):
+			frappe.db.set_value(
+				"Ecommerce Item", item.name, "inventory_item_id", inventory_item_id, update_modified=False
+			)
+
+
 def _log_inventory_update_status(inventory_levels) -> None:
 	"""Create log of inventory update."""
 	log_message = "variant_id,location_id,status,failure_reason\n"
@@ -1,26 +1,48 @@
 import json
-from typing import Literal, Optional
+from datetime import timedelta
+from itertools import islice
+from typing import Dict, Literal, Optional
 
 import frappe
 from frappe import _
-from frappe.utils import cint, cstr, flt, get_datetime, getdate, nowdate, add_days
-from shopify.collection import PaginatedIterator
+from frappe.utils import (
+    add_days,
+    cint,
+    cstr,
+    flt,
+    get_datetime,
+    getdate,
+    now_datetime,
+    nowdate,
+    time_diff_in_seconds,
+)
 from shopify.resources import Order
 
 from erpnext.controllers.accounts_controller import update_child_qty_rate
 
+from ecommerce_integrations.shopify.bulk_operation import (
+    POLL_TIMEOUT,
+    iter_bulk_operation_results,
+    run_bulk_query,
+    wait_for_bulk_operation,
+)
 from ecommerce_integrations.shopify.connection import temp_shopify_session
 from ecommerce_integrations.shopify.constants import (
     CUSTOMER_ID_FIELD,
     EVENT_MAPPER,
     ORDER_ID_FIELD,
     ORDER_ITEM_DISCOUNT_FIELD,
+    ORDER_LINE_ITEM_ID_FIELD,
     ORDER_NUMBER_FIELD,
     ORDER_STATUS_FIELD,
     SETTING_DOCTYPE,
 )
 from ecommerce_integrations.shopify.customer import ShopifyCustomer
-from ecommerce_integrations.shopify.product import create_items_if_not_exist, get_item_code
+from ecommerce_integrations.shopify.product import (
+    create_items_if_not_exist,
+    get_item_code,
+    get_item_codes,
+)
 from ecommerce_integrations.shopify.shopify_order_manager import ShopifyOrderManager
 from ecommerce_integrations.shopify.utils import create_shopify_log
 from ecommerce_integrations.utils.price_list import get_dummy_price_list
@@ -30,6 +52,33 @@ DEFAULT_TAX_FIELDS = {
     "sales_tax": "default_sales_tax_account",
     "shipping": "default_shipping_charges_account",
 }
+TAX_ACCOUNT_CACHE_KEY = "shopify_tax_account_map"
+SHIPPING_RULE_INDEX_CACHE_KEY = "shopify_shipping_rule_index"
+
+# max orders returned by a single REST API call
+OLD_ORDERS_BATCH_SIZE = 250
+OLD_ORDERS_CHUNK_DOCTYPE = "Shopify Old Order Sync Chunk"
+# bulk operation can take up to POLL_TIMEOUT, orders are synced after that
+OLD_ORDERS_CHUNK_TIMEOUT = POLL_TIMEOUT + 4 * 60 * 60
+# lock is refreshed after every page, a new job can be started if job dies
+OLD_ORDERS_CHUNK_LOCK_TTL = 30 * 60
+
+# only ids are fetched in bulk, same as REST API only open orders are synced
+OLD_ORDER_IDS_BULK_QUERY = """
+{
+    orders(
+        query: "created_at:>='%(from_time)s' AND created_at:<'%(to_time)s' AND status:open"
+        sortKey: CREATED_AT
+    ) {
+        edges {
+            node {
+                legacyResourceId
+                createdAt
+            }
+        }
+    }
+}
+"""
 
 
 def sync_sales_order(payload, request_id=None):
@@ -175,19 +224,78 @@ def create_sales_order(shopify_order, setting, company=None):
 
     return so
 
-def get_shipping_minimum_delivery_days(shipping_line_title, shipping_country):     
-    shipping_rule = frappe.db.sql("""
-        SELECT sr.name, sr.custom_minimum_delivery_days
+def get_shipping_minimum_delivery_days(shipping_line_title, shipping_country):
+    """Minimum delivery days of shipping rule whose display name matches shipping line title.
+
+    Exact (case and whitespace insensitive) match of display name is preferred, else the
+    shortest display name containing the title is used."""
+    if not shipping_line_title or not shipping_country:
+        return None
+
+    rules = get_shipping_rule_index().get(shipping_country)
+    if not rules:
+        return None
+
+    title = _normalize_shipping_title(shipping_line_title)
+    if title in rules:
+        return rules[title]
+
+    # rules are sorted by length of display name, first match is the closest one
+    for display_name, delivery_days in rules.items():
+        if title in display_name:
+            return delivery_days
+
+    return None
+
+
+def get_shipping_rule_index() -> Dict[str, Dict[str, int]]:
+    """Country wise mapping of normalized shipping rule display name to minimum delivery days.
+
+    Cached till a Shipping Rule is updated, see `clear_shipping_rule_index`."""
+    index = frappe.cache().get_value(SHIPPING_RULE_INDEX_CACHE_KEY)
+    if index is not None:
+        return index
+
+    shipping_rules = frappe.db.sql(
+        """
+        SELECT sr.name, sr.custom_display_name, sr.custom_minimum_delivery_days, src.country
         FROM `tabShipping Rule` sr
         JOIN `tabShipping Rule Country` src ON sr.name = src.parent
-        WHERE sr.custom_display_name LIKE %s AND src.country = %s
-        LIMIT 1
-    """, (f"%{shipping_line_title}%", shipping_country), as_dict=True)
+        WHERE IFNULL(sr.custom_display_name, '') != ''
+        ORDER BY sr.name
+        """,
+        as_dict=True,
+    )
 
-    if shipping_rule:
-        return shipping_rule[0].custom_minimum_delivery_days
+    index = {}
+    for rule in shipping_rules:
+        display_name = _normalize_shipping_title(rule.custom_display_name)
+        # same display name in multiple rules: first rule by name is used
+        index.setdefault(rule.country, {}).setdefault(display_name, rule.custom_minimum_delivery_days)
+
+    index = {
+        country: dict(sorted(rules.items(), key=lambda rule: (len(rule[0]), rule[0])))
+        for country, rules in index.items()
+    }
+    frappe.cache().set_value(SHIPPING_RULE_INDEX_CACHE_KEY, index)
+    return index
+
+
+def clear_shipping_rule_index(doc=None, method=None) -> None:
+    """Clear cached shipping rule index, called from doc events."""
+
+    def clear():
+        frappe.cache().delete_value(SHIPPING_RULE_INDEX_CACHE_KEY)
+
+    clear()
+    # other workers might cache old values till this transaction is committed or rolled back
+    frappe.db.after_commit.add(clear)
+    frappe.db.after_rollback.add(clear)
+
+
+def _normalize_shipping_title(title) -> str:
+    return " ".join(cstr(title).split()).casefold()
 
-    return None
 
 def get_shipping_title(shopify_order):
     shopify_shipping_lines  = shopify_order.get("shipping_lines")
@@ -206,6 +314,9 @@ def get_order_items(order_items, setting, delivery_date, taxes_inclusive):
     all_product_exists = True
     product_not_exists = []
 
+    # resolve all item codes in one query
+    item_codes = get_item_codes(order_items)
+
     for shopify_item in order_items:
         if not shopify_item.get("product_exists"):
             all_product_exists = False
@@ -215,7 +326,7 @@ def get_order_items(order_items, setting, delivery_date, taxes_inclusive):
             continue
 
         if all_product_exists:
-            item_code = get_item_code(shopify_item)
+            item_code = get_item_code(shopify_item, item_codes)
             items.append(
                 {
                     "item_code": item_code,
@@ -228,6 +339,7 @@ def get_order_items(order_items, setting, delivery_date, taxes_inclusive):
                     ORDER_ITEM_DISCOUNT_FIELD: (
                         _get_total_discount(shopify_item) / cint(shopify_item.get("quantity"))
                     ),
+                    ORDER_LINE_ITEM_ID_FIELD: cstr(shopify_item.get("id")),
                 }
             )
         else:
@@ -262,9 +374,10 @@ def _get_total_discount(line_item) -> float:
 def get_order_taxes(shopify_order, setting, items):
     taxes = []
     line_items = shopify_order.get("line_items")
+    item_codes = get_item_codes(line_items)
 
     for line_item in line_items:
-        item_code = get_item_code(line_item)
+        item_code = get_item_code(line_item, item_codes)
         for tax in line_item.get("tax_lines"):
             taxes.append(
                 {
@@ -326,13 +439,12 @@ def consolidate_order_taxes(taxes):
 
 def get_tax_account_head(tax, charge_type: Optional[Literal["shipping", "sales_tax"]] = None):
     tax_title = str(tax.get("title"))
+    tax_account_map = get_tax_account_map()
 
-    tax_account = frappe.db.get_value(
-        "Shopify Tax Account", {"parent": SETTING_DOCTYPE, "shopify_tax": tax_title}, "tax_account",
-    )
+    tax_account = tax_account_map["accounts"].get(tax_title, {}).get("tax_account")
 
     if not tax_account and charge_type:
-        tax_account = frappe.db.get_single_value(SETTING_DOCTYPE, DEFAULT_TAX_FIELDS[charge_type])
+        tax_account = tax_account_map["defaults"].get(charge_type)
 
     if not tax_account:
         frappe.throw(_("Tax Account not specified for Shopify Tax {0}").format(tax.get("title")))
@@ -341,13 +453,50 @@ def get_tax_account_head(tax, charge_type: Optional[Literal["shipping", "sales_t
 
 
 def get_tax_account_description(tax):
-    tax_title = tax.get("title")
+    tax_title = str(tax.get("title"))
+
+    return get_tax_account_map()["accounts"].get(tax_title, {}).get("tax_description")
+
 
-    tax_description = frappe.db.get_value(
-        "Shopify Tax Account", {"parent": SETTING_DOCTYPE, "shopify_tax": tax_title}, "tax_description",
+def get_tax_account_map() -> Dict:
+    """Shopify tax title wise account and description, along with default accounts.
+
+    Cached till Shopify Setting is updated, see `clear_tax_account_cache`."""
+    tax_account_map = frappe.cache().get_value(TAX_ACCOUNT_CACHE_KEY)
+    if tax_account_map is not None:
+        return tax_account_map
+
+    accounts = {}
+    tax_accounts = frappe.get_all(
+        "Shopify Tax Account",
+        filters={"parent": SETTING_DOCTYPE},
+        fields=["shopify_tax", "tax_account", "tax_description"],
+        order_by="idx",
+    )
+    for row in tax_accounts:
+        # first mapping of a tax title is used
+        accounts.setdefault(
+            str(row.shopify_tax),
+            {"tax_account": row.tax_account, "tax_description": row.tax_description},
+        )
+
+    defaults = frappe.db.get_value(
+        SETTING_DOCTYPE, SETTING_DOCTYPE, list(DEFAULT_TAX_FIELDS.values()), as_dict=True
     )
+    defaults = defaults or {}
+
+    tax_account_map = {
+        "accounts": accounts,
+        "defaults": {
+            charge_type: defaults.get(fieldname) for charge_type, fieldname in DEFAULT_TAX_FIELDS.items()
+        },
+    }
+    frappe.cache().set_value(TAX_ACCOUNT_CACHE_KEY, tax_account_map)
+    return tax_account_map
 
-    return tax_description
+
+def clear_tax_account_cache() -> None:
+    frappe.cache().delete_value(TAX_ACCOUNT_CACHE_KEY)
 
 
 def update_taxes_with_shipping_lines(taxes, shipping_lines, setting, items, taxes_inclusive=False):
@@ -461,41 +610,310 @@ def cancel_order(payload, request_id=None):
 
 @temp_shopify_session
 def sync_old_orders():
-    shopify_setting = frappe.get_cached_doc(SETTING_DOCTYPE)
+    """Start sync of old orders, called by scheduler.
+
+    Configured date range is split in chunks which are synced by separate jobs
+    on long queue. Orders are fetched oldest first and each chunk stores the next
+    page and the last order synced after every page, so a job that failed or timed
+    out resumes where it stopped on next run."""
+    shopify_setting = frappe.get_doc(SETTING_DOCTYPE)
     if not cint(shopify_setting.sync_old_orders):
         return
 
-    orders = _fetch_old_orders(shopify_setting.old_orders_from, shopify_setting.old_orders_to)
+    chunks = shopify_setting.old_orders_sync_chunks
+    if chunks and all(chunk.status == "Completed" for chunk in chunks):
+        # last chunks completed at the same time, neither of them saw the other one completed
+        _complete_old_orders_sync()
+        return
+
+    if not chunks:
+        _create_old_orders_sync_chunks(shopify_setting)
+
+    for chunk in shopify_setting.old_orders_sync_chunks:
+        if chunk.status != "Completed":
+            _enqueue_old_orders_chunk(chunk.name)
+
+
+def _create_old_orders_sync_chunks(shopify_setting):
+    """Split configured range in chunks, each from `from_time` up to but excluding `to_time`."""
+    from_time = get_datetime(shopify_setting.old_orders_from)
+    # configured end is inclusive, Shopify's timestamps have no fractional seconds
+    to_time = get_datetime(shopify_setting.old_orders_to) + timedelta(seconds=1)
+
+    jobs = max(cint(shopify_setting.old_orders_sync_jobs), 1)
+    if cint(shopify_setting.use_bulk_operation_for_old_orders):
+        # Shopify runs only one bulk operation at a time
+        jobs = 1
+    step = (to_time - from_time) / jobs
+    boundaries = [(from_time + step * i).replace(microsecond=0) for i in range(jobs)] + [to_time]
+
+    shopify_setting.old_orders_sync_chunks = []
+    for i in range(jobs):
+        shopify_setting.append(
+            "old_orders_sync_chunks",
+            {"from_time": boundaries[i], "to_time": boundaries[i + 1], "status": "Pending"},
+        )
+
+    shopify_setting.old_orders_estimated_total = _get_old_orders_count(from_time, to_time)
+    shopify_setting.old_orders_sync_started_on = now_datetime()
+    shopify_setting.save()
+    frappe.db.commit()
+
+
+def _get_old_orders_count(from_time, to_time) -> int:
+    try:
+        return cint(Order.count(**_get_created_at_filters(from_time, to_time)))
+    except Exception:
+        # only used for showing progress
+        return 0
+
+
+def _enqueue_old_orders_chunk(chunk):
+    """Enqueue sync of a chunk unless a job for it is already queued or running."""
+    lock_key = _get_old_orders_chunk_lock_key(chunk)
+    if frappe.cache().set(lock_key, 1, nx=True, ex=OLD_ORDERS_CHUNK_LOCK_TTL):
+        frappe.enqueue(
+            sync_old_orders_chunk, queue="long", timeout=OLD_ORDERS_CHUNK_TIMEOUT, chunk=chunk
+        )
+
+
+def _get_old_orders_chunk_lock_key(chunk) -> str:
+    return frappe.cache().make_key(f"shopify_old_orders_chunk|{chunk}")
+
+
+@temp_shopify_session
+def sync_old_orders_chunk(chunk):
+    """Sync orders of a chunk of old orders date range, resuming from last synced page."""
+    lock_key = _get_old_orders_chunk_lock_key(chunk)
+    try:
+        _sync_old_orders_chunk(chunk, lock_key)
+    finally:
+        frappe.cache().delete(lock_key)
+
+
+def _sync_old_orders_chunk(chunk, lock_key):
+    chunk = frappe.db.get_value(
+        OLD_ORDERS_CHUNK_DOCTYPE,
+        chunk,
+        [
+            "name",
+            "from_time",
+            "to_time",
+            "status",
+            "synced_orders",
+            "last_order_id",
+            "last_order_created_at",
+            "next_page_url",
+        ],
+        as_dict=True,
+    )
+    if not chunk or chunk.status == "Completed":
+        return
+
+    from_time = chunk.from_time
+    last_order = None
+    if chunk.last_order_created_at:
+        # resume after last synced order, orders are fetched oldest first
+        from_time = chunk.last_order_created_at
+        last_order = (get_datetime(chunk.last_order_created_at), cint(chunk.last_order_id))
+    else:
+        # starting over, orders counted by an earlier run are synced again
+        chunk.synced_orders = 0
+
+    if cint(frappe.db.get_single_value(SETTING_DOCTYPE, "use_bulk_operation_for_old_orders")):
+        # lock isn't refreshed while waiting for bulk operation
+        frappe.cache().expire(lock_key, OLD_ORDERS_CHUNK_TIMEOUT)
+        pages = _fetch_old_orders_in_bulk(from_time, chunk.to_time, last_order)
+    else:
+        pages = _fetch_old_order_pages(from_time, chunk.to_time, chunk.next_page_url, last_order)
+
+    for orders, processed, next_page_url, last_order in pages:
+        _sync_old_orders(orders)
+
+        # progress is kept in chunk rows, Shopify Setting isn't modified by sync jobs
+        chunk.synced_orders += processed
+        values = {"synced_orders": chunk.synced_orders, "next_page_url": next_page_url}
+        if last_order:
+            values.update(
+                {"last_order_created_at": last_order[0], "last_order_id": cstr(last_order[1])}
+            )
+        frappe.db.set_value(OLD_ORDERS_CHUNK_DOCTYPE, chunk.name, values, update_modified=False)
+        frappe.db.commit()
+
+        frappe.cache().expire(lock_key, OLD_ORDERS_CHUNK_LOCK_TTL)
+
+    frappe.db.set_value(
+        OLD_ORDERS_CHUNK_DOCTYPE, chunk.name, "status", "Completed", update_modified=False
+    )
+    frappe.db.commit()
+
+    # locking read sees chunks completed by other jobs after this transaction started
+    pending_chunks = frappe.db.sql(
+        f"""select count(*) from `tab{OLD_ORDERS_CHUNK_DOCTYPE}`
+        where parent = %s and status != 'Completed' for update""",
+        SETTING_DOCTYPE,
+    )[0][0]
+    if not pending_chunks:
+        _complete_old_orders_sync()
+    frappe.db.commit()
+
+
+def _complete_old_orders_sync():
+    frappe.db.set_single_value(SETTING_DOCTYPE, "sync_old_orders", 0)
+    frappe.clear_document_cache(SETTING_DOCTYPE, SETTING_DOCTYPE)
+
+
+def _sync_old_orders(orders):
+    order_ids = [cstr(order["id"]) for order in orders]
+    if not order_ids:
+        return
+
+    synced_orders = set(
+        frappe.get_all("Sales Order", filters={ORDER_ID_FIELD: ("in", order_ids)}, pluck=ORDER_ID_FIELD)
+    )
 
     for order in orders:
+        if cstr(order["id"]) in synced_orders:
+            continue
+
         log = create_shopify_log(
             method=EVENT_MAPPER["orders/create"], request_data=json.dumps(order), make_new=True
         )
         sync_sales_order(order, request_id=log.name)
 
-    shopify_setting = frappe.get_doc(SETTING_DOCTYPE)
-    shopify_setting.sync_old_orders = 0
-    shopify_setting.save()
 
+def get_old_orders_sync_progress(shopify_setting) -> Dict:
+    """Synced orders and orders per minute of old orders sync, computed from its chunks."""
+    synced = sum(cint(chunk.synced_orders) for chunk in shopify_setting.old_orders_sync_chunks)
+    started_on = shopify_setting.old_orders_sync_started_on or now_datetime()
+    minutes = max(time_diff_in_seconds(now_datetime(), started_on) / 60, 1)
+
+    return {"old_orders_synced": synced, "old_orders_sync_rate": flt(synced / minutes, 2)}
+
+
+def _get_created_at_filters(from_time, to_time) -> Dict:
+    """REST filters for orders created from `from_time` up to but excluding `to_time`."""
+    return {
+        "created_at_min": get_datetime(from_time).astimezone().isoformat(),
+        # created_at_max is inclusive, timestamps of orders are in whole seconds
+        "created_at_max": (get_datetime(to_time) - timedelta(seconds=1)).astimezone().isoformat(),
+    }
+
+
+def _get_order_position(order_id, created_at):
+    """Sort key of an order in the sync, creation time (local, naive) and ID."""
+    created_at = get_datetime(created_at)
+    if created_at.tzinfo:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+    return created_at, cint(order_id)
+
+
+def _count_orders_after(positions, last_order) -> int:
+    """Number of orders after `last_order`, orders up to it were counted by the previous run."""
+    if not last_order:
+        return len(positions)
+    return len([position for position in positions if position > last_order])
+
+
+def _fetch_old_order_pages(from_time, to_time, next_page_url=None, last_order=None):
+    """Fetch shopify orders in specified range page by page, oldest first.
+
+    Fetching starts from next_page_url if it's still valid, otherwise from `from_time`.
+    Orders up to `last_order` are yielded again (they are skipped while syncing) but
+    not counted as processed.
+
+    Using generator instead of fetching all at once is better for avoiding rate
+    limits and reducing resource usage.
+
+    yields: (orders, count of processed orders, url of next page, last order position)"""
+
+    collection = None
+    if next_page_url:
+        try:
+            collection = Order.find(from_=next_page_url)
+        except Exception:
+            # page cursor is no longer valid, resume from last synced order.
+            collection = None
+
+    if collection is None:
+        collection = Order.find(
+            **_get_created_at_filters(from_time, to_time),
+            order="created_at asc",
+            limit=OLD_ORDERS_BATCH_SIZE,
+        )
 
-def _fetch_old_orders(from_time, to_time):
-    """Fetch all shopify orders in specified range and return an iterator on fetched orders."""
+    while True:
+        next_page_url = collection.next_page_url if collection.has_next_page() else ""
+        orders = [order.to_dict() for order in collection]
+        positions = [_get_order_position(order["id"], order["created_at"]) for order in orders]
+
+        processed = _count_orders_after(positions, last_order)
+        if positions:
+            last_order = max(positions + ([last_order] if last_order else []))
+        yield orders, processed, next_page_url, last_order
+
+        if not next_page_url:
+            break
+        collection = Order.find(from_=next_page_url)
+
+
+def _fetch_old_orders_in_bulk(from_time, to_time, last_order=None):
+    """Fetch all shopify orders in specified range using a bulk operation, oldest first.
+
+    Bulk operation only returns ids of the orders. Ids of orders that are not synced
+    yet are then fetched using REST API in batches, so that the payload is the same
+    as webhooks. A bulk operation can't be resumed, a new one is started from
+    `from_time` and orders up to `last_order` aren't counted as processed.
+
+    yields: (orders, count of processed orders, url of next page, last order position)"""
 
     from_time = get_datetime(from_time).astimezone().isoformat()
     to_time = get_datetime(to_time).astimezone().isoformat()
-    orders_iterator = PaginatedIterator(
-        Order.find(created_at_min=from_time, created_at_max=to_time, limit=250)
+
+    operation_id = run_bulk_query(
+        OLD_ORDER_IDS_BULK_QUERY % {"from_time": from_time, "to_time": to_time}
     )
+    operation = wait_for_bulk_operation(operation_id)
+
+    rows = iter_bulk_operation_results(operation)
+
+    while batch := list(islice(rows, OLD_ORDERS_BATCH_SIZE)):
+        batch = {cstr(row["legacyResourceId"]): row for row in batch}
+        positions = [
+            _get_order_position(order_id, row["createdAt"]) for order_id, row in batch.items()
+        ]
+
+        synced_orders = set(
+            frappe.get_all(
+                "Sales Order", filters={ORDER_ID_FIELD: ("in", list(batch))}, pluck=ORDER_ID_FIELD
+            )
+        )
+        pending_orders = [order_id for order_id in batch if order_id not in synced_orders]
+
+        orders = []
+        if pending_orders:
+            orders = [
+                order.to_dict()
+                for order in Order.find(ids=",".join(pending_orders), limit=OLD_ORDERS_BATCH_SIZE)
+            ]
 
-    for orders in orders_iterator:
-        for order in orders:
-            # Using generator instead of fetching all at once is better for
-            # avoiding rate limits and reducing resource usage.
-            yield order.to_dict()
+        processed = _count_orders_after(positions, last_order)
+        last_order = max(positions + ([last_order] if last_order else []))
+        yield orders, processed, "", last_order
 
 def sort_items_for_sync(active_erpnext_items, active_shopify_items, item_mapping, erpnext_existing_items, erpnext_order_name, delivery_date, shopify_settings):
+    """Build `trans_items` for `update_child_qty_rate` from active Shopify line items.
+
+    Existing items that aren't in active Shopify items are left out, so they are removed."""
     trans_items = []
 
+    new_item_codes = {
+        item_mapping[product_id]
+        for product_id in active_shopify_items
+        if item_mapping.get(product_id) and item_mapping[product_id] not in erpnext_existing_items
+    }
+    item_details = get_item_details(new_item_codes)
+
     # Add or update items from active Shopify items
     for idx, (product_id, shopify_item) in enumerate(active_shopify_items.items(), start=1):
         erpnext_item_code = item_mapping.get(product_id)
@@ -503,58 +921,138 @@ def sort_items_for_sync(active_erpnext_items, active_shopify_items, item_mapping
             continue
 
         if erpnext_item_code in erpnext_existing_items:
-            trans_items.append({
-                "docname": erpnext_existing_items[erpnext_item_code].name,
-                "name": erpnext_existing_items[erpnext_item_code].name,
-                "item_code": erpnext_item_code,
-                "delivery_date": str(delivery_date),  # Convert to string
-                "conversion_factor": 1,
-                "qty": shopify_item['current_quantity'],
-                "rate": shopify_item['price'],
-                "uom": erpnext_existing_items[erpnext_item_code].uom,
-                "idx": idx
-            })
-        else:
-            item_details = frappe.db.get_value(
-                'Item', erpnext_item_code, ['item_name', 'stock_uom'], as_dict=1
+            trans_items.append(
+                get_existing_trans_item(
+                    erpnext_existing_items[erpnext_item_code],
+                    qty=shopify_item['current_quantity'],
+                    rate=shopify_item['price'],
+                    delivery_date=delivery_date,
+                    idx=idx,
+                )
             )
+        else:
+            item = item_details[erpnext_item_code]
             trans_items.append({
                 "doctype": "Sales Order Item",
                 "parent": erpnext_order_name,
                 "parenttype": "Sales Order",
                 "parentfield": "items",
                 "item_code": erpnext_item_code,
-                "item_name": item_details.item_name,
+                "item_name": item.item_name,
                 "qty": shopify_item['current_quantity'],
                 "warehouse": shopify_settings.warehouse,
                 "rate": shopify_item['price'],
-                "uom": item_details.stock_uom,
-                "stock_uom": item_details.stock_uom,
+                "uom": item.stock_uom,
+                "stock_uom": item.stock_uom,
                 "conversion_factor": 1,
                 "delivery_date": str(delivery_date),  # Convert to string
                 "idx": idx,
                 "__islocal": True
             })
 
-    # Add existing items that are not in the active Shopify items to be removed
-    for item_code in active_erpnext_items:
-        shopify_product_id = None
-        for pid, erpid in item_mapping.items():
-            if erpid == item_code:
-                shopify_product_id = pid
-                break
-        if not shopify_product_id or shopify_product_id not in active_shopify_items:
-            # Do not include items with qty 0 in the trans_items payload
+    return trans_items
+
+
+def get_existing_trans_item(erpnext_item, qty, rate, delivery_date, idx):
+    return {
+        "docname": erpnext_item.name,
+        "name": erpnext_item.name,
+        "item_code": erpnext_item.item_code,
+        "delivery_date": str(delivery_date),  # Convert to string
+        "conversion_factor": 1,
+        "qty": qty,
+        "rate": rate,
+        "uom": erpnext_item.uom,
+        "idx": idx
+    }
+
+
+def get_item_details(item_codes):
+    """Item name and stock UOM of items, fetched in a single query."""
+    if not item_codes:
+        return {}
+
+    items = frappe.get_all(
+        "Item",
+        filters={"name": ("in", list(item_codes))},
+        fields=["name", "item_name", "stock_uom"],
+    )
+    return {item.name: item for item in items}
+
+
+def get_trans_items_from_order_edit(order_edit, erpnext_items, delivery_date):
+    """Apply quantity changes of an order edit to existing Sales Order Items.
+
+    Returns None if the edit has line items that aren't linked to a Sales Order Item,
+    e.g. a new product is added, as the payload doesn't contain details of the line item."""
+    line_items = order_edit.get("line_items") or {}
+
+    deltas = {}
+    for change, sign in (("additions", 1), ("removals", -1)):
+        for line_item in line_items.get(change) or []:
+            line_item_id = cstr(line_item.get("id"))
+            deltas[line_item_id] = deltas.get(line_item_id, 0) + sign * cint(line_item.get("delta"))
+
+    rows_by_line_item = {
+        row[ORDER_LINE_ITEM_ID_FIELD]: row for row in erpnext_items if row.get(ORDER_LINE_ITEM_ID_FIELD)
+    }
+    if any(line_item_id not in rows_by_line_item for line_item_id in deltas):
+        return None
+
+    trans_items = []
+    for row in sorted(erpnext_items, key=lambda d: d.idx):
+        qty = flt(row.qty) + deltas.get(row.get(ORDER_LINE_ITEM_ID_FIELD), 0)
+        if qty <= 0:
+            # left out items are removed
             continue
+        trans_items.append(
+            get_existing_trans_item(
+                row, qty=qty, rate=row.rate, delivery_date=delivery_date, idx=len(trans_items) + 1
+            )
+        )
 
     return trans_items
 
 
+def has_item_changes(erpnext_items, trans_items):
+    """Check if `trans_items` would add, remove or change qty/rate of any Sales Order Item."""
+    if len(trans_items) != len(erpnext_items) or any(not d.get("docname") for d in trans_items):
+        return True
+
+    existing = {row.name: row for row in erpnext_items}
+    for d in trans_items:
+        row = existing.get(d["docname"])
+        if not row or flt(row.qty) != flt(d["qty"]) or flt(row.rate) != flt(d["rate"]):
+            return True
+
+    return False
+
+
 def update_sales_order_items(erpnext_order_name, trans_items):
     trans_items_json = json.dumps(trans_items)
     update_child_qty_rate("Sales Order", trans_items_json, erpnext_order_name)
 
 
+def set_line_item_ids(erpnext_order_name, active_shopify_items, item_mapping):
+    """Link Sales Order Items with Shopify line items, so next edits can be applied without fetching the order."""
+    line_item_ids = {
+        item_mapping[product_id]: cstr(shopify_item["id"])
+        for product_id, shopify_item in active_shopify_items.items()
+        if item_mapping.get(product_id)
+    }
+
+    for row in frappe.get_all(
+        "Sales Order Item",
+        filters={"parent": erpnext_order_name, "parenttype": "Sales Order"},
+        fields=["name", "item_code", ORDER_LINE_ITEM_ID_FIELD],
+    ):
+        line_item_id = line_item_ids.get(row.item_code)
+        if line_item_id and row.get(ORDER_LINE_ITEM_ID_FIELD) != line_item_id:
+            frappe.db.set_value(
+                "Sales Order Item", row.name, ORDER_LINE_ITEM_ID_FIELD, line_item_id, update_modified=False
+            )
+
+
 def sync_sales_order_items(payload, request_id=None):
     shopify_settings = frappe.get_doc(SETTING_DOCTYPE)
 
@@ -565,23 +1063,42 @@ def sync_sales_order_items(payload, request_id=None):
     order = payload
     try:        
         frappe.set_user('Administrator')
-        shopify_order_id = order["order_edit"]["order_id"]
-        shopify_order = get_shopify_order(shopify_settings, shopify_order_id)
+        order_edit = order["order_edit"]
+        shopify_order_id = order_edit["order_id"]
         erpnext_order = get_erpnext_order(shopify_order_id)
 
         if not erpnext_order:
             frappe.throw(f"Sales Order with Shopify Order ID {shopify_order_id} does not exist")
 
-        erpnext_existing_items, active_erpnext_items = get_erpnext_existing_items(erpnext_order.name)
-        active_shopify_items = get_active_shopify_items(shopify_order)
-        item_mapping = get_item_mapping(active_shopify_items)
+        erpnext_items = get_erpnext_order_items(erpnext_order.name)
 
         try:
-            trans_items = sort_items_for_sync(
-                active_erpnext_items, active_shopify_items, item_mapping, erpnext_existing_items, erpnext_order.name, erpnext_order.delivery_date, shopify_settings
+            # quantity changes of linked line items are applied from the payload itself
+            trans_items = get_trans_items_from_order_edit(
+                order_edit, erpnext_items, erpnext_order.delivery_date
             )
 
+            active_shopify_items = item_mapping = None
+            if trans_items is None:
+                shopify_order = get_shopify_order(shopify_settings, shopify_order_id)
+                erpnext_existing_items = {item.item_code: item for item in erpnext_items}
+                active_shopify_items = get_active_shopify_items(shopify_order)
+                item_mapping = get_item_mapping(active_shopify_items)
+                trans_items = sort_items_for_sync(
+                    set(erpnext_existing_items), active_shopify_items, item_mapping, erpnext_existing_items, erpnext_order.name, erpnext_order.delivery_date, shopify_settings
+                )
+
+            if not has_item_changes(erpnext_items, trans_items):
+                if active_shopify_items is not None:
+                    # link line items so next edits of the order don't fetch it again
+                    set_line_item_ids(erpnext_order.name, active_shopify_items, item_mapping)
+                    frappe.db.commit()
+                create_shopify_log(message=f"No item changes in order '{shopify_order_id}'", status="Success")
+                return True
+
             update_sales_order_items(erpnext_order.name, trans_items)
+            if active_shopify_items is not None:
+                set_line_item_ids(erpnext_order.name, active_shopify_items, item_mapping)
 
             frappe.db.commit()
             create_shopify_log(message=f"Order updated '{shopify_order_id}'", status="Success")
@@ -597,7 +1114,11 @@ def sync_sales_order_items(payload, request_id=None):
 
 
 def get_shopify_order(shopify_settings, shopify_order_id):
-    shopify_manager = ShopifyOrderManager(shopify_settings.shopify_url, shopify_settings.get_password('password'))
+    shopify_manager = ShopifyOrderManager(
+        shopify_settings.shopify_url,
+        shopify_settings.get_password('password'),
+        pool_size=cint(frappe.conf.get("shopify_http_pool_size")) or None,
+    )
     return shopify_manager.get_order(shopify_order_id)['order']
 
 
@@ -605,15 +1126,15 @@ def get_erpnext_order(shopify_order_id):
     return frappe.db.get_list("Sales Order", filters={"shopify_order_id": shopify_order_id}, fields=["name", "delivery_date"])[0]
 
 
-def get_erpnext_existing_items(erpnext_order_name):
-    erpnext_sales_order_items = frappe.get_all(
+def get_erpnext_order_items(erpnext_order_name):
+    return frappe.get_all(
         "Sales Order Item",
-        filters={"parent": erpnext_order_name},
-        fields=["name", "item_code", "item_name", "qty", "uom", "stock_uom", "idx"]
+        filters={"parent": erpnext_order_name, "parenttype": "Sales Order"},
+        fields=[
+            "name", "item_code", "item_name", "qty", "rate", "uom", "stock_uom", "idx", ORDER_LINE_ITEM_ID_FIELD
+        ],
+        order_by="idx",
     )
-    erpnext_existing_items = {item.item_code: item for item in erpnext_sales_order_items}
-    active_erpnext_items = set(erpnext_existing_items.keys())
-    return erpnext_existing_items, active_erpnext_items
 
 
 def get_active_shopify_items(shopify_order):
@@ -1,4 +1,4 @@
-from time import process_time
+import time
 
 import frappe
 from frappe.exceptions import UniqueValidationError
@@ -6,13 +6,21 @@ from shopify.resources import Product
 
 from ecommerce_integrations.ecommerce_integrations.doctype.ecommerce_item import ecommerce_item
 from ecommerce_integrations.shopify.connection import temp_shopify_session
-from ecommerce_integrations.shopify.constants import MODULE_NAME
+from ecommerce_integrations.shopify.constants import MODULE_NAME, SETTING_DOCTYPE
 from ecommerce_integrations.shopify.product import ShopifyProduct
 
 # constants
 SYNC_JOB_NAME = "shopify.job.sync.all.products"
 REALTIME_KEY = "shopify.key.sync.all.products"
 
+# each page of products is synced by a separate job, so pages are synced in parallel
+# by as many workers as there are for long queue.
+SYNC_PAGE_SIZE = 100
+SYNC_PAGE_JOB_TIMEOUT = 60 * 60
+# progress of the current sync shared by all jobs
+SYNC_PROGRESS_KEY = "shopify_product_sync_progress"
+SYNC_PROGRESS_TTL = 24 * 60 * 60
+
 
 @frappe.whitelist()
 def get_shopify_products(from_=None):
@@ -124,50 +132,138 @@ def import_all_products():
 
 
 def queue_sync_all_products(*args, **kwargs):
-	start_time = process_time()
+	"""Fetch all products from Shopify and enqueue a job to sync each page of products.
 
+	Fetched product data is passed on to the jobs, so products aren't fetched again."""
 	counts = get_product_count()
 	publish("Syncing all products...")
 
 	if counts["shopifyCount"] < counts["syncedCount"]:
 		publish("⚠ Shopify has less products than ERPNext.")
 
-	_sync = True
-	collection = _fetch_products_from_shopify(limit=100)
+	_reset_sync_progress()
+
+	setting = frappe.get_doc(SETTING_DOCTYPE)
+	total = 0
+	collection = _fetch_products_from_shopify(limit=SYNC_PAGE_SIZE)
+	while True:
+		products = [product.to_dict() for product in collection]
+		total += len(products)
+
+		_create_shared_records(products, setting)
+
+		frappe.enqueue(
+			sync_products_page,
+			queue="long",
+			timeout=SYNC_PAGE_JOB_TIMEOUT,
+			products=products,
+			now=frappe.flags.in_test,
+		)
+
+		if not collection.has_next_page():
+			break
+		collection = _fetch_products_from_shopify(from_=collection.next_page_url)
+
+	# pages might already be synced, done is published by whoever finds all products processed
+	_set_sync_progress("total", total)
+	_publish_if_sync_is_done()
+	return True
+
+
+def _create_shared_records(products, setting):
+	"""Create item groups, attributes and suppliers of a page before its job is enqueued.
+
+	Page jobs run in parallel, these are created here one page at a time so the jobs
+	don't race to insert or update the same documents."""
+	savepoint = "shopify_product_shared_records"
+
+	for product in products:
+		if is_synced(product["id"]):
+			continue
+		try:
+			frappe.db.savepoint(savepoint)
+			ShopifyProduct(product["id"], setting=setting).create_shared_records(product)
+		except Exception:
+			# product fails again in page job and the error is published from there
+			frappe.db.rollback(save_point=savepoint)
+
+	frappe.db.commit()
+
+
+@temp_shopify_session
+def sync_products_page(products):
+	"""Background job that syncs a page of products fetched from Shopify."""
 	savepoint = "shopify_product_sync"
-	while _sync:
-		for product in collection:
+
+	try:
+		setting = frappe.get_doc(SETTING_DOCTYPE)
+		for product in products:
+			product_id = product["id"]
 			try:
-				publish(f"Syncing product {product.id}", br=False)
+				publish(f"Syncing product {product_id}", br=False)
 				frappe.db.savepoint(savepoint)
-				if is_synced(product.id):
-					publish(f"Product {product.id} already synced. Skipping...")
+				if is_synced(product_id):
+					publish(f"Product {product_id} already synced. Skipping...")
 					continue
 
-				shopify_product = ShopifyProduct(product.id)
-				shopify_product.sync_product()
+				shopify_product = ShopifyProduct(product_id, setting=setting)
+				shopify_product.sync_product(product_dict=product)
 
-				publish(f"✅ Synced Product {product.id}", synced=True)
+				publish(f"✅ Synced Product {product_id}", synced=True)
 
 			except UniqueValidationError as e:
-				publish(f"❌ Error Syncing Product {product.id} : {str(e)}", error=True)
+				publish(f"❌ Error Syncing Product {product_id} : {str(e)}", error=True)
 				frappe.db.rollback(save_point=savepoint)
 				continue
 
 			except Exception as e:
-				publish(f"❌ Error Syncing Product {product.id} : {str(e)}", error=True)
+				publish(f"❌ Error Syncing Product {product_id} : {str(e)}", error=True)
 				frappe.db.rollback(save_point=savepoint)
 				continue
 
-		if collection.has_next_page():
-			frappe.db.commit()  # prevents too many write request error
-			collection = _fetch_products_from_shopify(from_=collection.next_page_url)
-		else:
-			_sync = False
+		frappe.db.commit()
+	finally:
+		# counted even if the job fails or times out, so that done is still published
+		_increment_sync_progress("processed", len(products))
+		_publish_if_sync_is_done()
 
-	end_time = process_time()
-	publish(f"🎉 Done in {end_time - start_time}s", done=True)
-	return True
+
+def _reset_sync_progress():
+	key = frappe.cache().make_key(SYNC_PROGRESS_KEY)
+	frappe.cache().delete(key)
+	_set_sync_progress("started", time.time())
+
+
+def _set_sync_progress(field, value):
+	key = frappe.cache().make_key(SYNC_PROGRESS_KEY)
+	frappe.cache().execute_command("HSET", key, field, value)
+	frappe.cache().execute_command("EXPIRE", key, SYNC_PROGRESS_TTL)
+
+
+def _increment_sync_progress(field, value):
+	key = frappe.cache().make_key(SYNC_PROGRESS_KEY)
+	frappe.cache().execute_command("HINCRBY", key, field, value)
+
+
+def _publish_if_sync_is_done():
+	key = frappe.cache().make_key(SYNC_PROGRESS_KEY)
+	total, processed, started = frappe.cache().execute_command(
+		"HMGET", key, "total", "processed", "started"
+	)
+
+	if total is None or int(processed or 0) < int(total):
+		return
+
+	# only one of the jobs gets to publish
+	if not frappe.cache().execute_command("HSETNX", key, "done", 1):
+		return
+
+	total = int(total)
+	elapsed = max(time.time() - float(started or time.time()), 0.001)
+	publish(
+		f"🎉 Done, processed {total} products in {elapsed:.1f}s ({total / elapsed:.2f} products/s)",
+		done=True,
+	)
 
 
 def publish(message, synced=False, error=False, done=False, br=True):
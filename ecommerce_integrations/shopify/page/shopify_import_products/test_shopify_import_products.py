@@ -1,5 +1,6 @@
 import json
 import os
+from unittest.mock import patch
 
 import frappe
 import shopify
@@ -7,7 +8,13 @@ import shopify
 from ecommerce_integrations.shopify.product import ShopifyProduct
 
 from ...tests.utils import TestCase
-from .shopify_import_products import queue_sync_all_products
+from .shopify_import_products import (
+	SYNC_PROGRESS_KEY,
+	_reset_sync_progress,
+	_set_sync_progress,
+	queue_sync_all_products,
+	sync_products_page,
+)
 
 
 class TestShopifyImportProducts(TestCase):
@@ -94,6 +101,21 @@ class TestShopifyImportProducts(TestCase):
 			self.assertEqual(len(created_ecom_variants), len(required_variants))
 			self.assertEqual(sorted(required_variants), sorted(created_ecom_variants))
 
+	def test_failed_page_is_counted(self):
+		products = self._products[:2]
+		_reset_sync_progress()
+		_set_sync_progress("total", len(products))
+
+		with patch("frappe.db.commit", side_effect=Exception("timeout")), patch(
+			"ecommerce_integrations.shopify.page.shopify_import_products.shopify_import_products.publish"
+		) as publish:
+			self.assertRaises(Exception, sync_products_page, products)
+
+		key = frappe.cache().make_key(SYNC_PROGRESS_KEY)
+		processed = frappe.cache().execute_command("HGET", key, "processed")
+		self.assertEqual(int(processed), len(products))
+		self.assertTrue(publish.call_args.kwargs.get("done"))
+
 	def fake_single_product_from_bulk(self, product):
 		item = [p for p in self._products if str(p["id"]) == product][0]
 
@@ -1,8 +1,8 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 import frappe
 from frappe import _, msgprint
-from frappe.utils import cint, cstr
+from frappe.utils import cint, cstr, flt, now_datetime
 from frappe.utils.nestedset import get_root_of
 from shopify.resources import Product, Variant
 
@@ -18,6 +18,27 @@ from ecommerce_integrations.shopify.constants import (
 )
 from ecommerce_integrations.shopify.utils import create_shopify_log
 
+# Items are uploaded to Shopify in background. Repeated saves of an item within
+# the debounce window are uploaded once, see `upload_erpnext_item`.
+ITEM_UPLOAD_QUEUE_KEY = "shopify_item_upload_queue"  # sorted set of item code by due time
+ITEM_UPLOAD_DEBOUNCE = 60  # seconds
+ITEM_UPLOAD_BATCH_SIZE = 50
+ITEM_UPLOAD_MAX_BATCHES = 20  # per run of scheduled job
+# Item fields that are mapped to Shopify product or variant
+UPLOADED_ITEM_FIELDS = (
+	"item_name",
+	"description",
+	"item_group",
+	"weight_uom",
+	"weight_per_unit",
+	"disabled",
+	"is_stock_item",
+	"variant_of",
+	ITEM_SELLING_RATE_FIELD,
+)
+# attribute -> values of Item Attribute, see `get_item_attribute_index`
+ITEM_ATTRIBUTE_INDEX_KEY = "shopify_item_attribute_index"
+
 
 class ShopifyProduct:
 	def __init__(
@@ -26,12 +47,13 @@ class ShopifyProduct:
 		variant_id: Optional[str] = None,
 		sku: Optional[str] = None,
 		has_variants: Optional[int] = 0,
+		setting=None,
 	):
 		self.product_id = str(product_id)
 		self.variant_id = str(variant_id) if variant_id else None
 		self.sku = str(sku) if sku else None
 		self.has_variants = has_variants
-		self.setting = frappe.get_doc(SETTING_DOCTYPE)
+		self.setting = setting or frappe.get_doc(SETTING_DOCTYPE)
 
 		if not self.setting.is_enabled():
 			frappe.throw(_("Can not create Shopify product when integration is disabled."))
@@ -51,12 +73,23 @@ class ShopifyProduct:
 		)
 
 	@temp_shopify_session
-	def sync_product(self):
+	def sync_product(self, product_dict: Optional[Dict] = None):
+		"""Create item from shopify product, `product_dict` can be passed if it's already fetched."""
 		if not self.is_synced():
-			shopify_product = Product.find(self.product_id)
-			product_dict = shopify_product.to_dict()
+			if product_dict is None:
+				product_dict = Product.find(self.product_id).to_dict()
 			self._make_item(product_dict)
 
+	def create_shared_records(self, product_dict: Dict) -> None:
+		"""Create item group, attributes and supplier used by the product's items.
+
+		These are shared between products, so they are created before syncing products in
+		parallel, which would otherwise race to insert or update the same documents."""
+		self._get_item_group(product_dict.get("product_type"))
+		self._get_supplier(product_dict)
+		if _has_variants(product_dict):
+			self._create_attribute(product_dict)
+
 	def _make_item(self, product_dict):
 		_add_weight_details(product_dict)
 
@@ -70,12 +103,14 @@ class ShopifyProduct:
 
 		else:
 			product_dict["variant_id"] = product_dict["variants"][0]["id"]
+			product_dict["inventory_item_id"] = product_dict["variants"][0].get("inventory_item_id")
 			self._create_item(product_dict, warehouse)
 
 	def _create_attribute(self, product_dict):
 		attribute = []
 		for attr in product_dict.get("options"):
-			if not frappe.db.get_value("Item Attribute", attr.get("name"), "name"):
+			attribute_index = get_item_attribute_index(attr.get("name"))
+			if not attribute_index:
 				frappe.get_doc(
 					{
 						"doctype": "Item Attribute",
@@ -87,24 +122,27 @@ class ShopifyProduct:
 				).insert()
 				attribute.append({"attribute": attr.get("name")})
 
-			else:
+			elif not attribute_index["numeric_values"]:
 				# check for attribute values
-				item_attr = frappe.get_doc("Item Attribute", attr.get("name"))
-				if not item_attr.numeric_values:
-					self._set_new_attribute_values(item_attr, attr.get("values"))
+				new_values = [
+					v for v in attr.get("values") if cstr(v).lower() not in attribute_index["lookup"]
+				]
+				if new_values:
+					item_attr = frappe.get_doc("Item Attribute", attr.get("name"))
+					self._set_new_attribute_values(item_attr, new_values)
 					item_attr.save()
-					attribute.append({"attribute": attr.get("name")})
+				attribute.append({"attribute": attr.get("name")})
 
-				else:
-					attribute.append(
-						{
-							"attribute": attr.get("name"),
-							"from_range": item_attr.get("from_range"),
-							"to_range": item_attr.get("to_range"),
-							"increment": item_attr.get("increment"),
-							"numeric_values": item_attr.get("numeric_values"),
-						}
-					)
+			else:
+				attribute.append(
+					{
+						"attribute": attr.get("name"),
+						"from_range": attribute_index["from_range"],
+						"to_range": attribute_index["to_range"],
+						"increment": attribute_index["increment"],
+						"numeric_values": attribute_index["numeric_values"],
+					}
+				)
 
 		return attribute
 
@@ -137,10 +175,16 @@ class ShopifyProduct:
 
 		integration_item_code = product_dict["id"]  # shopify product_id
 		variant_id = product_dict.get("variant_id", "")  # shopify variant_id if has variants
+		inventory_item_id = product_dict.get("inventory_item_id")  # used for stock level updates
 		sku = item_dict["sku"]
 
 		if not _match_sku_and_link_item(
-			item_dict, integration_item_code, variant_id, variant_of=variant_of, has_variant=has_variant
+			item_dict,
+			integration_item_code,
+			variant_id,
+			variant_of=variant_of,
+			has_variant=has_variant,
+			inventory_item_id=inventory_item_id,
 		):
 			ecommerce_item.create_ecommerce_item(
 				MODULE_NAME,
@@ -150,6 +194,7 @@ class ShopifyProduct:
 				sku=sku,
 				variant_of=variant_of,
 				has_variants=has_variant,
+				inventory_item_id=inventory_item_id,
 			)
 
 	def _create_item_variants(self, product_dict, warehouse, attributes):
@@ -162,6 +207,7 @@ class ShopifyProduct:
 				shopify_item_variant = {
 					"id": product_dict.get("id"),
 					"variant_id": variant.get("id"),
+					"inventory_item_id": variant.get("inventory_item_id"),
 					"item_code": variant.get("id"),
 					"title": product_dict.get("title", "").strip() + "-" + variant.get("title"),
 					"product_type": product_dict.get("product_type"),
@@ -180,13 +226,9 @@ class ShopifyProduct:
 				self._create_item(shopify_item_variant, warehouse, 0, attributes, template_item.name)
 
 	def _get_attribute_value(self, variant_attr_val, attribute):
-		attribute_value = frappe.db.sql(
-			"""select attribute_value from `tabItem Attribute Value`
-			where parent = %s and (abbr = %s or attribute_value = %s)""",
-			(attribute["attribute"], variant_attr_val, variant_attr_val),
-			as_list=1,
-		)
-		return attribute_value[0][0] if len(attribute_value) > 0 else cint(variant_attr_val)
+		attribute_index = get_item_attribute_index(attribute["attribute"]) or {}
+		attribute_value = attribute_index.get("lookup", {}).get(cstr(variant_attr_val).lower())
+		return attribute_value if attribute_value is not None else cint(variant_attr_val)
 
 	def _get_item_group(self, product_type=None):
 		parent_item_group = get_root_of("Item Group")
@@ -264,7 +306,7 @@ def _get_item_image(product_dict):
 
 
 def _match_sku_and_link_item(
-	item_dict, product_id, variant_id, variant_of=None, has_variant=False
+	item_dict, product_id, variant_id, variant_of=None, has_variant=False, inventory_item_id=None
 ) -> bool:
 	"""Tries to match new item with existing item using Shopify SKU == item_code.
 
@@ -286,6 +328,7 @@ def _match_sku_and_link_item(
 					"has_variants": 0,
 					"variant_id": cstr(variant_id),
 					"sku": sku,
+					"inventory_item_id": cstr(inventory_item_id),
 				}
 			)
 
@@ -297,7 +340,12 @@ def _match_sku_and_link_item(
 
 def create_items_if_not_exist(order):
 	"""Using shopify order, sync all items that are not already synced."""
-	for item in order.get("line_items", []):
+	line_items = order.get("line_items", [])
+	item_codes = get_item_codes(line_items)
+
+	for item in line_items:
+		if item_codes.get(_get_item_key(item)):
+			continue
 
 		product_id = item["product_id"]
 		variant_id = item.get("variant_id")
@@ -308,10 +356,14 @@ def create_items_if_not_exist(order):
 			product.sync_product()
 
 
-def get_item_code(shopify_item):
+def get_item_code(shopify_item, item_codes: Optional[Dict] = None):
 	"""Get item code using shopify_item dict.
 
-	Item should contain both product_id and variant_id."""
+	Item should contain both product_id and variant_id. If `item_codes` resolved by
+	`get_item_codes` are passed, item is looked up in them before querying."""
+
+	if item_codes and (item_code := item_codes.get(_get_item_key(shopify_item))):
+		return item_code
 
 	item = ecommerce_item.get_erpnext_item(
 		integration=MODULE_NAME,
@@ -323,35 +375,211 @@ def get_item_code(shopify_item):
 		return item.item_code
 
 
-@temp_shopify_session
+def get_item_codes(shopify_items: List[Dict]) -> Dict:
+	"""Get item codes for all shopify_items (e.g. line items of an order) in one query.
+
+	Pass the result to `get_item_code` so that lookups of the same items don't
+	hit the database.
+
+	returns: dict of (product_id, variant_id, sku) -> item_code"""
+
+	keys = {_get_item_key(item) for item in shopify_items}
+	return ecommerce_item.get_erpnext_item_codes(MODULE_NAME, list(keys))
+
+
+def _get_item_key(shopify_item):
+	return (
+		cstr(shopify_item.get("product_id")),
+		cstr(shopify_item.get("variant_id")),
+		cstr(shopify_item.get("sku")),
+	)
+
+
 def upload_erpnext_item(doc, method=None):
 	"""This hook is called when inserting new or updating existing `Item`.
 
 	New items are pushed to shopify and changes to existing items are
 	updated depending on what is configured in "Shopify Setting" doctype.
+
+	Item is only queued here and uploaded by `process_item_upload_queue` once the
+	item isn't saved again for `ITEM_UPLOAD_DEBOUNCE` seconds, so saving an item
+	doesn't wait for Shopify.
 	"""
-	template_item = item = doc  # alias for readability
+	item = doc
 	# a new item recieved from ecommerce_integrations is being inserted
 	if item.flags.from_integration:
 		return
 
-	setting = frappe.get_doc(SETTING_DOCTYPE)
+	setting = frappe.get_cached_doc(SETTING_DOCTYPE)
 
-	if not setting.is_enabled() or not setting.upload_erpnext_items:
+	if not _can_upload_item(item, setting, show_message=True):
 		return
 
-	if frappe.flags.in_import:
+	if method == "on_update" and _is_uploaded(item) and not _has_uploaded_fields_changed(item):
 		return
 
+	item_code = item.name
+	# queue only if item is saved successfully
+	frappe.db.after_commit.add(lambda: _queue_item_upload(item_code))
+
+
+def _can_upload_item(item, setting, show_message=False) -> bool:
+	if not setting.is_enabled() or not setting.upload_erpnext_items:
+		return False
+
+	if frappe.flags.in_import:
+		return False
+
 	if item.has_variants:
-		return
+		return False
 
 	if len(item.attributes) > 3:
-		msgprint(_("Template items/Items with 4 or more attributes can not be uploaded to Shopify."))
+		if show_message:
+			msgprint(_("Template items/Items with 4 or more attributes can not be uploaded to Shopify."))
+		return False
+
+	if item.variant_of and not setting.upload_variants_as_items:
+		if show_message:
+			msgprint(_("Enable variant sync in setting to upload item to Shopify."))
+		return False
+
+	return True
+
+
+def _is_uploaded(item) -> bool:
+	"""Check if item is linked to a Shopify product, saving an item that isn't uploads it again."""
+	return bool(
+		frappe.db.exists(
+			"Ecommerce Item", {"erpnext_item_code": item.name, "integration": MODULE_NAME}
+		)
+	)
+
+
+def _has_uploaded_fields_changed(item) -> bool:
+	previous = item.get_doc_before_save()
+	if not previous:
+		return True
+
+	if any(item.get(field) != previous.get(field) for field in UPLOADED_ITEM_FIELDS):
+		return True
+
+	return _get_attribute_values(item) != _get_attribute_values(previous)
+
+
+def _get_attribute_values(item) -> List:
+	return [(d.attribute, d.attribute_value) for d in item.attributes]
+
+
+def get_item_attribute_index(attribute: str) -> Optional[Dict]:
+	"""Values of an Item Attribute with lower cased value and abbreviation -> attribute value.
+
+	Cached till the Item Attribute is updated, returns None if attribute doesn't exist."""
+	index = frappe.cache().hget(ITEM_ATTRIBUTE_INDEX_KEY, attribute)
+	if index is not None:
+		return index
+
+	item_attribute = frappe.db.get_value(
+		"Item Attribute",
+		attribute,
+		["numeric_values", "from_range", "to_range", "increment"],
+		as_dict=True,
+	)
+	if not item_attribute:
+		return None
+
+	values = frappe.get_all(
+		"Item Attribute Value",
+		filters={"parent": attribute, "parenttype": "Item Attribute"},
+		fields=["attribute_value", "abbr"],
+		order_by="idx",
+	)
+
+	lookup = {}
+	for d in values:
+		lookup.setdefault(cstr(d.attribute_value).lower(), d.attribute_value)
+	for d in values:
+		lookup.setdefault(cstr(d.abbr).lower(), d.attribute_value)
+
+	index = {
+		**item_attribute,
+		"values": [d.attribute_value for d in values],
+		"lookup": lookup,
+	}
+	frappe.cache().hset(ITEM_ATTRIBUTE_INDEX_KEY, attribute, index)
+	return index
+
+
+def get_item_attribute_values(attribute: str) -> List[str]:
+	index = get_item_attribute_index(attribute)
+	return index["values"] if index else []
+
+
+def clear_item_attribute_index(doc, method=None) -> None:
+	"""Clear cached index of Item Attribute, called from doc events."""
+	attribute = doc.name
+
+	def clear():
+		frappe.cache().hdel(ITEM_ATTRIBUTE_INDEX_KEY, attribute)
+
+	clear()
+	# other workers might cache old values till this transaction is committed or rolled back
+	frappe.db.after_commit.add(clear)
+	frappe.db.after_rollback.add(clear)
+
+
+def _queue_item_upload(item_code: str) -> None:
+	"""Add item to upload queue, due time of already queued item is pushed back."""
+	due = now_datetime().timestamp() + ITEM_UPLOAD_DEBOUNCE
+	frappe.cache().execute_command(
+		"ZADD", frappe.cache().make_key(ITEM_UPLOAD_QUEUE_KEY), due, item_code
+	)
+
+
+def process_item_upload_queue() -> None:
+	"""Upload queued items to Shopify in batches, scheduled to run frequently."""
+	setting = frappe.get_cached_doc(SETTING_DOCTYPE)
+	if not setting.is_enabled() or not setting.upload_erpnext_items:
+		return
+
+	key = frappe.cache().make_key(ITEM_UPLOAD_QUEUE_KEY)
+
+	for _batch in range(ITEM_UPLOAD_MAX_BATCHES):
+		now = now_datetime().timestamp()
+		item_codes = frappe.cache().execute_command(
+			"ZRANGEBYSCORE", key, "-inf", now, "LIMIT", 0, ITEM_UPLOAD_BATCH_SIZE
+		)
+		if not item_codes:
+			return
+
+		for item_code in item_codes:
+			# item is removed before upload, saving it again meanwhile queues it again
+			if not frappe.cache().execute_command("ZREM", key, item_code):
+				continue  # picked by another job
+
+			item_code = frappe.safe_decode(item_code)
+			try:
+				upload_item(item_code)
+				frappe.db.commit()
+			except Exception:
+				frappe.db.rollback()
+				create_shopify_log(
+					status="Error",
+					exception=frappe.get_traceback(),
+					message=f"Failed to upload item {item_code} to Shopify",
+					method="upload_erpnext_item",
+				)
+
+
+@temp_shopify_session
+def upload_item(item_code: str) -> None:
+	"""Create or update Shopify product of an item."""
+	if not frappe.db.exists("Item", item_code):
 		return
 
-	if doc.variant_of and not setting.upload_variants_as_items:
-		msgprint(_("Enable variant sync in setting to upload item to Shopify."))
+	template_item = item = frappe.get_doc("Item", item_code)
+	setting = frappe.get_doc(SETTING_DOCTYPE)
+
+	if not _can_upload_item(item, setting):
 		return
 
 	if item.variant_of:
@@ -393,9 +621,7 @@ def upload_erpnext_item(doc, method=None):
 					product.options.append(
 						{
 							"name": attr.attribute,
-							"values": frappe.db.get_all(
-								"Item Attribute Value", {"parent": attr.attribute}, pluck="attribute_value"
-							),
+							"values": get_item_attribute_values(attr.attribute),
 						}
 					)
 					try:
@@ -416,6 +642,9 @@ def upload_erpnext_item(doc, method=None):
 						"integration_item_code": str(product.id),
 						"variant_id": "" if d.has_variants else str(product.variants[0].id),
 						"sku": "" if d.has_variants else str(product.variants[0].sku),
+						"inventory_item_id": (
+							"" if d.has_variants else get_variant_inventory_item_id(product.variants[0])
+						),
 						"has_variants": d.has_variants,
 						"variant_of": d.variant_of,
 					}
@@ -426,11 +655,15 @@ def upload_erpnext_item(doc, method=None):
 	elif setting.update_shopify_item_on_update:
 		product = Product.find(product_id)
 		if product:
+			variant = _get_item_variant(product, item)
+			shopify_values = _get_uploaded_values(product, variant)
+
 			map_erpnext_item_to_shopify(shopify_product=product, erpnext_item=template_item)
 			if not item.variant_of:
 				update_default_variant_properties(
 					product, is_stock_item=template_item.is_stock_item, price=item.get(ITEM_SELLING_RATE_FIELD)
 				)
+				mapped_variant = variant
 			else:
 				variant_attributes = {"sku": item.item_code, "price": item.get(ITEM_SELLING_RATE_FIELD)}
 				product.options = []
@@ -440,9 +673,7 @@ def upload_erpnext_item(doc, method=None):
 					product.options.append(
 						{
 							"name": attr.attribute,
-							"values": frappe.db.get_all(
-								"Item Attribute Value", {"parent": attr.attribute}, pluck="attribute_value"
-							),
+							"values": get_item_attribute_values(attr.attribute),
 						}
 					)
 					try:
@@ -450,6 +681,11 @@ def upload_erpnext_item(doc, method=None):
 					except IndexError:
 						frappe.throw(_("Shopify Error: Missing value for attribute {}").format(attr.attribute))
 				product.variants.append(Variant(variant_attributes))
+				mapped_variant = {**(variant.attributes if variant else {}), **variant_attributes}
+
+			if variant and _get_uploaded_values(product, mapped_variant) == shopify_values:
+				# product on shopify is up to date
+				return
 
 			is_successful = product.save()
 			if is_successful and item.variant_of:
@@ -458,6 +694,45 @@ def upload_erpnext_item(doc, method=None):
 			write_upload_log(status=is_successful, product=product, item=item, action="Updated")
 
 
+def _get_item_variant(product: Product, item) -> Optional[Variant]:
+	"""Variant of the product that's linked with item, default variant for items without variants."""
+	variants = product.attributes.get("variants") or []
+	if not item.variant_of:
+		return variants[0] if variants else None
+
+	for variant in variants:
+		if cstr(variant.attributes.get("sku")) == item.item_code:
+			return variant
+
+
+def _get_uploaded_values(product: Product, variant) -> Dict:
+	"""Fields of product and variant that are mapped from an item, normalised for comparison.
+
+	Weight is mapped to the product but stored on the variant by Shopify, it's compared
+	with the variant's weight."""
+	variant = variant.attributes if isinstance(variant, Variant) else variant or {}
+	product_values = product.attributes
+
+	def get_name(option):
+		return cstr(option.get("name") if isinstance(option, dict) else option.attributes.get("name"))
+
+	return {
+		"title": cstr(product_values.get("title")),
+		"body_html": cstr(product_values.get("body_html")),
+		"product_type": cstr(product_values.get("product_type")),
+		"status": cstr(product_values.get("status")),
+		"options": [get_name(option) for option in product_values.get("options") or []],
+		"weight": flt(product_values.get("weight", variant.get("weight"))),
+		"weight_unit": cstr(product_values.get("weight_unit", variant.get("weight_unit"))),
+		"sku": cstr(variant.get("sku")),
+		"price": flt(variant.get("price"), 2),
+		"inventory_management": cstr(variant.get("inventory_management")),
+		"option1": cstr(variant.get("option1")),
+		"option2": cstr(variant.get("option2")),
+		"option3": cstr(variant.get("option3")),
+	}
+
+
 def map_erpnext_variant_to_shopify_variant(
 	shopify_product: Product, erpnext_item, variant_attributes
 ):
@@ -483,6 +758,7 @@ def map_erpnext_variant_to_shopify_variant(
 							"integration_item_code": str(shopify_product.id),
 							"variant_id": variant_product_id,
 							"sku": str(variant.sku),
+							"inventory_item_id": get_variant_inventory_item_id(variant),
 							"variant_of": erpnext_item.variant_of,
 						}
 					).insert()
@@ -492,6 +768,10 @@ def map_erpnext_variant_to_shopify_variant(
 	return variant_product_id
 
 
+def get_variant_inventory_item_id(variant: Variant) -> str:
+	return cstr(variant.attributes.get("inventory_item_id"))
+
+
 def map_erpnext_item_to_shopify(shopify_product: Product, erpnext_item):
 	"""Map erpnext fields to shopify, called both when updating and creating new products."""
 
@@ -1,4 +1,178 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
 import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_TIMEOUT = 10
+
+# Shopify asks clients to back off on 429 and transient 5xx responses. A 5xx can be
+# returned after a write was applied, so only idempotent methods are retried on it.
+THROTTLED_STATUS_CODES = (429,)
+SERVER_ERROR_STATUS_CODES = (500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+MAX_BACKOFF = 30
+
+# operations of an order edit sent in a single GraphQL request, keeps query cost in limits
+MAX_EDIT_OPERATIONS_PER_REQUEST = 25
+# GraphQL API reports throttling in the response body instead of a 429
+GRAPHQL_THROTTLED_CODE = "THROTTLED"
+
+ORDER_EDIT_BEGIN_MUTATION = """
+mutation orderEditBegin($id: ID!) {
+  orderEditBegin(id: $id) {
+    calculatedOrder {
+      id
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+ORDER_EDIT_COMMIT_MUTATION = """
+mutation orderEditCommit($id: ID!, $notifyCustomer: Boolean, $staffNote: String) {
+  orderEditCommit(id: $id, notifyCustomer: $notifyCustomer, staffNote: $staffNote) {
+    order {
+      id
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+
+EDIT_OPERATION_FIELDS = """{
+    calculatedLineItem {
+      id
+      quantity
+    }
+    userErrors {
+      field
+      message
+    }
+  }"""
+
+logger = logging.getLogger(__name__)
+
+# shop_url -> requests.Session, shared by every manager in this process
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# (shop_url, operation) -> latency stats of calls made in this process
+_metrics = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+_metrics_lock = threading.Lock()
+
+
+def get_session(shop_url, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Return the process-wide keep-alive session for a shop, creating it on first use.
+
+    Reusing one session per shop keeps TCP+TLS connections open between calls
+    instead of paying a fresh handshake for every request.
+    """
+    session = _sessions.get(shop_url)
+    if session and session.pool_size >= pool_size:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(shop_url)
+        if not session:
+            session = requests.Session()
+            session.pool_size = 0
+            _sessions[shop_url] = session
+
+        if session.pool_size < pool_size:
+            # pool grows to the largest size asked for, connections of old pool are dropped
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.pool_size = pool_size
+
+    return session
+
+
+def close_sessions():
+    """Close all pooled sessions, e.g. when credentials or shop URL change."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_metrics():
+    """
+    Return per-operation latency metrics for calls made in this process.
+
+    Returns:
+      dict: `{"<shop_url>:<operation>": {"calls", "errors", "retries", "total_ms", "max_ms", "avg_ms"}}`
+    """
+    with _metrics_lock:
+        metrics = {}
+        for (shop_url, operation), stats in _metrics.items():
+            stats = dict(stats)
+            stats["avg_ms"] = stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0
+            metrics[f"{shop_url}:{operation}"] = stats
+        return metrics
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def _record_metrics(shop_url, operation, elapsed_ms, retries, failed):
+    with _metrics_lock:
+        stats = _metrics[(shop_url, operation)]
+        stats["calls"] += 1
+        stats["retries"] += retries
+        stats["errors"] += int(failed)
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+
+def _should_retry(method, status_code):
+    """Throttled requests are always retried, server errors only for idempotent methods."""
+    if status_code in THROTTLED_STATUS_CODES:
+        return True
+    return status_code in SERVER_ERROR_STATUS_CODES and method.upper() in IDEMPOTENT_METHODS
+
+
+def _get_graphql_retry_delay(result, attempt):
+    """Seconds until enough query cost is restored, from `extensions.cost` of a throttled result."""
+    cost = (result.get("extensions") or {}).get("cost") or {}
+    throttle_status = cost.get("throttleStatus") or {}
+    try:
+        missing = float(cost["requestedQueryCost"]) - float(throttle_status["currentlyAvailable"])
+        return min(max(missing, 0) / float(throttle_status["restoreRate"]) + 0.1, MAX_BACKOFF)
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return min(0.5 * (2 ** attempt), MAX_BACKOFF)
+
+
+def _is_throttled(result):
+    return any(
+        (error.get("extensions") or {}).get("code") == GRAPHQL_THROTTLED_CODE
+        for error in result.get("errors") or []
+    )
+
+
+def _get_retry_delay(response, attempt):
+    """Seconds to wait before retrying, preferring Shopify's `Retry-After` header."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_BACKOFF)
+        except ValueError:
+            pass
+
+    return min(0.5 * (2 ** attempt), MAX_BACKOFF)
 
 
 class ShopifyOrderManager:
@@ -12,12 +186,24 @@ class ShopifyOrderManager:
     authenticate and interact with the Shopify API. The `base_url` property is constructed 
     from the `shop_url` and used as the base for all API requests.
 
+    All requests go through a pooled keep-alive session shared by every manager for the
+    same shop (see `get_session`). Responses with status 429 are retried up to
+    `max_retries` times, waiting for Shopify's `Retry-After` header when present and
+    exponential backoff otherwise. 5xx responses are retried only for GET, PUT and DELETE
+    requests, a POST (e.g. `create_order`) may have been applied and isn't sent again. Latency of every call is recorded per operation and
+    can be read with `get_metrics()`.
+
+    Line items of an existing order are changed with `edit_order`, which applies any
+    number of operations in a single order edit session of Shopify's GraphQL API.
+
     The methods in this class are:
     - `create_order(customer_id, line_items)`: Creates a new order for the specified
     customer with the provided line items.
     - `get_order(order_id)`: Retrieves the details of a specific order from Shopify.
     - `update_order(order_id, customer_id, line_items)`: Updates an existing order with
     the specified order ID, customer ID, and line items.
+    - `edit_order(order_id, operations)`: Adds, removes and changes quantity of many
+    line items of an existing order at once.
     - `add_item_to_order(order_id, variant_id, quantity)`: Adds a new line item to an 
     existing order.
     - `remove_item_from_order(order_id, line_item_id)`: Removes a specific line item 
@@ -26,13 +212,48 @@ class ShopifyOrderManager:
     of a specific line item in an existing order.
     """
 
-    def __init__(self, shop_url, access_token):
+    def __init__(self, shop_url, access_token, pool_size=None, max_retries=None):
         self.shop_url = shop_url
         self.headers = {
             'X-Shopify-Access-Token': access_token,
             'Content-Type': 'application/json'
         }
         self.base_url = f"https://{shop_url}/admin/api/2023-07"
+        self.graphql_url = f"{self.base_url}/graphql.json"
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.session = get_session(shop_url, pool_size or DEFAULT_POOL_SIZE)
+
+    def _request(self, method, url, operation, **kwargs):
+        """
+        Send a request through the pooled session, retrying throttled and failed calls.
+
+        Args:
+          method (str): HTTP method.
+          url (str): Absolute URL of the endpoint.
+          operation (str): Name used to group latency metrics, e.g. "get_order".
+
+        Returns:
+          requests.Response: The last response received from Shopify.
+        """
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        start = time.monotonic()
+        retries = 0
+        failed = True
+
+        try:
+            while True:
+                response = self.session.request(method, url, headers=self.headers, **kwargs)
+                if not _should_retry(method, response.status_code) or retries >= self.max_retries:
+                    failed = not response.ok
+                    return response
+
+                time.sleep(_get_retry_delay(response, retries))
+                retries += 1
+        finally:
+            elapsed_ms = (time.monotonic() - start) * 1000
+            _record_metrics(self.shop_url, operation, elapsed_ms, retries, failed)
+            logger.debug(
+                "Shopify %s %s took %.1fms (retries: %s)", method, operation, elapsed_ms, retries)
 
     def create_order(self, customer_id, line_items):
         """
@@ -53,8 +274,7 @@ class ShopifyOrderManager:
             }
         }
 
-        response = requests.post(
-            url, headers=self.headers, json=payload, timeout=10)
+        response = self._request("POST", url, "create_order", json=payload)
         return response.json()
 
     def get_order(self, order_id):
@@ -71,7 +291,7 @@ class ShopifyOrderManager:
           requests.exceptions.RequestException: If there is an issue with the HTTP request.
         """
         url = f"{self.base_url}/orders/{order_id}.json"
-        response = requests.get(url, headers=self.headers, timeout=10)
+        response = self._request("GET", url, "get_order")
         return response.json()
 
     def update_order(self, order_id, customer_id, line_items):
@@ -95,10 +315,116 @@ class ShopifyOrderManager:
             }
         }
 
-        response = requests.put(
-            url, headers=self.headers, json=payload, timeout=10)
+        response = self._request("PUT", url, "update_order", json=payload)
         return response.json()
 
+    def _graphql(self, query, variables, operation):
+        """
+        Execute a GraphQL query and return its `data`.
+
+        Throttled queries aren't executed by Shopify, they are retried up to `max_retries`
+        times after waiting for the query cost to be restored.
+
+        Raises:
+          requests.exceptions.HTTPError: If Shopify doesn't accept the request.
+          ValueError: If the response contains top level GraphQL errors.
+        """
+        for attempt in range(self.max_retries + 1):
+            response = self._request(
+                "POST", self.graphql_url, operation, json={"query": query, "variables": variables})
+            response.raise_for_status()
+
+            result = response.json()
+            if not _is_throttled(result) or attempt >= self.max_retries:
+                break
+
+            time.sleep(_get_graphql_retry_delay(result, attempt))
+
+        if result.get("errors"):
+            raise ValueError(
+                "Shopify GraphQL error: " + ", ".join(str(e.get("message")) for e in result["errors"]))
+        return result["data"]
+
+    def edit_order(self, order_id, operations, notify_customer=False, staff_note=None):
+        """
+        Apply many line item changes to an order using a single order edit.
+
+        An edit session is started with `orderEditBegin`, operations are sent in as few
+        requests as possible (up to `MAX_EDIT_OPERATIONS_PER_REQUEST` each) and changes are
+        committed once with `orderEditCommit`. If any operation fails nothing is committed.
+
+        Args:
+          order_id (int): The ID of the order to edit.
+          operations (list): Dictionaries with `op` and its arguments, one of
+            - `{"op": "add", "variant_id": int, "quantity": int}`
+            - `{"op": "remove", "line_item_id": int, "restock": bool}`
+            - `{"op": "set_quantity", "line_item_id": int, "quantity": int, "restock": bool}`
+            `restock` is optional, removed quantity isn't restocked by default.
+          notify_customer (bool): Send an invoice for the updated order to the customer.
+          staff_note (str): Note for the change, visible on order's timeline.
+
+        Returns:
+          dict: `{"success": bool, "order_id": order_id, "committed": bool, "errors": list,
+          "operations": list}`, each operation with `op`, `success`, `errors` and
+          `calculated_line_item` (`id` and `quantity`) as returned by Shopify.
+        """
+        result = {
+            "success": False,
+            "order_id": order_id,
+            "committed": False,
+            "errors": [],
+            "operations": [
+                {"op": operation.get("op"), "success": False, "errors": [], "calculated_line_item": None}
+                for operation in operations
+            ],
+        }
+
+        try:
+            mutations = [_get_edit_operation(operation) for operation in operations]
+        except (KeyError, ValueError) as e:
+            result["errors"].append(f"Invalid operation: {e}")
+            return result
+
+        begin = self._graphql(
+            ORDER_EDIT_BEGIN_MUTATION, {"id": f"gid://shopify/Order/{order_id}"}, "order_edit_begin"
+        )["orderEditBegin"]
+        if begin["userErrors"]:
+            result["errors"].extend(e["message"] for e in begin["userErrors"])
+            return result
+
+        calculated_order_id = begin["calculatedOrder"]["id"]
+
+        for start in range(0, len(mutations), MAX_EDIT_OPERATIONS_PER_REQUEST):
+            batch = mutations[start:start + MAX_EDIT_OPERATIONS_PER_REQUEST]
+            query, variables = _build_edit_operations_query(calculated_order_id, batch, start)
+            data = self._graphql(query, variables, "order_edit_operations")
+
+            for index in range(start, start + len(batch)):
+                operation_result = data.get(f"op{index}") or {}
+                errors = [e["message"] for e in operation_result.get("userErrors") or []]
+                result["operations"][index].update({
+                    "success": not errors,
+                    "errors": errors,
+                    "calculated_line_item": operation_result.get("calculatedLineItem"),
+                })
+
+            if not all(d["success"] for d in result["operations"][start:start + len(batch)]):
+                # uncommitted edit is discarded by Shopify
+                result["errors"].append("Order edit not committed as some operations failed")
+                return result
+
+        commit = self._graphql(
+            ORDER_EDIT_COMMIT_MUTATION,
+            {"id": calculated_order_id, "notifyCustomer": notify_customer, "staffNote": staff_note},
+            "order_edit_commit",
+        )["orderEditCommit"]
+        if commit["userErrors"]:
+            result["errors"].extend(e["message"] for e in commit["userErrors"])
+            return result
+
+        result["success"] = result["committed"] = True
+        return result
+
     def add_item_to_order(self, order_id, variant_id, quantity):
         """
         Adds an item to an existing order.
@@ -109,25 +435,10 @@ class ShopifyOrderManager:
           quantity (int): The quantity of the item to be added.
 
         Returns:
-          dict: The JSON response from the Shopify API containing the updated order details.
+          dict: Result of the order edit, see `edit_order`.
         """
-        url = f"{self.base_url}/orders/{order_id}.json"
-
-        payload = {
-            "order": {
-                "id": order_id,
-                "line_items": [
-                    {
-                        "variant_id": variant_id,
-                        "quantity": quantity
-                    }
-                ]
-            }
-        }
-
-        response = requests.post(
-            url, headers=self.headers, json=payload, timeout=10)
-        return response.json()
+        return self.edit_order(
+            order_id, [{"op": "add", "variant_id": variant_id, "quantity": quantity}])
 
     def remove_item_from_order(self, order_id, line_item_id):
         """
@@ -138,30 +449,9 @@ class ShopifyOrderManager:
           line_item_id (int): The ID of the line item to be removed.
 
         Returns:
-          dict: The JSON response from the Shopify API after updating the order.
+          dict: Result of the order edit, see `edit_order`.
         """
-        url = f"{self.base_url}/orders/{order_id}.json"
-
-        # First, get the current order
-        get_response = requests.get(url, headers=self.headers, timeout=10)
-        order_data = get_response.json()['order']
-
-        # Filter out the line item to remove
-        updated_line_items = [
-            item for item in order_data['line_items']
-            if item['id'] != line_item_id
-        ]
-
-        payload = {
-            "order": {
-                "id": order_id,
-                "line_items": updated_line_items
-            }
-        }
-
-        response = requests.put(
-            url, headers=self.headers, json=payload, timeout=10)
-        return response.json()
+        return self.edit_order(order_id, [{"op": "remove", "line_item_id": line_item_id}])
 
     def update_item_quantity(self, order_id, line_item_id, new_quantity):
         """
@@ -173,24 +463,58 @@ class ShopifyOrderManager:
             new_quantity (int): The new quantity to set for the line item.
 
         Returns:
-            dict: The JSON response from the Shopify API after updating the order.
+            dict: Result of the order edit, see `edit_order`.
         """
-        url = f"{self.base_url}/orders/{order_id}.json"
+        return self.edit_order(
+            order_id,
+            [{"op": "set_quantity", "line_item_id": line_item_id, "quantity": new_quantity}],
+        )
 
-        get_response = requests.get(url, headers=self.headers, timeout=10)
-        order_data = get_response.json()['order']
 
-        for item in order_data['line_items']:
-            if item['id'] == line_item_id:
-                item['quantity'] = new_quantity
+def _get_edit_operation(operation):
+    """
+    Return GraphQL mutation name and its arguments (name -> (type, value)) for an operation.
+    """
+    op = operation["op"]
 
-        payload = {
-            "order": {
-                "id": order_id,
-                "line_items": order_data['line_items']
-            }
+    if op == "add":
+        return "orderEditAddVariant", {
+            "variantId": ("ID!", f"gid://shopify/ProductVariant/{operation['variant_id']}"),
+            "quantity": ("Int!", int(operation["quantity"])),
+            "allowDuplicates": ("Boolean", True),
         }
 
-        response = requests.put(
-            url, headers=self.headers, json=payload, timeout=10)
-        return response.json()
+    if op in ("remove", "set_quantity"):
+        quantity = 0 if op == "remove" else int(operation["quantity"])
+        return "orderEditSetQuantity", {
+            # calculated line item of an order edit has the same id as the line item
+            "lineItemId": ("ID!", f"gid://shopify/CalculatedLineItem/{operation['line_item_id']}"),
+            "quantity": ("Int!", quantity),
+            # same as the REST API used before, removed quantity isn't restocked by default
+            "restock": ("Boolean", bool(operation.get("restock", False))),
+        }
+
+    raise ValueError(f"unknown operation {op!r}")
+
+
+def _build_edit_operations_query(calculated_order_id, mutations, offset=0):
+    """
+    Build a single GraphQL document running all mutations in order, aliased as `op<index>`.
+    """
+    definitions = ["$id: ID!"]
+    selections = []
+    variables = {"id": calculated_order_id}
+
+    for index, (mutation, arguments) in enumerate(mutations, start=offset):
+        call_arguments = ["id: $id"]
+        for name, (graphql_type, value) in arguments.items():
+            variable = f"{name}{index}"
+            definitions.append(f"${variable}: {graphql_type}")
+            call_arguments.append(f"{name}: ${variable}")
+            variables[variable] = value
+
+        selections.append(
+            f"  op{index}: {mutation}({', '.join(call_arguments)}) {EDIT_OPERATION_FIELDS}")
+
+    query = f"mutation orderEdit({', '.join(definitions)}) {{\n" + "\n".join(selections) + "\n}"
+    return query, variables
@@ -0,0 +1,113 @@
+# Copyright (c) 2021, Frappe and Contributors
+# See LICENSE
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+import responses
+
+from ecommerce_integrations.shopify import bulk_operation, bulk_product_upload
+
+RESULT_URL = "https://storage.googleapis.com/shopify/bulk-result.jsonl"
+STAGED_UPLOAD_URL = "https://shopify-staged-uploads.storage.googleapis.com/"
+
+
+class TestBulkOperation(unittest.TestCase):
+	@patch("ecommerce_integrations.shopify.bulk_operation.time.sleep")
+	@patch("ecommerce_integrations.shopify.bulk_operation.execute_graphql")
+	def test_wait_for_bulk_operation(self, execute_graphql, sleep):
+		execute_graphql.side_effect = [
+			{"node": {"id": "1", "status": "RUNNING"}},
+			{"node": {"id": "1", "status": "COMPLETED", "url": RESULT_URL}},
+		]
+
+		operation = bulk_operation.wait_for_bulk_operation("1")
+
+		self.assertEqual(operation["url"], RESULT_URL)
+		sleep.assert_called_once()
+
+	@patch("ecommerce_integrations.shopify.bulk_operation.execute_graphql")
+	def test_failed_bulk_operation(self, execute_graphql):
+		execute_graphql.return_value = {
+			"node": {"id": "1", "status": "FAILED", "errorCode": "INTERNAL_SERVER_ERROR"}
+		}
+
+		self.assertRaises(frappe.ValidationError, bulk_operation.wait_for_bulk_operation, "1")
+
+	@responses.activate
+	def test_iter_bulk_operation_results(self):
+		responses.add(
+			responses.GET,
+			RESULT_URL,
+			body='{"legacyResourceId": "1"}\n{"legacyResourceId": "2"}\n',
+		)
+
+		results = list(bulk_operation.iter_bulk_operation_results({"url": RESULT_URL}))
+
+		self.assertEqual(results, [{"legacyResourceId": "1"}, {"legacyResourceId": "2"}])
+		self.assertEqual(list(bulk_operation.iter_bulk_operation_results({"url": None})), [])
+
+	@responses.activate
+	@patch("ecommerce_integrations.shopify.bulk_operation.execute_graphql")
+	def test_run_bulk_mutation(self, execute_graphql):
+		staged_path = "tmp/1/bulk/bulk_op_vars.jsonl"
+		execute_graphql.side_effect = [
+			{
+				"stagedUploadsCreate": {
+					"stagedTargets": [
+						{"url": STAGED_UPLOAD_URL, "parameters": [{"name": "key", "value": staged_path}]}
+					],
+					"userErrors": [],
+				}
+			},
+			{"bulkOperationRunMutation": {"bulkOperation": {"id": "1"}, "userErrors": []}},
+		]
+		responses.add(responses.POST, STAGED_UPLOAD_URL, status=204)
+
+		operation_id = bulk_operation.run_bulk_mutation("mutation", [{"input": {"title": "A"}}])
+
+		self.assertEqual(operation_id, "1")
+		self.assertIn(b'{"input": {"title": "A"}}\n', responses.calls[0].request.body)
+		self.assertEqual(
+			execute_graphql.call_args.args[1], {"mutation": "mutation", "stagedUploadPath": staged_path}
+		)
+
+	@patch("ecommerce_integrations.shopify.bulk_product_upload.frappe.get_all")
+	def test_linked_items_are_not_inserted_again(self, get_all):
+		def get_item(item_code, product_id):
+			variant = {"legacyResourceId": product_id, "sku": item_code}
+			return frappe._dict(
+				name=item_code,
+				product={"legacyResourceId": product_id, "variants": {"edges": [{"node": variant}]}},
+			)
+
+		# linked by `upload_erpnext_item` while bulk operation was running
+		get_all.return_value = [
+			frappe._dict(erpnext_item_code="_Test Item", integration_item_code="1", sku="_Test Item")
+		]
+		items = [get_item("_Test Item", "1"), get_item("_Test Item 2", "2")]
+
+		self.assertEqual(
+			[item.name for item in bulk_product_upload._exclude_linked_items(items)], ["_Test Item 2"]
+		)
+
+	@patch("ecommerce_integrations.shopify.bulk_product_upload.execute_graphql")
+	@patch("ecommerce_integrations.shopify.bulk_product_upload.frappe.get_all")
+	def test_orphaned_products_are_deleted(self, get_all, execute_graphql):
+		def get_item(item_code, product_id):
+			product = {"id": f"gid://shopify/Product/{product_id}", "legacyResourceId": product_id}
+			return frappe._dict(name=item_code, product=product)
+
+		# product 2 was linked by product import, it isn't a duplicate
+		get_all.return_value = ["2"]
+		execute_graphql.return_value = {
+			"productDelete": {"deletedProductId": "gid://shopify/Product/1", "userErrors": []}
+		}
+		items = [get_item("_Test Item", "1"), get_item("_Test Item 2", "2")]
+
+		self.assertEqual(bulk_product_upload._delete_orphaned_products(items), [])
+		execute_graphql.assert_called_once()
+		self.assertEqual(
+			execute_graphql.call_args.args[1], {"input": {"id": "gid://shopify/Product/1"}}
+		)
@@ -1,7 +1,12 @@
 # Copyright (c) 2021, Frappe and Contributors
 # See LICENSE
 
+import base64
+import hashlib
+import hmac
+import json
 import unittest
+from unittest.mock import patch
 
 import frappe
 from shopify.resources import Webhook
@@ -38,3 +43,136 @@ class TestShopifyConnection(unittest.TestCase):
 		with Session.temp(self.setting.shopify_url, API_VERSION, self.setting.get_password("password")):
 			for wh in Webhook.find():
 				self.assertNotEqual(wh.address, callback_url)
+
+	@patch("ecommerce_integrations.shopify.connection.get_shared_secret", return_value="secret")
+	def test_validate_request(self, _):
+		request = frappe._dict(data=b'{"id": 1}')
+		signature = base64.b64encode(hmac.new(b"secret", request.data, hashlib.sha256).digest())
+
+		connection._validate_request(request, signature.decode())
+
+		with patch("ecommerce_integrations.shopify.connection.create_shopify_log"):
+			self.assertRaises(frappe.ValidationError, connection._validate_request, request, "invalid")
+			self.assertRaises(frappe.ValidationError, connection._validate_request, request, None)
+
+	def test_shared_secret_cache(self):
+		connection.clear_shared_secret_cache()
+		secret = frappe.db.get_single_value(SETTING_DOCTYPE, "shared_secret") or ""
+
+		self.assertEqual(connection.get_shared_secret(), secret)
+		self.assertEqual(frappe.cache().get_value(connection.SHARED_SECRET_CACHE_KEY), secret)
+
+		connection.clear_shared_secret_cache()
+		self.assertIsNone(frappe.cache().get_value(connection.SHARED_SECRET_CACHE_KEY))
+
+	@patch("ecommerce_integrations.shopify.connection.create_shopify_log")
+	@patch("ecommerce_integrations.shopify.order.sync_sales_order")
+	def test_process_webhook(self, sync_sales_order, create_shopify_log):
+		create_shopify_log.return_value = frappe._dict(name="log")
+
+		connection.process_webhook("orders/create", json.dumps({"id": 1}))
+
+		create_shopify_log.assert_called_once()
+		sync_sales_order.assert_called_once_with(payload={"id": 1}, request_id="log")
+
+	def test_webhook_deduplication(self):
+		def get_keys(webhook_id, topic):
+			return connection._get_deduplication_keys(webhook_id, topic, order_id=1)
+
+		all_keys = get_keys("1", "orders/create") + get_keys("2", "orders/create")
+		all_keys += get_keys("3", "orders/edited") + get_keys("4", "orders/edited")
+		connection._clear_received_webhook(all_keys)
+
+		self.assertTrue(connection._mark_webhook_as_received(get_keys("1", "orders/create")))
+		# redelivery of same webhook
+		self.assertFalse(connection._mark_webhook_as_received(get_keys("1", "orders/create")))
+		# same event for the same order with another webhook id
+		self.assertFalse(connection._mark_webhook_as_received(get_keys("2", "orders/create")))
+		# orders can be edited many times
+		self.assertTrue(connection._mark_webhook_as_received(get_keys("3", "orders/edited")))
+		self.assertTrue(connection._mark_webhook_as_received(get_keys("4", "orders/edited")))
+
+		connection._clear_received_webhook(all_keys)
+
+	@patch("ecommerce_integrations.shopify.connection.time.sleep")
+	@patch("ecommerce_integrations.shopify.connection.frappe.enqueue")
+	@patch("ecommerce_integrations.shopify.connection.process_webhook")
+	def test_order_events_are_serialized(self, process_webhook, enqueue, _sleep):
+		order_id = "_test_order"
+		events_key = frappe.cache().make_key(connection.ORDER_EVENTS_KEY.format(order_id))
+		frappe.cache().delete(events_key)
+
+		connection.process_request({"id": order_id, "step": 1}, "orders/create")
+		connection.process_request({"id": order_id, "step": 2}, "orders/paid")
+
+		# payload is passed to the job of each event
+		first, second = [c.kwargs for c in enqueue.call_args_list]
+		self.assertEqual((first["sequence"], second["sequence"]), (1, 2))
+		self.assertEqual(second["data"], {"id": order_id, "step": 2})
+
+		def run(job):
+			connection.process_order_event(
+				**{k: job[k] for k in ("order_id", "sequence", "topic", "data", "waiting_since")}
+			)
+
+		# second event waits for the first one, its job is enqueued again
+		run(second)
+		process_webhook.assert_not_called()
+		self.assertEqual(enqueue.call_count, 3)
+
+		run(first)
+		run(enqueue.call_args.kwargs)
+		self.assertEqual(
+			[c.args for c in process_webhook.call_args_list],
+			[
+				("orders/create", {"id": order_id, "step": 1}),
+				("orders/paid", {"id": order_id, "step": 2}),
+			],
+		)
+
+		frappe.cache().delete(events_key)
+
+	@patch("ecommerce_integrations.shopify.connection.create_shopify_log")
+	@patch("ecommerce_integrations.shopify.order.sync_sales_order", side_effect=Exception)
+	def test_failed_webhook_can_be_delivered_again(self, _sync_sales_order, create_shopify_log):
+		create_shopify_log.return_value = frappe._dict(name="log")
+		keys = connection._get_deduplication_keys("_test_failed", "orders/create", "_test_failed")
+		connection._clear_received_webhook(keys)
+
+		self.assertTrue(connection._mark_webhook_as_received(keys))
+		self.assertRaises(
+			Exception, connection.process_webhook, "orders/create", {"id": 1}, dedup_keys=keys
+		)
+		self.assertTrue(connection._mark_webhook_as_received(keys))
+
+		connection._clear_received_webhook(keys)
+
+	@patch("ecommerce_integrations.shopify.connection.frappe.enqueue")
+	@patch("ecommerce_integrations.shopify.connection._validate_request")
+	def test_order_edits_are_serialized(self, _validate_request, enqueue):
+		order_id = 450789469
+		events_key = frappe.cache().make_key(connection.ORDER_EVENTS_KEY.format(order_id))
+		frappe.cache().delete(events_key)
+
+		payload = {"order_edit": {"id": 1, "order_id": order_id, "line_items": {}}}
+		request = frappe._dict(
+			data=json.dumps(payload).encode(),
+			headers={"X-Shopify-Topic": "orders/edited", "X-Shopify-Webhook-Id": "_test_order_edit"},
+		)
+		dedup_keys = connection._get_deduplication_keys("_test_order_edit", "orders/edited", order_id)
+		connection._clear_received_webhook(dedup_keys)
+
+		with patch.object(frappe.local, "request", request, create=True), patch(
+			"ecommerce_integrations.shopify.connection.frappe.get_request_header"
+		):
+			connection.store_request_data()
+
+		# sequenced with other events of the order instead of an unserialized job
+		enqueue.assert_called_once()
+		job = enqueue.call_args.kwargs
+		self.assertEqual(job["method"], connection.process_order_event)
+		self.assertEqual((job["order_id"], job["sequence"]), (order_id, 1))
+		self.assertEqual(job["topic"], "orders/edited")
+
+		frappe.cache().delete(events_key)
+		connection._clear_received_webhook(dedup_keys)
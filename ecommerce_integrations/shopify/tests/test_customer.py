@@ -0,0 +1,28 @@
+# Copyright (c) 2021, Frappe and Contributors
+# See LICENSE
+
+import unittest
+
+from ecommerce_integrations.shopify.customer import _get_address_hash, _map_address_fields
+
+SHOPIFY_ADDRESS = {
+	"id": 1,
+	"address1": "221B Baker Street",
+	"city": "London",
+	"zip": "NW1 6XE",
+	"country": "United Kingdom",
+}
+
+
+class TestShopifyCustomer(unittest.TestCase):
+	def test_address_hash(self):
+		def get_hash(address, customer_name="Sherlock Holmes"):
+			return _get_address_hash(
+				_map_address_fields(address, customer_name, "Billing", "sherlock@example.com")
+			)
+
+		address_hash = get_hash(SHOPIFY_ADDRESS)
+
+		# title isn't updated for existing addresses
+		self.assertEqual(address_hash, get_hash(SHOPIFY_ADDRESS, customer_name="S. Holmes"))
+		self.assertNotEqual(address_hash, get_hash({**SHOPIFY_ADDRESS, "zip": "NW1 6XF"}))
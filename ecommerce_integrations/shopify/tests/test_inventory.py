@@ -0,0 +1,57 @@
+# Copyright (c) 2021, Frappe and Contributors
+# See LICENSE
+
+import json
+import unittest
+from unittest.mock import patch
+
+from frappe import _dict
+
+from ecommerce_integrations.shopify.inventory import _set_inventory_quantities
+
+
+def _get_level(inventory_item_id, qty):
+	return _dict(
+		ecom_item=f"ecom-{inventory_item_id}",
+		inventory_item_id=inventory_item_id,
+		shopify_location_id="1",
+		qty=qty,
+	)
+
+
+def _get_response(user_errors):
+	return json.dumps({"data": {"inventorySetQuantities": {"userErrors": user_errors}}})
+
+
+class TestInventory(unittest.TestCase):
+	@patch("ecommerce_integrations.shopify.inventory.GraphQL")
+	def test_set_quantities_in_one_request(self, graphql):
+		graphql().execute.return_value = _get_response([])
+		levels = [_get_level(i, 10) for i in range(3)]
+
+		_set_inventory_quantities(levels)
+
+		self.assertEqual(graphql().execute.call_count, 1)
+		quantities = graphql().execute.call_args.kwargs["variables"]["input"]["quantities"]
+		self.assertEqual(len(quantities), 3)
+		self.assertEqual(quantities[0]["inventoryItemId"], "gid://shopify/InventoryItem/0")
+		self.assertTrue(all(d.status == "Success" for d in levels))
+
+	@patch("ecommerce_integrations.shopify.inventory.GraphQL")
+	def test_retry_without_rejected_levels(self, graphql):
+		graphql().execute.side_effect = [
+			_get_response(
+				[
+					{"code": "INVALID_INVENTORY_ITEM", "field": ["input", "quantities", "1", "inventoryItemId"]},
+					{"code": "INVALID", "field": ["input", "quantities", "2", "quantity"], "message": "Invalid"},
+				]
+			),
+			_get_response([]),
+		]
+		levels = [_get_level(i, 10) for i in range(3)]
+
+		_set_inventory_quantities(levels)
+
+		self.assertEqual(graphql().execute.call_count, 2)
+		self.assertEqual([d.status for d in levels], ["Success", "Not Found", "Failed"])
+		self.assertEqual(levels[2].failure_reason, "Invalid")
@@ -2,10 +2,30 @@
 # See LICENSE
 
 import json
+from unittest.mock import MagicMock, patch
+
 import frappe
+from frappe import _dict
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
 
-from ecommerce_integrations.shopify.order import get_shipping_country, get_shipping_title, get_shipping_minimum_delivery_days
+from ecommerce_integrations.shopify.constants import SETTING_DOCTYPE
+from ecommerce_integrations.shopify.order import (
+	SHIPPING_RULE_INDEX_CACHE_KEY,
+	TAX_ACCOUNT_CACHE_KEY,
+	_create_old_orders_sync_chunks,
+	_fetch_old_order_pages,
+	_get_order_position,
+	clear_shipping_rule_index,
+	clear_tax_account_cache,
+	get_shipping_country,
+	get_shipping_minimum_delivery_days,
+	get_shipping_title,
+	get_tax_account_description,
+	get_tax_account_head,
+	get_trans_items_from_order_edit,
+	has_item_changes,
+)
 
 
 class TestOrder(FrappeTestCase):
@@ -48,3 +68,150 @@ class TestOrder(FrappeTestCase):
 		shipping_country = get_shipping_country(self.shopify_order)
 		self.assertEqual(shipping_country, self.country)
 	
+
+	@patch("ecommerce_integrations.shopify.order.frappe.db.commit")
+	@patch("ecommerce_integrations.shopify.order.Order.count", return_value=100)
+	def test_old_orders_sync_chunks(self, _count, _commit):
+		setting = frappe.get_doc(SETTING_DOCTYPE)
+		setting.old_orders_from = "2024-01-01 00:00:00"
+		setting.old_orders_to = "2024-01-04 00:00:00"
+		setting.old_orders_sync_jobs = 3
+		setting.use_bulk_operation_for_old_orders = 0
+
+		with patch.object(setting, "save"):
+			_create_old_orders_sync_chunks(setting)
+
+		chunks = setting.old_orders_sync_chunks
+		self.assertEqual(len(chunks), 3)
+		self.assertEqual(get_datetime(chunks[0].from_time), get_datetime("2024-01-01 00:00:00"))
+		self.assertEqual(get_datetime(chunks[1].from_time), get_datetime("2024-01-02 00:00:00"))
+		# chunks don't overlap, end of a chunk is excluded
+		self.assertEqual(chunks[0].to_time, chunks[1].from_time)
+		self.assertEqual(get_datetime(chunks[2].to_time), get_datetime("2024-01-04 00:00:01"))
+		self.assertEqual(setting.old_orders_estimated_total, 100)
+
+		# only one bulk operation can run at a time
+		setting.use_bulk_operation_for_old_orders = 1
+		with patch.object(setting, "save"):
+			_create_old_orders_sync_chunks(setting)
+		self.assertEqual(len(setting.old_orders_sync_chunks), 1)
+
+	@patch("ecommerce_integrations.shopify.order.Order.find")
+	def test_old_orders_resume_after_last_order(self, find):
+		def get_order(order_id, created_at):
+			return _dict(to_dict=lambda: {"id": order_id, "created_at": created_at})
+
+		def find_orders(from_=None, **kwargs):
+			if from_:
+				raise Exception("invalid page_info")
+			# orders created at same time as last synced order are fetched again
+			self.assertEqual(kwargs["created_at_min"], get_datetime(last_order[0]).astimezone().isoformat())
+			collection = MagicMock()
+			collection.has_next_page.return_value = False
+			collection.__iter__.return_value = iter(
+				[get_order(1, "2024-01-01T10:00:00"), get_order(3, "2024-01-01T10:00:00")]
+			)
+			return collection
+
+		find.side_effect = find_orders
+		last_order = _get_order_position(2, "2024-01-01T10:00:00")
+
+		pages = list(_fetch_old_order_pages(last_order[0], "2024-01-02", "expired", last_order))
+
+		orders, processed, next_page_url, new_last_order = pages[0]
+		self.assertEqual(len(orders), 2)
+		# only order after last synced order is counted again
+		self.assertEqual(processed, 1)
+		self.assertEqual(next_page_url, "")
+		self.assertEqual(new_last_order, _get_order_position(3, "2024-01-01T10:00:00"))
+
+	def test_tax_account_map_cache(self):
+		clear_tax_account_cache()
+		frappe.cache().set_value(
+			TAX_ACCOUNT_CACHE_KEY,
+			{
+				"accounts": {"VAT": {"tax_account": "_Test VAT", "tax_description": "VAT 20%"}},
+				"defaults": {"sales_tax": "_Test Sales Tax", "shipping": None},
+			},
+		)
+
+		with patch("ecommerce_integrations.shopify.order.frappe.get_all") as get_all:
+			self.assertEqual(get_tax_account_head({"title": "VAT"}), "_Test VAT")
+			self.assertEqual(get_tax_account_description({"title": "VAT"}), "VAT 20%")
+			self.assertEqual(
+				get_tax_account_head({"title": "GST"}, charge_type="sales_tax"), "_Test Sales Tax"
+			)
+			self.assertRaises(
+				frappe.ValidationError, get_tax_account_head, {"title": "GST"}, charge_type="shipping"
+			)
+			get_all.assert_not_called()
+
+		clear_tax_account_cache()
+		self.assertIsNone(frappe.cache().get_value(TAX_ACCOUNT_CACHE_KEY))
+
+	def test_shipping_rule_index_matching(self):
+		index = {
+			"India": {
+				"express": 2,
+				"royal mail (standard delivery)": 8,
+				"royal mail (standard delivery) - large": 10,
+			}
+		}
+
+		with patch(
+			"ecommerce_integrations.shopify.order.get_shipping_rule_index", return_value=index
+		):
+			# exact match ignores case and extra whitespace
+			self.assertEqual(get_shipping_minimum_delivery_days(" EXPRESS ", "India"), 2)
+			self.assertEqual(
+				get_shipping_minimum_delivery_days("Royal Mail (Standard  Delivery) - Large", "India"), 10
+			)
+			# partial title resolves to the shortest matching display name
+			self.assertEqual(get_shipping_minimum_delivery_days("Standard Delivery", "India"), 8)
+			self.assertIsNone(get_shipping_minimum_delivery_days("Express", "Nepal"))
+			self.assertIsNone(get_shipping_minimum_delivery_days("Courier", "India"))
+
+		clear_shipping_rule_index()
+		self.assertIsNone(frappe.cache().get_value(SHIPPING_RULE_INDEX_CACHE_KEY))
+
+	def test_trans_items_from_order_edit(self):
+		erpnext_items = [
+			_dict(name="row1", item_code="A", qty=2, rate=10, uom="Nos", idx=1, shopify_line_item_id="11"),
+			_dict(name="row2", item_code="B", qty=1, rate=20, uom="Nos", idx=2, shopify_line_item_id="12"),
+		]
+
+		def get_edit(additions=(), removals=()):
+			return {"line_items": {"additions": list(additions), "removals": list(removals)}}
+
+		trans_items = get_trans_items_from_order_edit(
+			get_edit(additions=[{"id": 11, "delta": 1}], removals=[{"id": 12, "delta": 1}]),
+			erpnext_items,
+			"2024-01-01",
+		)
+		# B is removed by leaving it out
+		self.assertEqual([(d["docname"], d["qty"], d["idx"]) for d in trans_items], [("row1", 3, 1)])
+		self.assertTrue(has_item_changes(erpnext_items, trans_items))
+
+		# edits without line item changes don't update the order
+		trans_items = get_trans_items_from_order_edit(get_edit(), erpnext_items, "2024-01-01")
+		self.assertFalse(has_item_changes(erpnext_items, trans_items))
+
+		# edits of an order are processed one after another, each applied on the updated rows
+		first_edit = get_trans_items_from_order_edit(
+			get_edit(additions=[{"id": 11, "delta": 2}]), erpnext_items, "2024-01-01"
+		)
+		updated_items = [_dict(row, qty=d["qty"]) for row, d in zip(erpnext_items, first_edit)]
+		second_edit = get_trans_items_from_order_edit(
+			get_edit(removals=[{"id": 11, "delta": 1}, {"id": 12, "delta": 1}]),
+			updated_items,
+			"2024-01-01",
+		)
+		self.assertEqual([(d["docname"], d["qty"]) for d in first_edit], [("row1", 4), ("row2", 1)])
+		self.assertEqual([(d["docname"], d["qty"]) for d in second_edit], [("row1", 3)])
+
+		# new line item, order is fetched from Shopify
+		self.assertIsNone(
+			get_trans_items_from_order_edit(
+				get_edit(additions=[{"id": 13, "delta": 1}]), erpnext_items, "2024-01-01"
+			)
+		)
@@ -1,9 +1,22 @@
 # Copyright (c) 2021, Frappe and Contributors
 # See LICENSE
 
-import frappe
+import json
+from unittest.mock import patch
 
-from ecommerce_integrations.shopify.product import ShopifyProduct
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from ecommerce_integrations.shopify.constants import MODULE_NAME
+from ecommerce_integrations.shopify.product import (
+	ITEM_UPLOAD_QUEUE_KEY,
+	ShopifyProduct,
+	_queue_item_upload,
+	clear_item_attribute_index,
+	get_item_attribute_index,
+	process_item_upload_queue,
+	upload_item,
+)
 
 from .utils import TestCase
 
@@ -117,6 +130,106 @@ class TestProduct(TestCase):
 			"39845261541529",
 		)
 
+	def test_item_upload_is_coalesced(self):
+		key = frappe.cache().make_key(ITEM_UPLOAD_QUEUE_KEY)
+		frappe.cache().delete(key)
+
+		_queue_item_upload("_Test Shopify Upload Item")
+		first_due = frappe.cache().execute_command("ZSCORE", key, "_Test Shopify Upload Item")
+		_queue_item_upload("_Test Shopify Upload Item")
+
+		# repeated saves are queued once and upload is pushed back
+		self.assertEqual(frappe.cache().execute_command("ZCARD", key), 1)
+		self.assertGreaterEqual(
+			float(frappe.cache().execute_command("ZSCORE", key, "_Test Shopify Upload Item")),
+			float(first_due),
+		)
+
+		frappe.cache().delete(key)
+
+	@patch("ecommerce_integrations.shopify.product.upload_item")
+	def test_process_item_upload_queue(self, upload_item):
+		key = frappe.cache().make_key(ITEM_UPLOAD_QUEUE_KEY)
+		frappe.cache().delete(key)
+
+		_queue_item_upload("_Test Shopify Upload Item")
+
+		# not due yet
+		process_item_upload_queue()
+		upload_item.assert_not_called()
+
+		with patch(
+			"ecommerce_integrations.shopify.product.now_datetime",
+			return_value=add_to_date(now_datetime(), minutes=5),
+		):
+			process_item_upload_queue()
+
+		upload_item.assert_called_once_with("_Test Shopify Upload Item")
+		self.assertIsNone(frappe.cache().execute_command("ZSCORE", key, "_Test Shopify Upload Item"))
+
+	@patch("ecommerce_integrations.shopify.product.Product.save")
+	def test_unchanged_item_is_not_uploaded(self, save):
+		item = make_item("_Test Shopify Unchanged Item", {"has_variants": 0, "attributes": []})
+		if not frappe.db.exists("Ecommerce Item", {"erpnext_item_code": item.name}):
+			frappe.get_doc(
+				{
+					"doctype": "Ecommerce Item",
+					"integration": MODULE_NAME,
+					"erpnext_item_code": item.name,
+					"integration_item_code": "7001",
+					"variant_id": "7002",
+					"sku": item.name,
+				}
+			).insert()
+
+		product = {
+			"id": 7001,
+			"title": item.item_name,
+			"body_html": item.description,
+			"product_type": item.item_group,
+			"status": "active",
+			"options": [{"name": "Title"}],
+			"variants": [
+				{
+					"id": 7002,
+					"sku": item.name,
+					"price": "0.00",
+					"inventory_management": "shopify" if item.is_stock_item else None,
+				}
+			],
+		}
+		self.fake("products/7001", body=json.dumps({"product": product}))
+
+		upload_item(item.name)
+		save.assert_not_called()
+
+		# changed description is uploaded
+		product["body_html"] = "Old description"
+		self.fake("products/7001", body=json.dumps({"product": product}))
+
+		upload_item(item.name)
+		save.assert_called_once()
+
+	def test_item_attribute_index(self):
+		create_item_attributes()
+		attribute = frappe.get_doc("Item Attribute", "Test Sync Size")
+		clear_item_attribute_index(attribute)
+
+		index = get_item_attribute_index("Test Sync Size")
+		self.assertEqual(index["values"], [d.attribute_value for d in attribute.item_attribute_values])
+		for d in attribute.item_attribute_values:
+			self.assertEqual(index["lookup"][d.abbr.lower()], d.attribute_value)
+			self.assertEqual(index["lookup"][d.attribute_value.lower()], d.attribute_value)
+
+		self.assertIsNone(get_item_attribute_index("_Test Missing Attribute"))
+
+		# updated attribute is indexed again
+		attribute.append("item_attribute_values", {"attribute_value": "_Test XXL", "abbr": "_TXXL"})
+		attribute.save()
+		self.assertEqual(get_item_attribute_index("Test Sync Size")["lookup"]["_txxl"], "_Test XXL")
+		frappe.db.rollback()
+		clear_item_attribute_index(attribute)
+
 
 def create_item_attributes():
 	if not frappe.db.exists("Item Attribute", "Test Sync Size"):
@@ -0,0 +1,141 @@
+# Copyright (c) 2021, Frappe and Contributors
+# See LICENSE
+
+import unittest
+from unittest.mock import patch
+
+import responses
+
+from ecommerce_integrations.shopify import shopify_order_manager
+from ecommerce_integrations.shopify.shopify_order_manager import ShopifyOrderManager
+
+SHOP_URL = "frappetest.myshopify.com"
+ORDER_URL = f"https://{SHOP_URL}/admin/api/2023-07/orders/1.json"
+GRAPHQL_URL = f"https://{SHOP_URL}/admin/api/2023-07/graphql.json"
+CALCULATED_ORDER_ID = "gid://shopify/CalculatedOrder/1"
+
+
+class TestShopifyOrderManager(unittest.TestCase):
+	def setUp(self):
+		shopify_order_manager.close_sessions()
+		shopify_order_manager.reset_metrics()
+
+	def test_session_is_shared_per_shop(self):
+		a = ShopifyOrderManager(SHOP_URL, "token")
+		b = ShopifyOrderManager(SHOP_URL, "another token")
+		c = ShopifyOrderManager("other.myshopify.com", "token")
+
+		self.assertIs(a.session, b.session)
+		self.assertIsNot(a.session, c.session)
+
+	@responses.activate
+	@patch("ecommerce_integrations.shopify.shopify_order_manager.time.sleep")
+	def test_retry_after_on_throttle(self, sleep):
+		responses.add(responses.GET, ORDER_URL, status=429, headers={"Retry-After": "2.0"})
+		responses.add(responses.GET, ORDER_URL, status=200, json={"order": {"id": 1}})
+
+		order = ShopifyOrderManager(SHOP_URL, "token").get_order(1)
+
+		self.assertEqual(order["order"]["id"], 1)
+		sleep.assert_called_once_with(2.0)
+
+		metrics = shopify_order_manager.get_metrics()[f"{SHOP_URL}:get_order"]
+		self.assertEqual(metrics["calls"], 1)
+		self.assertEqual(metrics["retries"], 1)
+		self.assertEqual(metrics["errors"], 0)
+
+	@responses.activate
+	@patch("ecommerce_integrations.shopify.shopify_order_manager.time.sleep")
+	def test_gives_up_after_max_retries(self, sleep):
+		responses.add(responses.GET, ORDER_URL, status=503, json={})
+
+		ShopifyOrderManager(SHOP_URL, "token", max_retries=2).get_order(1)
+
+		self.assertEqual(sleep.call_count, 2)
+		metrics = shopify_order_manager.get_metrics()[f"{SHOP_URL}:get_order"]
+		self.assertEqual(metrics["errors"], 1)
+
+	def test_pool_grows_for_larger_pool_size(self):
+		a = ShopifyOrderManager(SHOP_URL, "token", pool_size=2)
+		b = ShopifyOrderManager(SHOP_URL, "token", pool_size=20)
+
+		self.assertIs(a.session, b.session)
+		self.assertEqual(a.session.get_adapter(ORDER_URL)._pool_maxsize, 20)
+
+	@responses.activate
+	@patch("ecommerce_integrations.shopify.shopify_order_manager.time.sleep")
+	def test_post_is_not_retried_on_server_error(self, sleep):
+		responses.add(responses.POST, f"https://{SHOP_URL}/admin/api/2023-07/orders.json", status=503, json={})
+
+		ShopifyOrderManager(SHOP_URL, "token").create_order(1, [])
+
+		# order may have been created, sending it again could duplicate it
+		sleep.assert_not_called()
+		self.assertEqual(len(responses.calls), 1)
+		metrics = shopify_order_manager.get_metrics()[f"{SHOP_URL}:create_order"]
+		self.assertEqual(metrics["retries"], 0)
+		self.assertEqual(metrics["errors"], 1)
+
+	@responses.activate
+	def test_edit_order_in_single_session(self):
+		def edit_result(index, errors=()):
+			return {
+				"calculatedLineItem": {"id": f"gid://shopify/CalculatedLineItem/{index}", "quantity": 1},
+				"userErrors": [{"field": None, "message": e} for e in errors],
+			}
+
+		begin = {"orderEditBegin": {"calculatedOrder": {"id": CALCULATED_ORDER_ID}, "userErrors": []}}
+		responses.add(responses.POST, GRAPHQL_URL, json={"data": begin})
+		responses.add(
+			responses.POST,
+			GRAPHQL_URL,
+			json={"data": {f"op{i}": edit_result(i) for i in range(10)}},
+		)
+		commit = {"orderEditCommit": {"order": {"id": "gid://shopify/Order/1"}, "userErrors": []}}
+		responses.add(responses.POST, GRAPHQL_URL, json={"data": commit})
+
+		operations = [{"op": "set_quantity", "line_item_id": i, "quantity": 1} for i in range(9)]
+		operations.append({"op": "add", "variant_id": 1, "quantity": 1})
+
+		result = ShopifyOrderManager(SHOP_URL, "token").edit_order(1, operations)
+
+		self.assertTrue(result["success"])
+		self.assertTrue(all(d["success"] for d in result["operations"]))
+		# begin, all operations and commit
+		self.assertEqual(len(responses.calls), 3)
+
+	@responses.activate
+	@patch("ecommerce_integrations.shopify.shopify_order_manager.time.sleep")
+	def test_throttled_graphql_is_retried(self, sleep):
+		throttled = {
+			"errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+			"extensions": {
+				"cost": {
+					"requestedQueryCost": 110,
+					"throttleStatus": {"currentlyAvailable": 10, "restoreRate": 50},
+				}
+			},
+		}
+		begin = {"orderEditBegin": {"calculatedOrder": {"id": CALCULATED_ORDER_ID}, "userErrors": []}}
+		responses.add(responses.POST, GRAPHQL_URL, json=throttled)
+		responses.add(responses.POST, GRAPHQL_URL, json={"data": begin})
+
+		data = ShopifyOrderManager(SHOP_URL, "token")._graphql("query", {}, "order_edit_begin")
+
+		self.assertEqual(data, begin)
+		# till 100 points of query cost are restored
+		self.assertAlmostEqual(sleep.call_args.args[0], 2.1)
+
+	@responses.activate
+	def test_failed_edit_is_not_committed(self):
+		begin = {"orderEditBegin": {"calculatedOrder": {"id": CALCULATED_ORDER_ID}, "userErrors": []}}
+		responses.add(responses.POST, GRAPHQL_URL, json={"data": begin})
+		operation = {"calculatedLineItem": None, "userErrors": [{"field": None, "message": "invalid"}]}
+		responses.add(responses.POST, GRAPHQL_URL, json={"data": {"op0": operation}})
+
+		result = ShopifyOrderManager(SHOP_URL, "token").remove_item_from_order(1, 2)
+
+		self.assertFalse(result["success"])
+		self.assertFalse(result["committed"])
+		self.assertEqual(result["operations"][0]["errors"], ["invalid"])
+		self.assertEqual(len(responses.calls), 2)
@@ -5,6 +5,7 @@ import frappe
 from frappe import _
 from frappe.utils.nestedset import get_root_of
 
+from ecommerce_integrations.controllers.customer import get_customer_doc
 from ecommerce_integrations.unicommerce.constants import (
 	ADDRESS_JSON_FIELD,
 	CUSTOMER_CODE_FIELD,
@@ -66,13 +67,13 @@ def _check_if_customer_exists(address, customer_code):
 
 	If ALL address fields match then new customer is not created"""
 
-	customer_name = None
-
 	if customer_code:
-		customer_name = frappe.db.get_value("Customer", {CUSTOMER_CODE_FIELD: customer_code})
+		try:
+			return get_customer_doc(CUSTOMER_CODE_FIELD, customer_code)
+		except frappe.DoesNotExistError:
+			pass
 
-	if not customer_name:
-		customer_name = frappe.db.get_value("Customer", {ADDRESS_JSON_FIELD: json.dumps(address)})
+	customer_name = frappe.db.get_value("Customer", {ADDRESS_JSON_FIELD: json.dumps(address)})
 
 	if customer_name:
 		return frappe.get_doc("Customer", customer_name)
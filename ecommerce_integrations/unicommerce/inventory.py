@@ -5,9 +5,11 @@ import frappe
 from frappe.utils import cint, now
 
 from ecommerce_integrations.controllers.inventory import (
+	filter_changed_inventory_levels,
 	get_inventory_levels,
 	get_inventory_levels_of_group_warehouse,
 	update_inventory_sync_status,
+	update_inventory_synced_qty,
 )
 from ecommerce_integrations.controllers.scheduling import need_to_run
 from ecommerce_integrations.unicommerce.api_client import UnicommerceAPIClient
@@ -61,10 +63,21 @@ def update_inventory_on_unicommerce(client=None, force=False):
 		if not erpnext_inventory:
 			continue
 
+		# TODO: consider reserved qty on both platforms.
+		for d in erpnext_inventory:
+			d.qty = cint(d.actual_qty)
+
+		erpnext_inventory, unchanged_items = filter_changed_inventory_levels(erpnext_inventory)
+		for ecom_item in unchanged_items:
+			# nothing to sync, considered successful unless other warehouse fails
+			success_map.setdefault(ecom_item, True)
+
+		if not erpnext_inventory:
+			continue
+
 		erpnext_inventory = erpnext_inventory[:MAX_INVENTORY_UPDATE_IN_REQUEST]
 
-		# TODO: consider reserved qty on both platforms.
-		inventory_map = {d.integration_item_code: cint(d.actual_qty) for d in erpnext_inventory}
+		inventory_map = {d.integration_item_code: d.qty for d in erpnext_inventory}
 		facility_code = wh_to_facility_map[warehouse]
 
 		response, status = client.bulk_inventory_update(
@@ -73,12 +86,16 @@ def update_inventory_on_unicommerce(client=None, force=False):
 
 		if status:
 			# update success_map
-			sku_to_ecom_item_map = {d.integration_item_code: d.ecom_item for d in erpnext_inventory}
+			sku_to_inventory_map = {d.integration_item_code: d for d in erpnext_inventory}
 			for sku, status in response.items():
-				ecom_item = sku_to_ecom_item_map[sku]
+				ecom_item = sku_to_inventory_map[sku].ecom_item
 				# Any one warehouse sync failure should be considered failure
 				success_map[ecom_item] = success_map[ecom_item] and status
 
+			update_inventory_synced_qty(
+				[sku_to_inventory_map[sku] for sku, status in response.items() if status]
+			)
+
 	_update_inventory_sync_status(success_map, inventory_synced_on)
 
 